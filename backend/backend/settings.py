@@ -59,12 +59,12 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'newsletter',
-    'corsheaders',
 ]
 
 MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware',
+    'newsletter.querystats.QueryAccountingMiddleware',  # Per-request query count/time and budgets
     'django.middleware.security.SecurityMiddleware',
+    'newsletter.api.ApiRouterMiddleware',  # /api/: CORS + direct dispatch, skips the middleware below
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files in production
     'django.middleware.gzip.GZipMiddleware',  # Add compression
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -75,6 +75,43 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view query budgets checked by QueryAccountingMiddleware and `manage.py check_query_budgets`
+QUERY_BUDGETS = {
+    'subscribe_email': 6,
+    'health_check': 0,
+    'test_email': 0,
+    'confirm_subscription': 1,
+    'unsubscribe': 3,
+    'legal_page': 0,
+    'legal_page_fingerprinted': 0,
+    'admin': 12,
+}
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False').lower() == 'true'  # Raise instead of log
+QUERY_STATS_HEADERS = os.environ.get('QUERY_STATS_HEADERS', 'False').lower() == 'true'  # X-DB-* headers outside DEBUG
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '500'))
+
+# Token for the /api/metrics/ endpoint; the endpoint is disabled when empty
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Opt-in request profiling (see newsletter/profiling.py and `manage.py profile_report`)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'sampling')  # 'sampling' (stack sampler) or 'cprofile'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.0'))  # Fraction of requests to profile
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', '0.005'))  # Seconds between stack samples
+PROFILING_DIR = os.environ.get('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', '500'))
+PROFILING_TOKEN_MAX_AGE = int(os.environ.get('PROFILING_TOKEN_MAX_AGE', '3600'))  # Seconds a signed X-Profile-Token stays valid
+
+if PROFILING_ENABLED:
+    # First, so the profile includes the rest of the middleware stack
+    MIDDLEWARE.insert(0, 'newsletter.profiling.ProfilingMiddleware')
+
+# Opt-in tracemalloc snapshots (see newsletter/memory.py and `manage.py compare_memory_snapshots`)
+MEMORY_PROFILING_ENABLED = os.environ.get('MEMORY_PROFILING_ENABLED', 'False').lower() == 'true'
+MEMORY_TRACEMALLOC_FRAMES = int(os.environ.get('MEMORY_TRACEMALLOC_FRAMES', '16'))  # Deep enough to reach our code from Django
+MEMORY_SNAPSHOT_DIR = os.environ.get('MEMORY_SNAPSHOT_DIR', str(BASE_DIR / 'memory'))  # Shared by all workers
+MEMORY_SNAPSHOT_MAX_FILES = int(os.environ.get('MEMORY_SNAPSHOT_MAX_FILES', '200'))
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -107,21 +144,71 @@ if DB_HOST and DB_PORT:
 else:
     DB_SERVER = DB_HOST
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'mssql',
-        'NAME': os.environ.get('DB_NAME'),
-        'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASSWORD'),
-        'HOST': DB_SERVER,  # Combined host,port format for Azure SQL
-        'PORT': '',  # Port is included in HOST
+# DB_ENGINE=sqlite runs on local SQLite files instead of Azure SQL (development and CI)
+DB_ENGINE = os.environ.get('DB_ENGINE', 'mssql')
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'mssql',
+            'NAME': os.environ.get('DB_NAME'),
+            'USER': os.environ.get('DB_USER'),
+            'PASSWORD': os.environ.get('DB_PASSWORD'),
+            'HOST': DB_SERVER,  # Combined host,port format for Azure SQL
+            'PORT': '',  # Port is included in HOST
+            'OPTIONS': {
+                'driver': 'ODBC Driver 18 for SQL Server',
+                'extra_params': 'Encrypt=yes;TrustServerCertificate=yes;Connection Timeout=60',
+            },
+            'CONN_MAX_AGE': 0,  # Disable connection pooling to avoid timeout issues
+        }
+    }
+
+# Optional read replica, e.g. an Azure SQL readable secondary. Read-only paths
+# (admin lists, exports, stats, warmup) use it while its lag is within
+# REPLICA_MAX_STALENESS seconds; signups and all writes stay on 'default'.
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+if DB_ENGINE == 'sqlite' and os.environ.get('DB_READ_REPLICA', 'false').lower() == 'true':
+    # A second file stands in for the replica: copy db.sqlite3 to db-replica.sqlite3 to
+    # "replicate", and sign up on the primary afterwards to see the staleness fallback
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+elif DB_REPLICA_HOST or os.environ.get('DB_READ_REPLICA', 'false').lower() == 'true':
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': f"{DB_REPLICA_HOST},{DB_PORT}" if DB_REPLICA_HOST else DB_SERVER,
         'OPTIONS': {
-            'driver': 'ODBC Driver 18 for SQL Server',
-            'extra_params': 'Encrypt=yes;TrustServerCertificate=yes;Connection Timeout=60',
+            **DATABASES['default']['OPTIONS'],
+            # Without a separate host this routes to the readable secondary
+            'extra_params': DATABASES['default']['OPTIONS']['extra_params'] + ';ApplicationIntent=ReadOnly',
         },
-        'CONN_MAX_AGE': 0,  # Disable connection pooling to avoid timeout issues
+        'TEST': {'MIRROR': 'default'},
     }
-}
+
+# Local performance testing only: wrap every database in newsletter.faultdb so round
+# trips, connects and dropped connections cost what they do in production
+# (DB_FAULT_PROFILE=azure_sql; see newsletter/faultdb/base.py for the profiles)
+DB_FAULT_PROFILE = os.environ.get('DB_FAULT_PROFILE', '')
+if DB_FAULT_PROFILE:
+    for database in DATABASES.values():
+        database['INNER_ENGINE'] = database['ENGINE']
+        database['ENGINE'] = 'newsletter.faultdb'
+        database['FAULTS'] = {'PROFILE': DB_FAULT_PROFILE}
+
+DATABASE_ROUTERS = ['newsletter.routers.ReplicaRouter']
+REPLICA_DB_ALIAS = 'replica' if 'replica' in DATABASES else ''
+REPLICA_MAX_STALENESS = float(os.environ.get('REPLICA_MAX_STALENESS', '30'))  # Seconds; negative disables the check
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '10'))
+REPLICA_LAG_PROBE = os.environ.get('REPLICA_LAG_PROBE', '')  # Dotted path to a callable(alias) -> lag seconds
 
 # Cache configuration for better performance
 CACHES = {
@@ -136,6 +223,22 @@ CACHES = {
     }
 }
 
+# Optional shared cache (e.g. Azure Cache for Redis) so cross-worker state such as
+# idempotency records is visible to every gunicorn worker and container
+if os.environ.get('REDIS_URL'):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
+        'TIMEOUT': 300,
+    }
+
+# Idempotency for subscribe requests retried by nginx or the frontend
+IDEMPOTENCY_CACHE_ALIAS = os.environ.get('IDEMPOTENCY_CACHE_ALIAS', 'shared' if 'shared' in CACHES else 'default')
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '600'))  # How long completed responses are replayed
+IDEMPOTENCY_WINDOW = int(os.environ.get('IDEMPOTENCY_WINDOW', '60'))  # How long responses to keys derived from the email are replayed
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', '30'))
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '10'))
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -215,7 +318,7 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# CORS configuration for production
+# CORS configuration for production (applied to /api/ by newsletter.api.ApiRouterMiddleware)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite dev server
     "http://localhost:3000",  # Docker frontend
@@ -238,8 +341,10 @@ CORS_ALLOWED_HEADERS = [
     'accept',
     'accept-encoding',
     'authorization',
+    'cache-control',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -255,6 +360,8 @@ CORS_ALLOW_METHODS = [
     'PUT',
 ]
 
+CORS_PREFLIGHT_MAX_AGE = 86400  # Browsers cache preflight results for a day
+
 # Email settings for Outlook 365 Business
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.office365.com')
@@ -265,6 +372,56 @@ EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'true').lower() == 'true'
 EMAIL_USE_SSL = os.environ.get('EMAIL_USE_SSL', 'false').lower() == 'true'
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'No Reply <noreply@yourcompany.com>')
 EMAIL_SUBJECT_PREFIX = os.environ.get('EMAIL_SUBJECT_PREFIX', '[Newsletter] ')
+EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', '15'))  # SMTP socket timeout; a hung server must not pin a sender
+
+# Background email executor (per worker process)
+EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', '2'))  # Concurrent SMTP sends
+EMAIL_QUEUE_SIZE = int(os.environ.get('EMAIL_QUEUE_SIZE', '200'))  # Sends beyond this are rejected, not queued
+EMAIL_BREAKER_THRESHOLD = int(os.environ.get('EMAIL_BREAKER_THRESHOLD', '5'))  # Consecutive SMTP errors that open the breaker
+EMAIL_BREAKER_RESET = float(os.environ.get('EMAIL_BREAKER_RESET', '30'))  # Seconds before a probe send is tried
+EMAIL_DRAIN_TIMEOUT = float(os.environ.get('EMAIL_DRAIN_TIMEOUT', '20'))  # Keep below GUNICORN_GRACEFUL_TIMEOUT
+
+# Double opt-in confirmation
+API_BASE_URL = os.environ.get('API_BASE_URL', '')  # Base for links in emails; defaults to COMPANY_WEBSITE_URL
+CONFIRMATION_TOKEN_MAX_AGE = int(os.environ.get('CONFIRMATION_TOKEN_MAX_AGE', str(7 * 24 * 3600)))
+CONFIRMATION_REDIRECT_URL = os.environ.get('CONFIRMATION_REDIRECT_URL', '')  # Frontend page shown after confirming
+CONFIRMATION_RESEND_INTERVAL = int(os.environ.get('CONFIRMATION_RESEND_INTERVAL', '600'))  # Min seconds between resends to an unconfirmed address
+UNCONFIRMED_EXPIRY_DAYS = int(os.environ.get('UNCONFIRMED_EXPIRY_DAYS', '14'))
+
+# One-click unsubscribe (RFC 8058) and suppression list
+UNSUBSCRIBE_MAILTO = os.environ.get('UNSUBSCRIBE_MAILTO', '')  # Optional mailto: target in List-Unsubscribe
+UNSUBSCRIBE_BATCH_SIZE = int(os.environ.get('UNSUBSCRIBE_BATCH_SIZE', '500'))
+UNSUBSCRIBE_FLUSH_INTERVAL = float(os.environ.get('UNSUBSCRIBE_FLUSH_INTERVAL', '2.0'))  # Seconds between queued writes
+SUPPRESSION_CACHE_TTL = int(os.environ.get('SUPPRESSION_CACHE_TTL', '60'))
+
+# Subscription event webhooks (CRM, analytics); comma-separated URLs, empty disables
+WEBHOOK_URLS = [url.strip() for url in os.environ.get('WEBHOOK_URLS', '').split(',') if url.strip()]
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')  # HMAC-SHA256 key for X-Webhook-Signature
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '100'))
+WEBHOOK_FLUSH_INTERVAL = float(os.environ.get('WEBHOOK_FLUSH_INTERVAL', '1.0'))  # Max seconds an event waits for a batch
+WEBHOOK_CONCURRENCY = int(os.environ.get('WEBHOOK_CONCURRENCY', '2'))  # Concurrent requests per target
+WEBHOOK_MAX_BUFFER = int(os.environ.get('WEBHOOK_MAX_BUFFER', '10000'))  # Per target, per process
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '5'))
+WEBHOOK_BACKOFF = float(os.environ.get('WEBHOOK_BACKOFF', '0.5'))  # First retry delay, doubled per attempt
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', '5.0'))
+
+# Append-only subscription event log (audit trail); replay with manage.py replay_event_log
+EVENT_LOG_ENABLED = os.environ.get('EVENT_LOG_ENABLED', 'True').lower() == 'true'
+EVENT_LOG_DIR = os.environ.get('EVENT_LOG_DIR', str(BASE_DIR / 'eventlog'))
+EVENT_LOG_SEGMENT_BYTES = int(os.environ.get('EVENT_LOG_SEGMENT_BYTES', str(64 * 1024 * 1024)))  # Rotate segments at this size
+EVENT_LOG_COMMIT_INTERVAL = float(os.environ.get('EVENT_LOG_COMMIT_INTERVAL', '0.005'))  # Seconds to gather events per fsync
+EVENT_LOG_FSYNC = os.environ.get('EVENT_LOG_FSYNC', 'True').lower() == 'true'
+
+# Legal pages built by manage.py build_legal_pages
+LEGAL_PAGES_DIR = os.environ.get('LEGAL_PAGES_DIR', '')  # Defaults to frontend/public/legal
+
+# Email address validation
+DISPOSABLE_EMAIL_DOMAINS_FILE = os.environ.get('DISPOSABLE_EMAIL_DOMAINS_FILE', '')  # Defaults to newsletter/data/disposable_domains.txt
+EMAIL_DOMAIN_CACHE_SIZE = int(os.environ.get('EMAIL_DOMAIN_CACHE_SIZE', '4096'))
+# Dotted path to an MX resolver callable, e.g. 'newsletter.validation.dns_mx_resolver' (needs dnspython)
+EMAIL_MX_RESOLVER = os.environ.get('EMAIL_MX_RESOLVER', '')
+EMAIL_MX_CACHE_TTL = int(os.environ.get('EMAIL_MX_CACHE_TTL', '3600'))
+EMAIL_MX_LOOKUP_TIMEOUT = float(os.environ.get('EMAIL_MX_LOOKUP_TIMEOUT', '2.0'))
 
 # Company branding and email customization
 COMPANY_NAME = os.environ.get('COMPANY_NAME', 'Your Company')
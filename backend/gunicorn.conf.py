@@ -0,0 +1,196 @@
+"""
+Gunicorn configuration
+
+Workers and threads are sized from the container's cgroup CPU quota and memory
+limit instead of fixed flags. The application is preloaded in the master so
+settings, URL patterns, compiled templates, legal pages and the email logo are
+built once and shared copy-on-write with every worker; the master then freezes
+its heap out of the garbage collector so collections in the workers do not
+touch (and copy) those pages.
+
+Every value can be overridden with a GUNICORN_* environment variable.
+"""
+import gc
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger('gunicorn.error')
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def _read(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit():
+    """
+    CPUs available to this container.
+
+    Uses the cgroup v2 ``cpu.max`` or v1 CFS quota when one is set, otherwise
+    the scheduler affinity (which respects cpusets) or os.cpu_count().
+    """
+    cpus = None
+    cpu_max = _read(f'{CGROUP_ROOT}/cpu.max')
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max':
+            cpus = int(quota) / int(period or 100000)
+    else:
+        quota = _read(f'{CGROUP_ROOT}/cpu/cpu.cfs_quota_us')
+        period = _read(f'{CGROUP_ROOT}/cpu/cpu.cfs_period_us')
+        if quota and period and int(quota) > 0:
+            cpus = int(quota) / int(period)
+
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    if cpus is None:
+        return available
+    return max(1, min(available, math.ceil(cpus)))
+
+
+def cgroup_memory_limit():
+    """Memory limit of this container in bytes, or None if unlimited"""
+    value = _read(f'{CGROUP_ROOT}/memory.max') or _read(f'{CGROUP_ROOT}/memory/memory.limit_in_bytes')
+    if not value or value == 'max':
+        return None
+    limit = int(value)
+    # cgroup v1 reports "unlimited" as a huge page-aligned number
+    return limit if limit < 1 << 60 else None
+
+
+def size_workers(cpus: int, memory_limit, worker_memory: int):
+    """
+    Pick (workers, threads) for the gthread worker.
+
+    Starts from 2 * CPUs + 1 workers with GUNICORN_THREADS threads each, then
+    caps the worker count so that workers plus the master fit in the memory
+    limit. When memory removes workers, threads are raised to keep roughly the
+    same number of concurrent requests, since the requests mostly wait on the
+    database and SMTP.
+    """
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    workers = 2 * cpus + 1
+    if memory_limit:
+        # The master holds the preloaded app too; count it as one worker
+        fits = max(1, memory_limit // worker_memory - 1)
+        if fits < workers:
+            threads = min(16, math.ceil(workers * threads / fits))
+            workers = fits
+    return workers, threads
+
+
+_cpus = cgroup_cpu_limit()
+_memory_limit = cgroup_memory_limit()
+_worker_memory = int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', 128)) * 1024 * 1024
+_workers, _threads = size_workers(_cpus, _memory_limit, _worker_memory)
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', _workers))
+threads = int(os.environ.get('GUNICORN_THREADS', _threads))
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Recycle workers to bound slow leaks; the jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+accesslog = '-'
+errorlog = '-'
+
+# Set in the master just before each fork; the child inherits the value
+_fork_started = None
+
+
+def warm_shared_state():
+    """Build immutable per-process state once in the master, before forking"""
+    from django.template.loader import get_template
+    from newsletter.emails import get_logo_bytes
+    from newsletter.legal import load_legal_pages
+    from newsletter.unsubscribe import get_suppression_list
+
+    for name in ('newsletter/confirmation_email.html', 'newsletter/confirm_subscription.html',
+                 'newsletter/unsubscribe.html', 'newsletter/legal_page.html'):
+        try:
+            get_template(name)
+        except Exception as e:
+            logger.warning(f"Could not precompile template {name}: {e}")
+    load_legal_pages()
+    get_logo_bytes()
+    # Workers inherit a loaded suppression list and only refresh it in the background
+    get_suppression_list().load()
+
+
+def when_ready(server):
+    cpu_note = f"{_cpus} CPU(s)"
+    memory_note = f"{_memory_limit // (1024 * 1024)} MiB" if _memory_limit else "no memory limit"
+    logger.info(f"Sized for {cpu_note}, {memory_note}: {workers} workers x {threads} threads "
+                f"(max_requests={max_requests}±{max_requests_jitter}, preload={preload_app})")
+    if not preload_app:
+        return
+    start = time.perf_counter()
+    warm_shared_state()
+    from newsletter.idempotency import warn_if_cache_is_local
+    warn_if_cache_is_local()
+    # Connections opened while warming must not be shared with the workers
+    from django.db import connections
+    connections.close_all()
+    # Move everything allocated so far out of the collector's reach so the
+    # workers' collections never write to (and un-share) these pages
+    gc.freeze()
+    from newsletter.memory import process_memory
+    memory = process_memory()
+    logger.info(f"Preloaded app in master in {(time.perf_counter() - start) * 1000:.0f}ms, "
+                f"RSS {memory['rss'] / 1048576:.1f} MiB, {gc.get_freeze_count()} objects frozen")
+
+
+def pre_fork(server, worker):
+    global _fork_started
+    _fork_started = time.monotonic()
+    if preload_app:
+        # Never hand an open database socket to a child
+        from django.db import connections
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    """Record how long the worker took to become ready and how much memory it holds"""
+    boot_ms = (time.monotonic() - _fork_started) * 1000 if _fork_started else 0.0
+    from newsletter import metrics
+    from newsletter.memory import install_snapshot_signal, process_memory
+    memory = process_memory()
+    metrics.set_gauge('gunicorn.worker_boot_ms', boot_ms)
+    metrics.set_gauge('gunicorn.worker_rss_bytes', memory['rss'])
+    metrics.set_gauge('gunicorn.worker_private_bytes', memory['private'])
+    logger.info(f"Worker {worker.pid} booted in {boot_ms:.0f}ms: RSS {memory['rss'] / 1048576:.1f} MiB, "
+                f"private {memory['private'] / 1048576:.1f} MiB, shared {memory['shared'] / 1048576:.1f} MiB")
+    # After gunicorn has installed its own worker signal handlers
+    install_snapshot_signal()
+    # Without preload the suppression list is still empty; load it off the request path
+    from newsletter.unsubscribe import get_suppression_list, get_unsubscribe_queue
+    if not get_suppression_list().loaded:
+        get_unsubscribe_queue().wake()
+
+
+def worker_exit(server, worker):
+    # Runs in the worker after SIGTERM (or max_requests) once requests have
+    # finished: give queued confirmation emails until EMAIL_DRAIN_TIMEOUT
+    from newsletter.emails import drain_email_executor
+    from newsletter.memory import process_memory
+    drain_email_executor()
+    memory = process_memory()
+    logger.info(f"Worker {worker.pid} exiting after {worker.nr} requests: "
+                f"RSS {memory['rss'] / 1048576:.1f} MiB, private {memory['private'] / 1048576:.1f} MiB")
@@ -1,11 +1,73 @@
 from django.contrib import admin
-from .models import Subscription
+from .events import SUBSCRIPTION_CREATED, SUBSCRIPTION_UNSUBSCRIBED, publish_on_commit
+from .models import ArchivedSubscription, Subscription, Suppression, hash_email
+from .routers import read_replica
+
+
+class ReplicaChangeListMixin:
+    """Serve changelist pages (listing, search, filters) from the read replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            # Bulk actions write, so they stay on primary
+            return super().changelist_view(request, extra_context)
+        with read_replica():
+            response = super().changelist_view(request, extra_context)
+            # Render inside the block: the result list is evaluated lazily by the template
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
 
 # Register your models here.
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
-    list_display = ('email', 'subscribed_at')
-    list_filter = ('subscribed_at',)
+class SubscriptionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('email', 'subscribed_at', 'confirmed_at')
+    list_filter = ('subscribed_at', 'confirmed_at')
     search_fields = ('email',)
-    readonly_fields = ('subscribed_at',)
+    readonly_fields = ('subscribed_at', 'confirmed_at')
     ordering = ('-subscribed_at',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # A complete address is an index seek on email_hash; anything else falls back to LIKE
+        term = search_term.strip()
+        local, _, domain = term.partition('@')
+        if local and '.' in domain and ' ' not in term:
+            exact = queryset.filter(email_hash=hash_email(term))
+            if exact.exists():
+                return exact, False
+        return super().get_search_results(request, queryset, search_term)
+
+    # Admin edits are subscription writes too: publish them like the API does,
+    # so webhooks and the event log see every row that appears or disappears
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            publish_on_commit(SUBSCRIPTION_CREATED, [obj.email], source='admin')
+        elif 'email' in form.changed_data:
+            publish_on_commit(SUBSCRIPTION_UNSUBSCRIBED, [form.initial['email']], source='admin')
+            publish_on_commit(SUBSCRIPTION_CREATED, [obj.email], source='admin')
+
+    def delete_model(self, request, obj):
+        email = obj.email
+        super().delete_model(request, obj)
+        publish_on_commit(SUBSCRIPTION_UNSUBSCRIBED, [email], source='admin')
+
+    def delete_queryset(self, request, queryset):
+        emails = list(queryset.values_list('email', flat=True))
+        super().delete_queryset(request, queryset)
+        publish_on_commit(SUBSCRIPTION_UNSUBSCRIBED, emails, source='admin')
+
+@admin.register(Suppression)
+class SuppressionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('email', 'reason', 'created_at')
+    list_filter = ('reason',)
+    search_fields = ('email',)
+    readonly_fields = ('created_at',)
+
+@admin.register(ArchivedSubscription)
+class ArchivedSubscriptionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('email', 'reason', 'subscribed_at', 'confirmed_at', 'archived_at')
+    list_filter = ('reason', 'archived_at')
+    search_fields = ('email',)
+    readonly_fields = ('original_id', 'email', 'reason', 'subscribed_at', 'confirmed_at', 'archived_at')
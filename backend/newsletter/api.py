@@ -0,0 +1,117 @@
+"""
+Lean request dispatch for /api/
+
+ApiRouterMiddleware answers CORS preflights from a precomputed header table,
+calls API views directly (skipping the session, auth, CSRF and messages
+middleware that the API does not use) and applies CORS headers exactly once.
+It replaces django-cors-headers and the per-view CORS closures. The
+clickjacking header is still applied, since the confirm and unsubscribe
+pages carry POST forms.
+"""
+import logging
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/'
+
+# Prebuilt bodies for constant responses, so they are never re-serialized
+PREFLIGHT_BODY = b'{}'
+HEALTH_BODY = b'{"status": "ok", "message": "API is working"}'
+METHOD_NOT_ALLOWED_BODY = b'{"error": "Invalid request method"}'
+INVALID_JSON_BODY = b'{"error": "Invalid JSON"}'
+INTERNAL_ERROR_BODY = b'{"error": "Internal server error"}'
+UNSUBSCRIBED_BODY = b'{"message": "Unsubscribed"}'
+INVALID_UNSUBSCRIBE_BODY = b'{"error": "Invalid unsubscribe link"}'
+
+
+def json_bytes_response(body: bytes, status: int = 200) -> HttpResponse:
+    """Build a JSON response from already-encoded bytes"""
+    return HttpResponse(body, status=status, content_type='application/json')
+
+
+class CorsPolicy:
+    """
+    CORS decisions driven by the CORS_* settings, with the header sets for
+    every configured origin computed once at startup.
+    """
+
+    def __init__(self):
+        self.allow_all = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
+        self.allow_credentials = getattr(settings, 'CORS_ALLOW_CREDENTIALS', False)
+        self.allowed_origins = frozenset(o.rstrip('/') for o in getattr(settings, 'CORS_ALLOWED_ORIGINS', []))
+        self.allow_methods = ', '.join(getattr(settings, 'CORS_ALLOW_METHODS', ['GET', 'POST', 'OPTIONS']))
+        self.allow_headers = ', '.join(getattr(settings, 'CORS_ALLOWED_HEADERS', ['content-type']))
+        self.max_age = str(getattr(settings, 'CORS_PREFLIGHT_MAX_AGE', 86400))
+
+        self._simple = {}
+        self._preflight = {}
+        for origin in self.allowed_origins:
+            self._simple[origin], self._preflight[origin] = self._build(origin)
+
+    def _build(self, origin: str):
+        simple = [('Access-Control-Allow-Origin', origin)]
+        if self.allow_credentials:
+            simple.append(('Access-Control-Allow-Credentials', 'true'))
+        preflight = simple + [
+            ('Access-Control-Allow-Methods', self.allow_methods),
+            ('Access-Control-Allow-Headers', self.allow_headers),
+            ('Access-Control-Max-Age', self.max_age),
+        ]
+        return tuple(simple), tuple(preflight)
+
+    def headers_for(self, origin, preflight: bool = False) -> tuple:
+        """Return the CORS headers for an Origin, or () if it is not allowed"""
+        if not origin:
+            return ()
+        table = self._preflight if preflight else self._simple
+        headers = table.get(origin)
+        if headers is None and self.allow_all:
+            simple, full = self._build(origin)
+            headers = full if preflight else simple
+        return headers or ()
+
+
+class ApiRouterMiddleware:
+    """
+    Dispatch /api/ requests without the rest of the middleware stack.
+
+    Place directly after SecurityMiddleware so HTTPS redirects and HSTS still
+    apply. Paths that do not resolve fall through to the normal stack, which
+    keeps APPEND_SLASH redirects and 404 handling unchanged.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cors = CorsPolicy()
+        # Same X-Frame-Options handling as the full stack (honours xframe_options_exempt)
+        self.xframe = XFrameOptionsMiddleware(get_response)
+
+    def __call__(self, request):
+        if not request.path_info.startswith(API_PREFIX):
+            return self.get_response(request)
+
+        origin = request.META.get('HTTP_ORIGIN')
+        if request.method == 'OPTIONS':
+            response = json_bytes_response(PREFLIGHT_BODY)
+            return self.apply_cors(response, origin, preflight=True)
+
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            response = self.get_response(request)
+        else:
+            request.resolver_match = match
+            response = self.xframe.process_response(request, match.func(request, *match.args, **match.kwargs))
+        return self.apply_cors(response, origin)
+
+    def apply_cors(self, response, origin, preflight: bool = False):
+        if origin:
+            for header, value in self.cors.headers_for(origin, preflight):
+                response[header] = value
+            patch_vary_headers(response, ('Origin',))
+        return response
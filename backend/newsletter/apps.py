@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class NewsletterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'newsletter'
+
+    def ready(self):
+        # As early as possible, so module-level state is traced too (no-op unless MEMORY_PROFILING_ENABLED)
+        from .memory import start_tracing
+        start_tracing()
@@ -1,59 +1,36 @@
 """
 Email utilities for newsletter confirmations
 """
+import atexit
 import logging
 import base64
 import os
+import queue
+import smtplib
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from email.mime.image import MIMEImage
+from . import metrics
+from .confirmation import get_confirmation_url
+from .unsubscribe import get_list_unsubscribe_headers, get_unsubscribe_url, is_suppressed
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=1)
 def get_logo_base64():
     """
     Get the logo as base64 encoded data URI for embedding in email
     Prefers PNG format for better email client support, falls back to SVG
     """
     try:
-        # Try multiple paths and formats to find the email logo
-        logo_paths = [
-            # Email-specific logo - highest priority
-            Path(settings.BASE_DIR) / 'frontend' / 'public' / 'assets' / 'images' / 'email-yardee.png',
-            Path(settings.BASE_DIR).parent / 'frontend' / 'public' / 'assets' / 'images' / 'email-yardee.png',
-            Path.cwd() / 'frontend' / 'public' / 'assets' / 'images' / 'email-yardee.png',
-            Path('/app') / 'frontend' / 'public' / 'assets' / 'images' / 'email-yardee.png',
-            # Header logo - PNG format (fallback)
-            Path(settings.BASE_DIR) / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.png',
-            Path(settings.BASE_DIR).parent / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.png',
-            Path.cwd() / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.png',
-            Path('/app') / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.png',
-            # Header logo - SVG format (fallback)
-            Path(settings.BASE_DIR) / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.svg',
-            Path(settings.BASE_DIR).parent / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.svg',
-            Path.cwd() / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.svg',
-            Path('/app') / 'frontend' / 'public' / 'assets' / 'images' / 'yardee-header.svg',
-            # Legacy fallback to logo-3.png
-            Path(settings.BASE_DIR) / 'frontend' / 'public' / 'assets' / 'images' / 'logo-3.png',
-            Path(settings.BASE_DIR).parent / 'frontend' / 'public' / 'assets' / 'images' / 'logo-3.png',
-            Path.cwd() / 'frontend' / 'public' / 'assets' / 'images' / 'logo-3.png',
-            Path('/app') / 'frontend' / 'public' / 'assets' / 'images' / 'logo-3.png',
-        ]
+        logo_path, logo_data = get_logo_bytes()
         
-        logo_path = None
-        for path in logo_paths:
-            if path.exists():
-                logo_path = path
-                logger.debug(f"Found logo at: {logo_path}")
-                break
-        
-        if logo_path and logo_path.exists():
-            # Read file as binary and encode to base64
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            
+        if logo_path is not None:
             # Determine MIME type based on file extension
             file_ext = logo_path.suffix.lower()
             if file_ext == '.svg':
@@ -72,7 +49,6 @@ def get_logo_base64():
             logger.info(f"Logo loaded successfully from {logo_path}, size: {len(logo_data)} bytes, type: {mime_type}")
             return logo_data_uri
         else:
-            logger.warning(f"Logo file not found. Tried paths: {logo_paths}")
             return None
     except Exception as e:
         logger.error(f"Error reading logo file: {e}")
@@ -116,7 +92,22 @@ def get_logo_path():
     logger.warning(f"Logo file not found. Tried paths: {logo_paths}")
     return None
 
-def get_email_context(to_email: str, company_name: str = None, use_cid: bool = False) -> dict:
+@lru_cache(maxsize=1)
+def get_logo_bytes():
+    """
+    Read the logo once per process (the preloaded gunicorn master warms it,
+    so workers share the bytes copy-on-write)
+    
+    Returns:
+        tuple: (Path, bytes) of the logo, or (None, None) if no logo file exists
+    """
+    logo_path = get_logo_path()
+    if logo_path is None:
+        return None, None
+    return logo_path, logo_path.read_bytes()
+
+def get_email_context(to_email: str, company_name: str = None, use_cid: bool = False,
+                      include_confirmation_link: bool = True) -> dict:
     """
     Get the context data for email templates
     
@@ -124,6 +115,7 @@ def get_email_context(to_email: str, company_name: str = None, use_cid: bool = F
         to_email: Email address
         company_name: Optional company name
         use_cid: Whether to use CID attachment (for logo)
+        include_confirmation_link: Whether to add the signed double opt-in link
     """
     if not company_name:
         company_name = getattr(settings, 'COMPANY_NAME', 'Your Company')
@@ -138,6 +130,9 @@ def get_email_context(to_email: str, company_name: str = None, use_cid: bool = F
     return {
         'company_name': company_name,
         'subscriber_email': to_email,
+        'confirm_url': get_confirmation_url(to_email) if include_confirmation_link else None,
+        'confirm_days': getattr(settings, 'CONFIRMATION_TOKEN_MAX_AGE', 7 * 24 * 3600) // 86400,
+        'unsubscribe_url': get_unsubscribe_url(to_email),
         'support_email': getattr(settings, 'EMAIL_HOST_USER', 'support@company.com'),
         'logo_url': logo_url,  # Keep for fallback
         'logo_base64': logo_base64,  # Embedded logo
@@ -154,13 +149,16 @@ def get_email_context(to_email: str, company_name: str = None, use_cid: bool = F
         }
     }
 
-def send_confirmation_email(to_email: str, company_name: str = None) -> bool:
+def send_confirmation_email(to_email: str, company_name: str = None, include_confirmation_link: bool = True,
+                            raise_errors: bool = False) -> bool:
     """
     Send a confirmation email to a new subscriber.
     
     Args:
         to_email: The email address to send confirmation to
         company_name: Optional company name for personalization
+        include_confirmation_link: Whether to include the double opt-in link
+        raise_errors: Re-raise send failures (after logging) instead of returning False
     
     Returns:
         bool: True if email was sent successfully, False otherwise
@@ -168,6 +166,11 @@ def send_confirmation_email(to_email: str, company_name: str = None) -> bool:
     try:
         logger.debug(f"[EMAIL DEBUG] Starting email send process for: {to_email}")
         
+        # Never mail an address that has unsubscribed
+        if is_suppressed(to_email):
+            logger.info(f"[EMAIL SKIPPED] {to_email} is on the suppression list")
+            return False
+        
         # Debug: Check email settings
         logger.debug(f"[EMAIL DEBUG] Email backend: {settings.EMAIL_BACKEND}")
         logger.debug(f"[EMAIL DEBUG] Email host: {settings.EMAIL_HOST}")
@@ -176,11 +179,12 @@ def send_confirmation_email(to_email: str, company_name: str = None) -> bool:
         logger.debug(f"[EMAIL DEBUG] Email from: {getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@company.com')}")
         
         # Check if logo file exists for CID attachment
-        logo_path = get_logo_path()
-        use_cid = logo_path is not None and logo_path.exists()
+        logo_path, logo_data = get_logo_bytes()
+        use_cid = logo_path is not None
         
         # Get template context
-        context = get_email_context(to_email, company_name, use_cid=use_cid)
+        context = get_email_context(to_email, company_name, use_cid=use_cid,
+                                    include_confirmation_link=include_confirmation_link)
         logger.debug(f"[EMAIL DEBUG] Template context created: {context}")
         
         # Email subject - remove any [Yardee spaces] prefix
@@ -188,10 +192,11 @@ def send_confirmation_email(to_email: str, company_name: str = None) -> bool:
         # Remove [Yardee spaces] or [Yardee Spaces] from subject prefix
         subject_prefix = subject_prefix.replace('[Yardee spaces]', '').replace('[Yardee Spaces]', '').strip()
         # If prefix is empty or just whitespace, don't add it
+        subject_text = "Please confirm your subscription" if context['confirm_url'] else "Welcome to our newsletter!"
         if subject_prefix and not subject_prefix.isspace():
-            subject = f"{subject_prefix} Welcome to our newsletter!"
+            subject = f"{subject_prefix} {subject_text}"
         else:
-            subject = "Welcome to our newsletter!"
+            subject = subject_text
         logger.debug(f"[EMAIL DEBUG] Email subject: {subject}")
         
         # Render email template
@@ -206,6 +211,7 @@ def send_confirmation_email(to_email: str, company_name: str = None) -> bool:
             body='',  # Plain text fallback (empty for HTML-only)
             from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@company.com'),
             to=[to_email],
+            headers=get_list_unsubscribe_headers(to_email, context['unsubscribe_url']),
         )
         
         # Attach HTML content
@@ -215,9 +221,6 @@ def send_confirmation_email(to_email: str, company_name: str = None) -> bool:
         # Attach logo as CID if available (most reliable for Gmail and Outlook)
         if use_cid and logo_path:
             try:
-                with open(logo_path, 'rb') as f:
-                    logo_data = f.read()
-                
                 # Create MIMEImage attachment with CID
                 logo_img = MIMEImage(logo_data)
                 logo_img.add_header('Content-ID', '<logo>')
@@ -242,6 +245,8 @@ def send_confirmation_email(to_email: str, company_name: str = None) -> bool:
         logger.error(f"[EMAIL ERROR] Exception type: {type(e).__name__}")
         logger.error(f"[EMAIL ERROR] Exception message: {str(e)}")
         logger.exception(f"[EMAIL ERROR] Full traceback:")
+        if raise_errors:
+            raise
         return False
 
 def test_email_configuration() -> bool:
@@ -280,4 +285,253 @@ def test_email_configuration() -> bool:
         logger.error(f"[EMAIL ERROR] Exception type: {type(e).__name__}")
         logger.error(f"[EMAIL ERROR] Exception message: {str(e)}")
         logger.exception(f"[EMAIL ERROR] Full traceback:")
-        return False
\ No newline at end of file
+        return False
+
+
+class CircuitBreaker:
+    """
+    Stops SMTP sends after consecutive failures and probes for recovery.
+
+    Closed: sends go through. After ``threshold`` consecutive connection or
+    SMTP errors it opens: new sends are rejected straight away and queued ones
+    wait. After ``reset_timeout`` seconds it lets a single probe send through
+    (half-open); success closes it, failure opens it for another period.
+    """
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+    _GAUGE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Email circuit breaker {self.state} -> {state} ({self.failures} consecutive failures)")
+            metrics.incr('emails.breaker_transitions', to=state)
+        self.state = state
+        metrics.set_gauge('emails.breaker_state', self._GAUGE_VALUES[state])
+
+    def allow(self) -> bool:
+        """Whether new work should be accepted at all (False while open)"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            return self.state != self.OPEN
+
+    def acquire(self) -> float:
+        """Claim permission to send; returns 0 if granted, otherwise seconds to wait before asking again"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    return remaining
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return 0.5
+                self._probing = True
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            self._probing = False
+            self._set_state(self.CLOSED)
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def release(self):
+        """End a probe without a verdict (the send failed for a non-SMTP reason)"""
+        with self._lock:
+            self._probing = False
+
+
+class EmailExecutor:
+    """
+    Bounded pool of sender threads shared by all email work in a process.
+
+    ``submit()`` never blocks: when the queue is full or the breaker is open
+    the send is rejected (and logged) so request threads are not tied up by a
+    slow or unreachable SMTP server. ``drain()`` is called on worker shutdown
+    to finish queued sends within a deadline.
+    """
+
+    def __init__(self, workers: int, queue_size: int, breaker: CircuitBreaker):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.breaker = breaker
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._pid = None
+        self._closing = False
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, description: str = '', **kwargs) -> bool:
+        """Queue ``fn(*args, **kwargs)``; returns False if it was rejected"""
+        if self._closing:
+            return self._reject('shutdown', description)
+        if not self.breaker.allow():
+            return self._reject('breaker_open', description)
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait((fn, args, kwargs, description))
+        except queue.Full:
+            return self._reject('queue_full', description)
+        metrics.set_gauge('emails.queue_depth', self._queue.qsize())
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self.queue_size,
+            'workers': sum(1 for thread in self._threads if thread.is_alive()),
+            'breaker_state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+        }
+
+    def drain(self, timeout: float) -> bool:
+        """Stop accepting work and wait for queued sends; True if the queue emptied in time"""
+        self._closing = True
+        if self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+        dropped = []
+        while True:
+            try:
+                dropped.append(self._queue.get_nowait()[3])
+            except queue.Empty:
+                break
+        if dropped:
+            metrics.incr('emails.dropped', len(dropped))
+            logger.error(f"❌ [EMAIL ERROR] Shutdown deadline passed with {len(dropped)} emails unsent: {', '.join(dropped)}")
+            return False
+        return True
+
+    def _reject(self, reason: str, description: str) -> bool:
+        metrics.incr('emails.rejected', reason=reason)
+        logger.error(f"❌ [EMAIL ERROR] Email for {description} not queued ({reason}, depth {self._queue.qsize()})")
+        return False
+
+    def _ensure_workers(self):
+        # Threads do not survive fork, so each worker process starts its own senders
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._threads = []
+                self._pid = os.getpid()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'email-sender-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            fn, args, kwargs, description = self._queue.get()
+            try:
+                self._execute(fn, args, kwargs, description)
+            finally:
+                self._queue.task_done()
+                metrics.set_gauge('emails.queue_depth', self._queue.qsize())
+
+    def _execute(self, fn, args, kwargs, description: str):
+        # Queued sends wait out an open breaker instead of failing one after another
+        while True:
+            delay = self.breaker.acquire()
+            if not delay:
+                break
+            if self._closing:
+                metrics.incr('emails.dropped')
+                logger.error(f"❌ [EMAIL ERROR] Email for {description} dropped at shutdown (circuit breaker open)")
+                return
+            time.sleep(min(delay, 1.0))
+
+        start = time.perf_counter()
+        try:
+            fn(*args, **kwargs)
+        except smtplib.SMTPRecipientsRefused:
+            # The server is up and answered; only this address is bad
+            self.breaker.record_success()
+            metrics.incr('emails.failed', reason='recipient_refused')
+        except (smtplib.SMTPException, OSError) as e:
+            self.breaker.record_failure()
+            metrics.incr('emails.failed', reason=type(e).__name__)
+        except Exception as e:
+            self.breaker.release()
+            metrics.incr('emails.failed', reason=type(e).__name__)
+            logger.exception(f"❌ [EMAIL ERROR] Unexpected error sending email for {description}")
+        else:
+            self.breaker.record_success()
+            metrics.incr('emails.sent')
+        metrics.observe('emails.send_ms', (time.perf_counter() - start) * 1000)
+
+
+_executor = None
+_init_lock = threading.Lock()
+
+
+def get_email_executor() -> EmailExecutor:
+    global _executor
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                breaker = CircuitBreaker(
+                    getattr(settings, 'EMAIL_BREAKER_THRESHOLD', 5),
+                    getattr(settings, 'EMAIL_BREAKER_RESET', 30.0),
+                )
+                _executor = EmailExecutor(
+                    getattr(settings, 'EMAIL_WORKERS', 2),
+                    getattr(settings, 'EMAIL_QUEUE_SIZE', 200),
+                    breaker,
+                )
+                atexit.register(drain_email_executor)
+    return _executor
+
+
+def queue_confirmation_email(to_email: str, **kwargs) -> bool:
+    """
+    Send a confirmation email from the shared executor.
+
+    Returns:
+        bool: True if the send was queued, False if it was rejected
+    """
+    return get_email_executor().submit(send_confirmation_email, to_email, raise_errors=True,
+                                       description=to_email, **kwargs)
+
+
+def drain_email_executor(timeout: float = None) -> bool:
+    """Finish queued sends before the process exits (gunicorn worker_exit and atexit)"""
+    if _executor is None:
+        return True
+    if timeout is None:
+        timeout = getattr(settings, 'EMAIL_DRAIN_TIMEOUT', 20.0)
+    depth = _executor.depth()
+    start = time.monotonic()
+    drained = _executor.drain(timeout)
+    if depth:
+        logger.info(f"Drained email queue ({depth} queued) in {time.monotonic() - start:.1f}s")
+    return drained
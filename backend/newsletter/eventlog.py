@@ -0,0 +1,253 @@
+"""
+Append-only local log of subscription events (audit trail)
+
+Each worker process appends to its own segment files in EVENT_LOG_DIR from a
+background writer thread. The writer takes every event queued since its last
+write, appends them with a single write() and makes them durable with one
+fsync. While that fsync runs, new events queue up and go into the next group
+commit, so a burst of signups costs a few fsyncs rather than one each.
+
+Segment format: the 8-byte magic ``NLEVLOG1`` followed by records of
+``<uint32 length><uint32 crc32>`` (little-endian) and a compact JSON payload
+``{"type", "email", "ts", ...}``. Segments rotate at EVENT_LOG_SEGMENT_BYTES
+and are named ``<start ms>-<pid>-<seq>.seg``. A crash can leave a torn last
+record; readers stop at the first record whose length or CRC does not check
+out.
+
+Events are logged after the database commit and buffered in memory until the
+next group commit (at most EVENT_LOG_COMMIT_INTERVAL plus one fsync), so a
+process killed in that window loses them; ``manage.py replay_event_log
+--verify`` reports any drift against the Subscription table.
+"""
+import atexit
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from django.conf import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NLEVLOG1'
+RECORD_HEADER = struct.Struct('<II')
+SEGMENT_SUFFIX = '.seg'
+
+
+def encode_record(event: dict) -> bytes:
+    payload = json.dumps(event, separators=(',', ':')).encode()
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def iter_segment(path: Path, strict: bool = False):
+    """
+    Yield the events of one segment, scanning it through a read-only memory map.
+
+    Args:
+        strict: Raise on a torn or corrupt record instead of stopping there
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if view[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not an event log segment")
+            offset = len(MAGIC)
+            while offset + RECORD_HEADER.size <= size:
+                length, crc = RECORD_HEADER.unpack_from(view, offset)
+                start = offset + RECORD_HEADER.size
+                end = start + length
+                payload = view[start:end]
+                if end > size or zlib.crc32(payload) != crc:
+                    message = f"Torn or corrupt record at byte {offset} of {path}"
+                    if strict:
+                        raise ValueError(message)
+                    logger.warning(f"{message}; ignoring the rest of the segment")
+                    return
+                yield json.loads(payload)
+                offset = end
+
+
+def list_segments(directory: Path) -> list:
+    return sorted(directory.glob(f'*{SEGMENT_SUFFIX}'))
+
+
+def read_events(directory: Path, strict: bool = False):
+    """
+    Yield every event in the log in timestamp order.
+
+    Each segment is already in order, so the per-process segments are merged
+    lazily rather than loaded and sorted.
+    """
+    by_writer = {}
+    for path in list_segments(directory):
+        # <start ms>-<pid>-<seq>.seg: one writer's segments are sequential
+        writer = path.stem.split('-')[1] if path.stem.count('-') >= 2 else path.stem
+        by_writer.setdefault(writer, []).append(path)
+
+    def chain(paths):
+        for path in paths:
+            yield from iter_segment(path, strict)
+
+    yield from heapq.merge(*(chain(paths) for paths in by_writer.values()), key=lambda event: event['ts'])
+
+
+class EventLog:
+    """Per-process group-commit writer for the event log"""
+
+    def __init__(self, directory: Path, segment_bytes: int, commit_interval: float, fsync: bool = True):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self._pending = []
+        self._appended = 0
+        self._committed = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._file = None
+        self._segment_size = 0
+        self._segment_seq = 0
+
+    def append(self, event_type: str, emails, **data):
+        """Queue events for the next group commit; never blocks on disk"""
+        self._ensure_writer()
+        emails = list(emails)
+        with self._cond:
+            # Stamped under the lock so each segment is in timestamp order
+            ts = time.time()
+            events = [{'type': event_type, 'email': email, 'ts': ts, **data} for email in emails]
+            self._pending.extend(events)
+            self._appended += len(events)
+            self._cond.notify()
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything appended so far is on disk; True if it made it in time"""
+        if not self._pending and self._committed >= self._appended:
+            return True
+        self._ensure_writer()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._appended
+            while self._committed < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _ensure_writer(self):
+        # Threads do not survive fork, so each worker process starts its own writer and segments
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Events and the open segment inherited from the parent are the parent's to write
+                self._file = None
+                self._pending = []
+                self._appended = self._committed = 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+            self._thread.start()
+
+    def _close_segment(self):
+        """Close the current segment file, if any; the next commit opens a new one"""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except OSError as e:
+            logger.warning(f"Closing event log segment failed: {e}")
+        self._file = None
+
+    def _open_segment(self):
+        self._close_segment()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segment_seq += 1
+        name = f'{int(time.time() * 1000):013d}-{os.getpid()}-{self._segment_seq:06d}{SEGMENT_SUFFIX}'
+        self._file = open(self.directory / name, 'ab', buffering=0)
+        self._file.write(MAGIC)
+        self._segment_size = len(MAGIC)
+        metrics.incr('eventlog.segments')
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Give concurrent appends a moment to join this commit
+            if self.commit_interval:
+                time.sleep(self.commit_interval)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            try:
+                self._commit(batch)
+            except Exception as e:
+                logger.error(f"Event log write of {len(batch)} events failed, will retry: {e}")
+                metrics.incr('eventlog.write_errors')
+                self._close_segment()
+                with self._cond:
+                    self._pending[:0] = batch
+                time.sleep(1)
+                continue
+            with self._cond:
+                self._committed += len(batch)
+                self._cond.notify_all()
+
+    def _commit(self, batch: list):
+        data = b''.join(encode_record(event) for event in batch)
+        if self._file is None or self._segment_size + len(data) > self.segment_bytes:
+            self._open_segment()
+        start = time.perf_counter()
+        self._file.write(data)
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._segment_size += len(data)
+        metrics.incr('eventlog.events', len(batch))
+        metrics.incr('eventlog.commits')
+        metrics.observe('eventlog.commit_events', len(batch))
+        metrics.observe('eventlog.commit_ms', (time.perf_counter() - start) * 1000)
+        metrics.set_gauge('eventlog.queue_depth', len(self._pending))
+
+
+_event_log = None
+_init_lock = threading.Lock()
+
+
+def event_log_enabled() -> bool:
+    return bool(getattr(settings, 'EVENT_LOG_ENABLED', False) and getattr(settings, 'EVENT_LOG_DIR', ''))
+
+
+def get_event_log():
+    """The process-wide event log writer, or None when the log is disabled"""
+    global _event_log
+    if not event_log_enabled():
+        return None
+    if _event_log is None:
+        with _init_lock:
+            if _event_log is None:
+                _event_log = EventLog(
+                    settings.EVENT_LOG_DIR,
+                    segment_bytes=getattr(settings, 'EVENT_LOG_SEGMENT_BYTES', 64 * 1024 * 1024),
+                    commit_interval=getattr(settings, 'EVENT_LOG_COMMIT_INTERVAL', 0.005),
+                    fsync=getattr(settings, 'EVENT_LOG_FSYNC', True),
+                )
+                atexit.register(_event_log.flush, 5.0)
+    return _event_log
+
+
+def flush_event_log(timeout: float = 10.0) -> bool:
+    return _event_log.flush(timeout) if _event_log is not None else True
@@ -0,0 +1,52 @@
+"""
+Subscription events
+
+Write paths call ``publish_on_commit()`` after changing subscriptions. Once
+the transaction commits, the events are appended to the local audit log
+(newsletter.eventlog) and buffered for downstream webhooks
+(newsletter.webhooks). Neither does any I/O on the caller's thread.
+"""
+from django.db import transaction
+from .eventlog import event_log_enabled, flush_event_log, get_event_log
+from .webhooks import flush_webhooks, publish_subscription_events, webhooks_enabled
+
+SUBSCRIPTION_CREATED = 'subscription.created'
+SUBSCRIPTION_CONFIRMED = 'subscription.confirmed'
+SUBSCRIPTION_UNSUBSCRIBED = 'subscription.unsubscribed'
+SUBSCRIPTION_EXPIRED = 'subscription.expired'
+SUBSCRIPTION_ARCHIVED = 'subscription.archived'
+
+
+def events_enabled() -> bool:
+    """True if anything consumes events; batch jobs skip fetching addresses otherwise"""
+    return event_log_enabled() or webhooks_enabled()
+
+
+def publish_events(event_type: str, emails, **data):
+    """
+    Record events in the audit log and queue them for webhooks.
+
+    Args:
+        event_type: One of the SUBSCRIPTION_* constants
+        emails: Addresses the event applies to
+        **data: Extra fields added to every event (e.g. reason)
+    """
+    event_log = get_event_log()
+    if event_log is not None:
+        event_log.append(event_type, emails, **data)
+    publish_subscription_events(event_type, emails, **data)
+
+
+def publish_on_commit(event_type: str, emails, **data):
+    """Publish once the current transaction commits (immediately in autocommit mode)"""
+    if not events_enabled():
+        return
+    emails = list(emails)
+    transaction.on_commit(lambda: publish_events(event_type, emails, **data))
+
+
+def flush_events(timeout: float = 10.0) -> bool:
+    """Make logged events durable and deliver buffered webhooks; used by batch jobs between chunks"""
+    logged = flush_event_log(timeout)
+    delivered = flush_webhooks(timeout)
+    return logged and delivered
@@ -0,0 +1,224 @@
+"""
+Latency and fault injection database backend, for local performance testing
+
+Wraps any real backend so a fast local database behaves like one across a
+network. Every round trip (statement, commit, rollback) sleeps, opening a
+connection pays a handshake, the first connection after an idle period stalls
+like a resuming serverless database, and connections drop at random:
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'newsletter.faultdb',
+            'INNER_ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'FAULTS': {'PROFILE': 'azure_sql', 'DISCONNECT_RATE': 0.01},
+        }
+    }
+
+FAULTS starts from the named PROFILE and any other key overrides it:
+
+- LATENCY_MS, JITTER_MS: each round trip takes LATENCY_MS + uniform(0, JITTER_MS)
+- CONNECT_MS: added to every new connection (TLS and login), plus the same jitter
+- COLD_START_MS, IDLE_SECONDS: stall when connecting for the first time in the
+  process, or after the alias saw no round trips for IDLE_SECONDS
+- DISCONNECT_RATE: chance per round trip that the connection drops; that
+  statement and everything else on the connection raise OperationalError until
+  Django closes it and reconnects
+- SEED: make the random draws repeatable
+
+Setting DB_FAULT_PROFILE wraps every configured database this way; never set it
+in production.
+"""
+import logging
+import random
+import threading
+import time
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.db.utils import load_backend
+from newsletter import metrics
+
+logger = logging.getLogger(__name__)
+
+ENGINE = 'newsletter.faultdb'
+
+DEFAULTS = {
+    'LATENCY_MS': 0.0,
+    'JITTER_MS': 0.0,
+    'CONNECT_MS': 0.0,
+    'COLD_START_MS': 0.0,
+    'IDLE_SECONDS': 300.0,
+    'DISCONNECT_RATE': 0.0,
+    'SEED': None,
+}
+
+PROFILES = {
+    # Pass-through: counts round trips and connects without slowing anything down
+    'none': {},
+    # A database on the same host or LAN
+    'lan': {'LATENCY_MS': 0.3, 'JITTER_MS': 0.4, 'CONNECT_MS': 3},
+    # Azure SQL as production sees it: 20-80 ms per round trip, a TLS login per
+    # connection, resume stalls after idling and the odd dropped connection
+    'azure_sql': {
+        'LATENCY_MS': 20, 'JITTER_MS': 60, 'CONNECT_MS': 120,
+        'COLD_START_MS': 3000, 'IDLE_SECONDS': 300, 'DISCONNECT_RATE': 0.002,
+    },
+    # azure_sql during a failover or throttling episode
+    'azure_sql_flaky': {
+        'LATENCY_MS': 20, 'JITTER_MS': 60, 'CONNECT_MS': 120,
+        'COLD_START_MS': 3000, 'IDLE_SECONDS': 300, 'DISCONNECT_RATE': 0.03,
+    },
+}
+
+_classes_lock = threading.Lock()
+_wrapper_classes = {}
+
+# Last round trip per alias, shared by all threads: drives the cold-start stall
+_activity_lock = threading.Lock()
+_last_activity = {}
+
+
+def fault_settings(settings_dict: dict) -> dict:
+    """Resolve a FAULTS entry (profile plus overrides) into a full settings dict"""
+    faults = dict(settings_dict.get('FAULTS') or {})
+    profile = faults.pop('PROFILE', 'none')
+    if profile not in PROFILES:
+        raise ImproperlyConfigured(f"Unknown FAULTS profile '{profile}'; choose from {', '.join(PROFILES)}")
+    unknown = set(faults) - set(DEFAULTS)
+    if unknown:
+        raise ImproperlyConfigured(f"Unknown FAULTS keys: {', '.join(sorted(unknown))}")
+    return {**DEFAULTS, **PROFILES[profile], **faults, 'PROFILE': profile}
+
+
+def wrap_settings(settings_dict: dict, profile: str, **overrides) -> dict:
+    """Return a copy of a DATABASES entry that runs through this backend with the given profile"""
+    inner = settings_dict.get('INNER_ENGINE') if settings_dict['ENGINE'] == ENGINE else settings_dict['ENGINE']
+    return {**settings_dict, 'ENGINE': ENGINE, 'INNER_ENGINE': inner, 'FAULTS': {'PROFILE': profile, **overrides}}
+
+
+def mark_idle(alias: str = None):
+    """Forget recent activity so the next connection pays the cold-start stall"""
+    with _activity_lock:
+        if alias is None:
+            _last_activity.clear()
+        else:
+            _last_activity.pop(alias, None)
+
+
+def _touch(alias: str):
+    with _activity_lock:
+        _last_activity[alias] = time.monotonic()
+
+
+def _idle_for(alias: str) -> float:
+    with _activity_lock:
+        last = _last_activity.get(alias)
+    return float('inf') if last is None else time.monotonic() - last
+
+
+class FaultInjectingCursor:
+    """DB-API cursor proxy that spends one round trip per execute/executemany"""
+
+    def __init__(self, cursor, db):
+        self.cursor = cursor
+        self.db = db
+
+    def execute(self, *args, **kwargs):
+        self.db.round_trip()
+        return self.cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self.db.round_trip()
+        return self.cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+class FaultInjectionMixin:
+    """Mixed into the inner backend's DatabaseWrapper by fault_injecting_class()"""
+
+    def __init__(self, settings_dict, alias=DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        self.faults = fault_settings(settings_dict)
+        self.fault_random = random.Random(self.faults['SEED'])
+        self.dropped = False
+
+    def sample_delay(self, base_ms: float) -> float:
+        jitter = self.faults['JITTER_MS']
+        return base_ms + (self.fault_random.uniform(0, jitter) if jitter else 0.0)
+
+    def round_trip(self):
+        """Sleep for one network round trip; raise if the connection is (or just got) dropped"""
+        if self.dropped:
+            raise self.Database.OperationalError('Connection was dropped (newsletter.faultdb)')
+        delay_ms = self.sample_delay(self.faults['LATENCY_MS'])
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        _touch(self.alias)
+        metrics.incr('db.faults.round_trips', alias=self.alias)
+        metrics.incr('db.faults.delay_ms', delay_ms, alias=self.alias)
+
+        rate = self.faults['DISCONNECT_RATE']
+        if rate and self.fault_random.random() < rate:
+            self.dropped = True
+            metrics.incr('db.faults.disconnects', alias=self.alias)
+            logger.info(f"Injected disconnect on '{self.alias}'")
+            raise self.Database.OperationalError('Connection was dropped (newsletter.faultdb)')
+
+    def get_new_connection(self, conn_params):
+        delay_ms = self.sample_delay(self.faults['CONNECT_MS'])
+        cold = self.faults['COLD_START_MS'] and _idle_for(self.alias) > self.faults['IDLE_SECONDS']
+        if cold:
+            delay_ms += self.faults['COLD_START_MS']
+            metrics.incr('db.faults.cold_starts', alias=self.alias)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        _touch(self.alias)
+        metrics.incr('db.faults.connects', alias=self.alias)
+        metrics.observe('db.faults.connect_ms', delay_ms, alias=self.alias)
+        connection = super().get_new_connection(conn_params)
+        self.dropped = False
+        return connection
+
+    def create_cursor(self, name=None):
+        return FaultInjectingCursor(super().create_cursor(name), self)
+
+    def _commit(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.round_trip()
+        return super()._commit()
+
+    def _rollback(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.round_trip()
+        return super()._rollback()
+
+    def is_usable(self):
+        return not self.dropped and super().is_usable()
+
+
+def fault_injecting_class(inner_engine: str):
+    """Subclass of inner_engine's DatabaseWrapper with FaultInjectionMixin, built once per engine"""
+    with _classes_lock:
+        wrapper_class = _wrapper_classes.get(inner_engine)
+        if wrapper_class is None:
+            inner = load_backend(inner_engine).DatabaseWrapper
+            wrapper_class = type(f'FaultInjecting{inner.__name__}', (FaultInjectionMixin, inner), {})
+            _wrapper_classes[inner_engine] = wrapper_class
+    return wrapper_class
+
+
+class DatabaseWrapper:
+    """What Django instantiates for ENGINE 'newsletter.faultdb': the wrapped INNER_ENGINE backend"""
+
+    def __new__(cls, settings_dict, alias=DEFAULT_DB_ALIAS):
+        inner_engine = settings_dict.get('INNER_ENGINE')
+        if not inner_engine or inner_engine == ENGINE:
+            raise ImproperlyConfigured(f"Database '{alias}' uses {ENGINE} but has no INNER_ENGINE")
+        return fault_injecting_class(inner_engine)(settings_dict, alias)
@@ -0,0 +1,196 @@
+"""
+Idempotency support for API endpoints that must survive proxy and client retries
+"""
+import hashlib
+import json
+import logging
+import time
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+# Returned when a duplicate is still in flight after we gave up waiting for it
+IN_PROGRESS_BODY = b'{"error": "Request already in progress"}'
+
+# Returned when an Idempotency-Key is reused for a different request body
+KEY_REUSED_BODY = b'{"error": "Idempotency-Key was already used for a different request"}'
+
+# Poll interval while a concurrent duplicate waits on the first request
+POLL_INTERVAL = 0.05
+
+# Cache backends that keep entries inside one process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_idempotency_cache():
+    """Return the cache used to share idempotency records between workers"""
+    return caches[getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'default')]
+
+
+def warn_if_cache_is_local():
+    """Log a warning if idempotency records are not shared between worker processes"""
+    alias = getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if backend in LOCAL_CACHE_BACKENDS:
+        logger.warning(f"Idempotency cache '{alias}' ({backend.rsplit('.', 1)[-1]}) is per process: retries that "
+                       f"reach another worker are not collapsed. Set REDIS_URL to share it.")
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def derive_idempotency_key(request) -> str:
+    """
+    Build the idempotency key for a request.
+
+    An explicit ``Idempotency-Key`` header wins; the stored response is then
+    bound to the request body (see ``request_fingerprint``). Otherwise the key is
+    derived from the normalized email in the JSON body, and its response is
+    kept for ``IDEMPOTENCY_WINDOW`` seconds, so retries of the same signup within
+    that window collapse wherever they fall on the clock.
+
+    Returns:
+        str: Cache key prefix, or None if the request cannot be keyed
+    """
+    header_key = request.META.get(IDEMPOTENCY_HEADER, '').strip()
+    if header_key:
+        return f"idem:{request.path}:h:{_hash(header_key)}"
+
+    try:
+        data = json.loads(request.body)
+        email = data.get('email', '').strip().lower()
+    except (ValueError, AttributeError):
+        return None
+    if not email:
+        return None
+    return f"idem:{request.path}:e:{_hash(email)}"
+
+
+def request_fingerprint(request):
+    """
+    Hash of the body of a request that carries an Idempotency-Key header.
+
+    Returns:
+        str: Hex digest, or None for requests keyed on their email instead
+    """
+    if not request.META.get(IDEMPOTENCY_HEADER, '').strip():
+        return None
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def _serialize_response(response, fingerprint) -> dict:
+    return {
+        'status': response.status_code,
+        'content': response.content,
+        'headers': list(response.items()),
+        'fingerprint': fingerprint,
+    }
+
+
+def _replay_response(stored: dict, fingerprint, key: str) -> HttpResponse:
+    if fingerprint is not None and stored.get('fingerprint') != fingerprint:
+        # Never hand one request's answer (e.g. another address's signup) to a different request
+        logger.warning(f"Idempotency key {key} reused with a different request body")
+        return HttpResponse(KEY_REUSED_BODY, status=422, content_type='application/json')
+    response = HttpResponse(stored['content'], status=stored['status'])
+    for header, value in stored['headers']:
+        response[header] = value
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _wait_for_result(store, result_key: str, lock_key: str):
+    """
+    Wait for a concurrent duplicate to finish.
+
+    Returns the stored response once available, or None when the first request
+    released its lock without storing a result (e.g. it failed with a 5xx).
+    Returns False if the first request is still running at the deadline.
+    """
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        stored = store.get(result_key)
+        if stored is not None:
+            return stored
+        if store.get(lock_key) is None:
+            return None
+    return False
+
+
+def _release_lock(store, lock_key: str, token: str):
+    """
+    Delete the lock only if this request still holds it. If the view outlived
+    IDEMPOTENCY_LOCK_TIMEOUT, the lock may now belong to a duplicate that took over.
+    """
+    if store.get(lock_key) == token:
+        store.delete(lock_key)
+
+
+def idempotent(view_func):
+    """
+    Make a POST view safe to retry.
+
+    Completed (non-5xx) responses are stored for ``IDEMPOTENCY_TTL`` seconds
+    (``IDEMPOTENCY_WINDOW`` for keys derived from the email) and replayed to
+    retries without running the view again. Concurrent duplicates
+    wait for the first request's result instead of racing it. Reusing an
+    Idempotency-Key with a different body gets a 422.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view_func(request, *args, **kwargs)
+
+        key = derive_idempotency_key(request)
+        if key is None:
+            return view_func(request, *args, **kwargs)
+
+        fingerprint = request_fingerprint(request)
+        store = get_idempotency_cache()
+        result_key = f"{key}:response"
+        lock_key = f"{key}:lock"
+        lock_timeout = getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 30)
+        if fingerprint is not None:
+            result_ttl = getattr(settings, 'IDEMPOTENCY_TTL', 600)
+        else:
+            result_ttl = getattr(settings, 'IDEMPOTENCY_WINDOW', 60)
+        token = uuid.uuid4().hex
+
+        stored = store.get(result_key)
+        if stored is not None:
+            logger.info(f"Replaying stored response for idempotency key {key}")
+            return _replay_response(stored, fingerprint, key)
+
+        while not store.add(lock_key, token, lock_timeout):
+            logger.info(f"Duplicate request in flight for idempotency key {key}, waiting")
+            stored = _wait_for_result(store, result_key, lock_key)
+            if stored:
+                return _replay_response(stored, fingerprint, key)
+            if stored is False:
+                logger.warning(f"Timed out waiting on in-flight request for idempotency key {key}")
+                response = HttpResponse(IN_PROGRESS_BODY, status=409, content_type='application/json')
+                response['Retry-After'] = '1'
+                return response
+            # The first request gave up without a result; try to take over
+
+        try:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code < 500 and not response.streaming:
+                store.set(result_key, _serialize_response(response, fingerprint), result_ttl)
+            return response
+        finally:
+            _release_lock(store, lock_key, token)
+
+    return wrapper
@@ -0,0 +1,220 @@
+"""
+Legal pages built from the plain-text sources at the repository root
+
+``manage.py build_legal_pages`` renders `Privacy Policy.txt` and
+`Terms and Conditions.txt` into HTML, fingerprints each page by content hash,
+writes gzip and brotli variants and a manifest. The API serves the manifest's
+pages from memory with strong ETags, long-lived Cache-Control for
+fingerprinted URLs and 304 responses for revalidation.
+"""
+import gzip
+import hashlib
+import html
+import json
+import logging
+import re
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+# name -> (source file at the repository root, page title)
+LEGAL_PAGES = {
+    'privacy': ('Privacy Policy.txt', 'Privacy Policy'),
+    'terms': ('Terms and Conditions.txt', 'Terms and Conditions'),
+}
+
+MANIFEST_NAME = 'manifest.json'
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+# Encodings in server preference order, with the ETag suffix for each representation
+ENCODINGS = (('br', '-br'), ('gzip', '-gz'))
+
+_EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+_URL_RE = re.compile(r'\bwww\.[\w-]+(?:\.[\w-]+)+')
+# PDF-extracted sources sometimes run several "- Item" entries together on one line
+_INLINE_ITEM_RE = re.compile(r'\s+-\s+(?=[A-Z])')
+_WRAP_WIDTH = 60
+# Phrases linked to the sibling page
+_CROSS_LINKS = {'our Privacy Policy': '/privacy.html', 'these Terms and Conditions': '/terms.html'}
+
+
+def linkify(text: str) -> str:
+    """Escape text and turn email addresses and www. hosts into links"""
+    link_class = 'text-[#224432] underline hover:text-[#2d5a3d]'
+    escaped = html.escape(text, quote=False)
+    escaped = _EMAIL_RE.sub(lambda m: f'<a href="mailto:{m.group(0)}" class="{link_class}">{m.group(0)}</a>', escaped)
+    escaped = _URL_RE.sub(lambda m: f'<a href="https://{m.group(0)}" class="{link_class}">{m.group(0)}</a>', escaped)
+    for phrase, href in _CROSS_LINKS.items():
+        prefix, _, label = phrase.partition(' ')
+        escaped = escaped.replace(phrase, f'{prefix} <a href="{href}" class="{link_class}">{label}</a>')
+    return mark_safe(escaped)
+
+
+def parse_legal_text(text: str) -> dict:
+    """
+    Turn a legal source text into page parts.
+
+    The first three lines are the title, effective date and company. Blank
+    lines separate sections; a short line ending in ':' opens a section
+    (h2, or h3 directly under a heading-only section), '- ' lines become list
+    items, and long wrapped lines are joined back into one paragraph.
+
+    Returns:
+        dict: title, effective_date, company and a list of (kind, html) blocks
+    """
+    lines = [line.strip() for line in text.replace('\r\n', '\n').split('\n')]
+    header = lines[:3]
+    sections, current = [], []
+    for line in lines[3:]:
+        if line:
+            current.append(line)
+        elif current:
+            sections.append(current)
+            current = []
+    if current:
+        sections.append(current)
+
+    blocks = []
+    previous_was_heading_only = False
+    for section in sections:
+        start = len(blocks)
+        for index, line in enumerate(section):
+            next_line = section[index + 1] if index + 1 < len(section) else ''
+            is_heading = line.endswith(':') and len(line) <= _WRAP_WIDTH and not line.startswith('- ')
+            if line.startswith('- '):
+                items = _INLINE_ITEM_RE.split(line[2:])
+                if blocks and blocks[-1][0] == 'list' and len(blocks) > start:
+                    blocks[-1][1].extend(linkify(item) for item in items)
+                else:
+                    blocks.append(('list', [linkify(item) for item in items]))
+            elif index == 0 and (is_heading or len(section) == 1 and len(line) <= _WRAP_WIDTH and not line.endswith('.')):
+                blocks.append(('h3' if previous_was_heading_only else 'h2', linkify(line)))
+            elif is_heading and not next_line.startswith('- '):
+                blocks.append(('subheading', linkify(line)))
+            elif (len(blocks) > start and blocks[-1][0] == 'p' and blocks[-1][2] >= _WRAP_WIDTH
+                  and not blocks[-1][3].endswith(('.', ':', ';'))):
+                # Continuation of a wrapped line
+                kind, _, _, raw = blocks[-1]
+                joined = f'{raw} {line}'
+                blocks[-1] = (kind, linkify(joined), len(line), joined)
+            else:
+                blocks.append(('p', linkify(line), len(line), line))
+        previous_was_heading_only = len(section) == 1 and len(blocks) > start and blocks[-1][0] in ('h2', 'h3')
+
+    # The closing acknowledgement gets its own style
+    if blocks and blocks[-1][0] == 'p':
+        blocks[-1] = ('closing',) + blocks[-1][1:]
+
+    year = re.search(r'\d{4}', header[1]) if len(header) > 1 else None
+    return {
+        'title': header[0] if header else '',
+        'effective_date': header[1] if len(header) > 1 else '',
+        'company': header[2] if len(header) > 2 else '',
+        'year': year.group(0) if year else '',
+        'blocks': [(block[0], block[1]) for block in blocks],
+    }
+
+
+def render_legal_page(name: str, text: str) -> str:
+    """Render one legal page to a complete HTML document"""
+    context = parse_legal_text(text)
+    context['source_name'], context['page_title'] = LEGAL_PAGES[name]
+    return render_to_string('newsletter/legal_page.html', context)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress_variants(data: bytes) -> dict:
+    """
+    Precompressed variants of a page at maximum compression.
+
+    Brotli needs the optional ``Brotli`` package and is skipped without it.
+    """
+    # mtime=0 keeps the gzip bytes (and their hash) identical across builds
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        logger.warning("Brotli is not installed; skipping .br variants")
+    else:
+        variants['br'] = brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)
+    return variants
+
+
+def get_source_dir() -> Path:
+    return Path(getattr(settings, 'LEGAL_SOURCE_DIR', '') or Path(settings.BASE_DIR).parent)
+
+
+def get_pages_dir() -> Path:
+    """Directory holding the fingerprinted pages and manifest"""
+    configured = getattr(settings, 'LEGAL_PAGES_DIR', '')
+    if configured:
+        return Path(configured)
+    candidates = [
+        Path(settings.BASE_DIR) / 'frontend' / 'public' / 'legal',
+        Path(settings.BASE_DIR).parent / 'frontend' / 'public' / 'legal',
+    ]
+    for path in candidates:
+        if (path / MANIFEST_NAME).exists():
+            return path
+    return candidates[-1]
+
+
+class LegalPage:
+    """One built page held in memory with its encoded representations"""
+
+    def __init__(self, name: str, entry: dict, directory: Path):
+        self.name = name
+        self.fingerprint = entry['fingerprint']
+        self.etag_base = entry['sha256']
+        self.bodies = {'identity': (directory / entry['file']).read_bytes()}
+        for encoding, filename in entry.get('encodings', {}).items():
+            path = directory / filename
+            if path.exists():
+                self.bodies[encoding] = path.read_bytes()
+
+    def etag(self, encoding: str) -> str:
+        suffix = dict(ENCODINGS).get(encoding, '')
+        return f'"{self.etag_base}{suffix}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """True if If-None-Match names any representation of this content"""
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip().removeprefix('W/')
+            if tag.strip('"').startswith(self.etag_base):
+                return True
+        return False
+
+    def negotiate(self, accept_encoding: str) -> str:
+        """Pick the best available encoding the client accepts"""
+        accepted = {
+            part.split(';')[0].strip().lower()
+            for part in accept_encoding.split(',')
+            if not part.strip().endswith(('q=0', 'q=0.0'))
+        }
+        for encoding, _ in ENCODINGS:
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return 'identity'
+
+
+@lru_cache(maxsize=1)
+def load_legal_pages() -> dict:
+    """Load every page in the manifest once per process"""
+    directory = get_pages_dir()
+    try:
+        manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        logger.error(f"Legal pages manifest not found in {directory}; run manage.py build_legal_pages")
+        return {}
+    return {name: LegalPage(name, entry, directory) for name, entry in manifest['pages'].items()}
@@ -0,0 +1,233 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from newsletter.confirmation import iter_pk_chunks
+from newsletter.models import ArchivedSubscription, Subscription, Suppression, normalize_email
+from newsletter.events import SUBSCRIPTION_ARCHIVED, events_enabled, flush_events, publish_on_commit
+from datetime import timedelta
+from pathlib import Path
+import gzip
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+UNCONFIRMED = 'unconfirmed'
+UNSUBSCRIBED = 'unsubscribed'
+AGED = 'aged'
+REASONS = (UNSUBSCRIBED, UNCONFIRMED, AGED)
+
+
+class Checkpoint:
+    """
+    Progress of one archival run, written after every committed chunk.
+
+    A run that is interrupted (or stopped by --time-limit) resumes from the
+    last committed primary key with the same cutoffs and output file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.state = {}
+
+    def load(self) -> dict:
+        try:
+            self.state = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            self.state = {}
+        return self.state
+
+    def save(self, **changes):
+        self.state.update(changes, updated_at=timezone.now().isoformat())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.state, indent=2, sort_keys=True))
+        os.replace(temporary, self.path)
+
+
+def write_ndjson_chunk(path: Path, records: list):
+    """
+    Append records to a gzipped NDJSON file as one gzip member.
+
+    Concatenated members read back as a single stream (``gzip.open`` and
+    ``zcat`` both handle them), so each chunk is durable on its own; the file
+    is fsynced before the caller deletes the rows.
+    """
+    data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(data, mtime=0))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Command(BaseCommand):
+    help = ('Move unconfirmed, unsubscribed or aged subscriptions into the archive table or gzipped NDJSON '
+            'files, in small keyset-ordered chunks with one short transaction each')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reason', action='append', choices=REASONS, dest='reasons',
+            help='What to archive (repeatable; default: unconfirmed and unsubscribed)'
+        )
+        parser.add_argument(
+            '--unconfirmed-days', type=int, default=getattr(settings, 'UNCONFIRMED_EXPIRY_DAYS', 14),
+            help='Archive pending subscriptions older than this many days'
+        )
+        parser.add_argument('--older-than-days', type=int, help='Archive any subscription older than this (reason "aged")')
+        parser.add_argument('--to', choices=('table', 'ndjson'), default='table', help='Archive destination')
+        parser.add_argument(
+            '--output-dir', default=str(Path(settings.BASE_DIR) / 'archive'),
+            help='Directory for .ndjson.gz files (with --to ndjson)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Rows per transaction; keep well below SQL Server's 5,000-lock escalation threshold"
+        )
+        parser.add_argument('--sleep', type=float, default=0.5, help='Seconds to pause between chunks')
+        parser.add_argument(
+            '--checkpoint', default=str(Path(settings.BASE_DIR) / 'archive' / 'archive_subscriptions.checkpoint.json'),
+            help='Progress file used to resume an interrupted run'
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an unfinished checkpoint and start over')
+        parser.add_argument('--time-limit', type=float, help='Stop after this many seconds; re-run to resume')
+        parser.add_argument('--dry-run', action='store_true', help='Count matching rows without archiving')
+
+    def handle(self, *args, **options):
+        reasons = set(options['reasons'] or [UNCONFIRMED, UNSUBSCRIBED])
+        if AGED in reasons and not options['older_than_days']:
+            raise CommandError('--reason aged requires --older-than-days')
+        if options['older_than_days']:
+            reasons.add(AGED)
+        reasons = sorted(reasons)
+        if options['batch_size'] < 1 or options['batch_size'] > 4000:
+            raise CommandError('--batch-size must be between 1 and 4000 to avoid lock escalation')
+
+        checkpoint = Checkpoint(Path(options['checkpoint']))
+        state = {} if options['restart'] or options['dry_run'] else checkpoint.load()
+        if state and not state.get('completed'):
+            if state['reasons'] != reasons or state['to'] != options['to']:
+                raise CommandError(
+                    f'Unfinished run in {checkpoint.path} archived {state["reasons"]} to {state["to"]}; '
+                    'repeat it or pass --restart'
+                )
+            self.stdout.write(f'Resuming after id {state["last_pk"]} ({state["archived"]} rows already archived)')
+        else:
+            now = timezone.now()
+            output = None
+            if options['to'] == 'ndjson':
+                output = str(Path(options['output_dir']) / f'subscriptions-{now:%Y%m%dT%H%M%S}.ndjson.gz')
+            state = {
+                'reasons': reasons,
+                'to': options['to'],
+                'output': output,
+                'unconfirmed_before': (now - timedelta(days=options['unconfirmed_days'])).isoformat(),
+                'aged_before': (now - timedelta(days=options['older_than_days'])).isoformat()
+                               if options['older_than_days'] else None,
+                'started_at': now.isoformat(),
+                'last_pk': 0,
+                'archived': 0,
+                'completed': False,
+            }
+
+        unconfirmed_before = parse_datetime(state['unconfirmed_before'])
+        aged_before = parse_datetime(state['aged_before']) if state['aged_before'] else None
+        criteria = Q(pk__in=[])
+        if UNCONFIRMED in reasons:
+            criteria |= Q(confirmed_at__isnull=True, subscribed_at__lt=unconfirmed_before)
+        if UNSUBSCRIBED in reasons:
+            criteria |= Q(email__in=Suppression.objects.values('email'))
+        if AGED in reasons:
+            criteria |= Q(subscribed_at__lt=aged_before)
+        matching = Subscription.objects.filter(criteria)
+
+        if options['dry_run']:
+            self.stdout.write(f'{matching.count()} subscriptions would be archived ({", ".join(reasons)})')
+            return
+
+        output = Path(state['output']) if state['output'] else None
+        start = time.monotonic()
+        stopped_early = False
+        for pks in iter_pk_chunks(matching, options['batch_size'], start_after=state['last_pk']):
+            archived = self.archive_chunk(pks, criteria, reasons, unconfirmed_before, output)
+            state['archived'] += archived
+            state['last_pk'] = pks[-1]
+            checkpoint.save(**state)
+            self.stdout.write(f'Archived {state["archived"]} subscriptions (last id {pks[-1]})')
+            # Log and deliver this chunk's events before the next, so the buffers never overflow
+            flush_events()
+
+            if options['time_limit'] and time.monotonic() - start >= options['time_limit']:
+                stopped_early = True
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        if stopped_early:
+            self.stdout.write(self.style.WARNING(
+                f'Stopped after {options["time_limit"]}s at id {state["last_pk"]}; run again to resume'
+            ))
+            return
+
+        state['completed'] = True
+        checkpoint.save(**state)
+        destination = output or ArchivedSubscription._meta.db_table
+        logger.info(f'Archived {state["archived"]} subscriptions ({", ".join(reasons)}) to {destination}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Archived {state["archived"]} subscriptions to {destination}'))
+
+    def archive_chunk(self, pks: list, criteria: Q, reasons: list, unconfirmed_before, output) -> int:
+        """Copy and delete one chunk in a single short transaction; returns rows archived"""
+        with transaction.atomic():
+            # Lock the chunk's rows and re-check the criteria, so a row confirmed meanwhile stays live
+            rows = list(
+                Subscription.objects.select_for_update().filter(criteria, pk__in=pks)
+                .order_by('pk').values_list('pk', 'email', 'subscribed_at', 'confirmed_at')
+            )
+            if not rows:
+                return 0
+            emails = [email for _, email, _, _ in rows]
+            suppressed = set()
+            if UNSUBSCRIBED in reasons:
+                suppressed = set(Suppression.objects.filter(
+                    email__in={normalize_email(email) for email in emails}
+                ).values_list('email', flat=True))
+
+            archived_at = timezone.now()
+            records = []
+            for pk, email, subscribed_at, confirmed_at in rows:
+                if normalize_email(email) in suppressed:
+                    reason = UNSUBSCRIBED
+                elif UNCONFIRMED in reasons and confirmed_at is None and subscribed_at < unconfirmed_before:
+                    reason = UNCONFIRMED
+                else:
+                    reason = AGED
+                records.append({
+                    'original_id': pk, 'email': email, 'subscribed_at': subscribed_at,
+                    'confirmed_at': confirmed_at, 'reason': reason, 'archived_at': archived_at,
+                })
+
+            if output is not None:
+                write_ndjson_chunk(output, [
+                    {key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in record.items()}
+                    for record in records
+                ])
+            else:
+                # A chunk re-run after a crash may already be archived; skip those rows
+                # (mssql-django does not support bulk_create(ignore_conflicts=True))
+                existing = set(
+                    ArchivedSubscription.objects.filter(original_id__in=[record['original_id'] for record in records])
+                    .order_by().values_list('original_id', flat=True)
+                )
+                ArchivedSubscription.objects.bulk_create(
+                    [ArchivedSubscription(**record) for record in records if record['original_id'] not in existing]
+                )
+            Subscription.objects.filter(pk__in=[record['original_id'] for record in records]).delete()
+            if events_enabled():
+                publish_on_commit(SUBSCRIPTION_ARCHIVED, emails)
+
+        return len(records)
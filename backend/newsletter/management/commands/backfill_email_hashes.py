@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from newsletter.models import Subscription, hash_email
+import time
+
+
+class Command(BaseCommand):
+    help = ('Fill email_hash on subscriptions written without one, by workers of the previous release '
+            'while 0007/0008 were rolling out; run once every old container is gone')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows updated per transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Count rows without a hash without updating')
+
+    def handle(self, *args, **options):
+        pending = Subscription.objects.filter(email_hash__isnull=True).order_by('pk')
+        if options['dry_run']:
+            self.stdout.write(f'{pending.count()} subscriptions have no email_hash')
+            return
+
+        total = 0
+        conflicts = []
+        last_pk = 0
+        while True:
+            rows = list(pending.filter(pk__gt=last_pk).only('pk', 'email')[:options['batch_size']])
+            if not rows:
+                break
+            for row in rows:
+                row.email_hash = hash_email(row.email)
+            try:
+                with transaction.atomic():
+                    Subscription.objects.bulk_update(rows, ['email_hash'])
+                total += len(rows)
+            except IntegrityError:
+                # A case variant of an address that already has a row; apply the rest one by one
+                for row in rows:
+                    try:
+                        with transaction.atomic():
+                            Subscription.objects.filter(pk=row.pk).update(email_hash=row.email_hash)
+                        total += 1
+                    except IntegrityError:
+                        conflicts.append(row.email)
+            last_pk = rows[-1].pk
+            self.stdout.write(f'Hashed {total} subscriptions (last id {last_pk})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        if conflicts:
+            raise CommandError(
+                f'{len(conflicts)} rows duplicate another address when compared case-insensitively: '
+                f'{", ".join(sorted(conflicts)[:20])}. Delete the extra rows and run this again.'
+            )
+        self.stdout.write(self.style.SUCCESS(f'✓ Hashed {total} subscriptions'))
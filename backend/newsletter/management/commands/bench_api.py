@@ -0,0 +1,54 @@
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+import logging
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Measure in-process latency of the constant API paths (preflight, health, 405) through the full handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Requests per scenario')
+        parser.add_argument('--origin', default='https://yardeespaces.com', help='Origin header to send')
+
+    def scenarios(self, origin):
+        factory = RequestFactory()
+        return [
+            ('preflight', lambda: factory.options(
+                '/api/subscribe/', HTTP_ORIGIN=origin,
+                HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST',
+                HTTP_ACCESS_CONTROL_REQUEST_HEADERS='content-type',
+            )),
+            ('health', lambda: factory.get('/api/health/', HTTP_ORIGIN=origin)),
+            ('method not allowed', lambda: factory.get('/api/subscribe/', HTTP_ORIGIN=origin)),
+        ]
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        # Keep per-request 4xx/invalid-method log lines from flooding the output
+        for name in ('django.request', 'newsletter.views'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+        with override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False):
+            handler = WSGIHandler()
+            self.stdout.write(f'{"scenario":<20} {"p50 us":>9} {"p95 us":>9} {"p99 us":>9} {"req/s":>9}')
+            for name, build in self.scenarios(options['origin']):
+                requests = [build() for _ in range(iterations)]
+                # Warm up URL resolver, settings and middleware caches
+                for request in requests[:50]:
+                    handler.get_response(request)
+
+                timings = []
+                for request in requests:
+                    start = time.perf_counter()
+                    handler.get_response(request)
+                    timings.append((time.perf_counter() - start) * 1_000_000)
+
+                timings.sort()
+                p50 = statistics.median(timings)
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                p99 = timings[int(len(timings) * 0.99) - 1]
+                rate = 1_000_000 / statistics.mean(timings)
+                self.stdout.write(f'{name:<20} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {rate:>9.0f}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from newsletter.confirmation import make_confirmation_token, verify_confirmation_token
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark signing and CPU-only verification of double opt-in confirmation tokens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help='Tokens to sign and verify')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        emails = [f'subscriber{i}@example.com' for i in range(iterations)]
+
+        start = time.perf_counter()
+        tokens = [make_confirmation_token(email) for email in emails]
+        sign_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        verified = sum(1 for token in tokens if verify_confirmation_token(token) is not None)
+        verify_elapsed = time.perf_counter() - start
+
+        tampered = [token[:-2] + ('AA' if not token.endswith('AA') else 'BB') for token in tokens[:1000]]
+        rejected = sum(1 for token in tampered if verify_confirmation_token(token) is None)
+
+        self.stdout.write(f'Signed   {iterations} tokens: {iterations / sign_elapsed:>10.0f}/s '
+                          f'({sign_elapsed / iterations * 1e6:.1f} us each)')
+        self.stdout.write(f'Verified {verified} tokens: {iterations / verify_elapsed:>10.0f}/s '
+                          f'({verify_elapsed / iterations * 1e6:.1f} us each)')
+        self.stdout.write(f'Rejected {rejected}/{len(tampered)} tampered tokens')
+        self.stdout.write(f'Average token length: {sum(map(len, tokens)) // len(tokens)} characters')
@@ -0,0 +1,171 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.test.utils import override_settings
+from io import StringIO
+from newsletter import metrics
+from newsletter.faultdb.base import PROFILES, mark_idle, wrap_settings
+from newsletter.models import Subscription, hash_email
+import json
+import logging
+import statistics
+import time
+import uuid
+
+PATHS = ('subscribe', 'admin', 'warmup')
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def fault_counter(snapshot: dict, name: str) -> float:
+    return sum(value for key, value in snapshot['counters'].items() if key.startswith(f'db.faults.{name}{{'))
+
+
+class Command(BaseCommand):
+    help = ('Run the subscribe, admin and warmup paths with every database wrapped in newsletter.faultdb, '
+            'once per latency profile, and report latency, round trips and connects per request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                            help='Fault profile to run (repeatable; default: none and azure_sql)')
+        parser.add_argument('--paths', default=','.join(PATHS), help=f'Comma-separated subset of {", ".join(PATHS)}')
+        parser.add_argument('--requests', type=int, default=40, help='Requests per path and profile')
+        parser.add_argument('--warmups', type=int, default=3, help='Cold warmup_db runs per profile')
+        parser.add_argument('--conn-max-age', type=int,
+                            help='Override CONN_MAX_AGE (production uses 0: a new connection per request)')
+        parser.add_argument('--seed', type=int, default=1, help='Seed for latency and disconnect draws')
+
+    def handle(self, *args, **options):
+        profiles = options['profile'] or ['none', 'azure_sql']
+        paths = [path.strip() for path in options['paths'].split(',') if path.strip()]
+        unknown = set(paths) - set(PATHS)
+        if unknown:
+            raise CommandError(f'Unknown paths: {", ".join(sorted(unknown))}')
+
+        original = {alias: dict(connections.settings[alias]) for alias in connections}
+        overrides = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'IDEMPOTENCY_CACHE_ALIAS': 'default',
+            'ALLOWED_HOSTS': ['testserver'],
+            'SECURE_SSL_REDIRECT': False,
+        }
+        user = get_user_model().objects.create_superuser(
+            username=f'bench-db-{uuid.uuid4().hex[:8]}', email='', password=None
+        )
+        created_emails = []
+        results = []
+        # Injected disconnects are counted as errors below; their tracebacks would drown the report
+        request_logger = logging.getLogger('django.request')
+        request_log_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            with override_settings(**overrides):
+                for profile in profiles:
+                    self.install(original, profile, options)
+                    self.stdout.write(f'Profile {profile}...')
+                    for path in paths:
+                        run = getattr(self, f'run_{path}')
+                        results.append((profile, path, run(user, created_emails, options)))
+        finally:
+            request_logger.setLevel(request_log_level)
+            self.install(original, None, options)
+            for index in range(0, len(created_emails), 500):
+                Subscription.objects.filter(
+                    email_hash__in=[hash_email(email) for email in created_emails[index:index + 500]]
+                ).delete()
+            user.delete()
+
+        self.stdout.write('')
+        self.stdout.write(f'{"profile":<16} {"path":<10} {"n":>4} {"p50 ms":>8} {"p95 ms":>8} {"max ms":>8} '
+                          f'{"trips":>6} {"connects":>8} {"injected":>9} {"errors":>6}')
+        for profile, path, result in results:
+            self.stdout.write(
+                f'{profile:<16} {path:<10} {result["n"]:>4} {result["p50"]:>8.1f} {result["p95"]:>8.1f} '
+                f'{result["max"]:>8.1f} {result["round_trips"]:>6.1f} {result["connects"]:>8.2f} '
+                f'{result["injected_ms"]:>7.0f}ms {result["errors"]:>6}'
+            )
+        self.stdout.write('trips, connects and injected are per request; injected excludes connect and cold-start delays')
+
+    def install(self, original: dict, profile, options: dict):
+        """Point every alias at a fresh wrapper for the profile (None restores the original settings)"""
+        for alias, settings_dict in original.items():
+            connections[alias].close()
+            if profile is None:
+                connections.settings[alias] = settings_dict
+            else:
+                wrapped = wrap_settings(settings_dict, profile, SEED=options['seed'])
+                if options['conn_max_age'] is not None:
+                    wrapped['CONN_MAX_AGE'] = options['conn_max_age']
+                connections.settings[alias] = wrapped
+            # The next access in this thread builds a connection from the new settings
+            del connections[alias]
+        mark_idle()
+
+    def measure(self, requests: list) -> dict:
+        """Time each callable like one request: close_old_connections() after it, as the WSGI handler does"""
+        timings = []
+        errors = 0
+        metrics.reset()
+        for request in requests:
+            begin = time.perf_counter()
+            try:
+                ok = request()
+            except Exception:
+                ok = False
+            close_old_connections()
+            timings.append((time.perf_counter() - begin) * 1000)
+            errors += not ok
+        snapshot = metrics.snapshot()
+        n = len(timings)
+        return {
+            'n': n,
+            'p50': statistics.median(timings),
+            'p95': percentile(timings, 0.95),
+            'max': max(timings),
+            'round_trips': fault_counter(snapshot, 'round_trips') / n,
+            'connects': fault_counter(snapshot, 'connects') / n,
+            'injected_ms': fault_counter(snapshot, 'delay_ms') / n,
+            'errors': errors,
+        }
+
+    def run_subscribe(self, user, created_emails: list, options: dict) -> dict:
+        client = Client(raise_request_exception=False)
+
+        def signup():
+            email = f'bench-db-{uuid.uuid4().hex[:12]}@example.com'
+            created_emails.append(email)
+            response = client.post('/api/subscribe/', json.dumps({'email': email}), content_type='application/json',
+                                   HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)
+            return response.status_code < 500
+
+        # Pay the cold-start stall before measuring; the warmup path reports it
+        connections['default'].ensure_connection()
+        return self.measure([signup] * options['requests'])
+
+    def run_admin(self, user, created_emails: list, options: dict) -> dict:
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+
+        def changelist():
+            return client.get('/admin/newsletter/subscription/').status_code == 200
+
+        def search():
+            return client.get('/admin/newsletter/subscription/', {'q': 'example.com'}).status_code == 200
+
+        return self.measure([changelist, search] * (options['requests'] // 2 or 1))
+
+    def run_warmup(self, user, created_emails: list, options: dict) -> dict:
+        def warmup():
+            # Every run starts from closed, idle connections, like a fresh container
+            for alias in connections:
+                connections[alias].close()
+            mark_idle()
+            call_command('warmup_db', stdout=StringIO())
+            return True
+
+        return self.measure([warmup] * options['warmups'])
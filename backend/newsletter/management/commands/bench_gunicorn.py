@@ -0,0 +1,156 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from newsletter.memory import process_memory
+from pathlib import Path
+import http.client
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# The flags start.sh used before gunicorn.conf.py
+LEGACY_ARGS = ['--workers', '2', '--threads', '4', '--worker-class', 'gthread', '--worker-tmp-dir', '/dev/shm',
+               '--log-level', 'info', '--access-logfile', '-', '--error-logfile', '-']
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def child_pids(pid: int) -> list:
+    children = Path(f'/proc/{pid}/task/{pid}/children')
+    try:
+        return [int(p) for p in children.read_text().split()]
+    except OSError:
+        return []
+
+
+class Command(BaseCommand):
+    help = ('Start gunicorn with the legacy start.sh flags and with gunicorn.conf.py, and compare '
+            'boot time, memory of the process tree and request throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per path')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent keep-alive clients')
+        parser.add_argument('--paths', default='/api/health/,/api/legal/privacy/', help='Comma-separated paths to load')
+        parser.add_argument('--workers', type=int, help='Worker count for the configured run (default: auto-sized)')
+
+    def handle(self, *args, **options):
+        config_path = Path(settings.BASE_DIR) / 'gunicorn.conf.py'
+        if not config_path.exists():
+            raise CommandError(f'{config_path} not found')
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            raise CommandError('gunicorn is not installed')
+        paths = [p.strip() for p in options['paths'].split(',') if p.strip()]
+
+        # No recycling during the run, so memory is compared between long-lived workers
+        env = dict(os.environ, GUNICORN_MAX_REQUESTS='0')
+        if options['workers']:
+            env['GUNICORN_WORKERS'] = str(options['workers'])
+        runs = [
+            ('legacy flags', LEGACY_ARGS, dict(env)),
+            ('gunicorn.conf.py', ['-c', str(config_path)], env),
+        ]
+
+        results = []
+        for name, args, run_env in runs:
+            self.stdout.write(f'Benchmarking {name}...')
+            results.append((name, self.run(args, run_env, paths, options)))
+
+        self.stdout.write('')
+        self.stdout.write(f'{"":<18} {"workers":>8} {"boot ms":>8} {"RSS MiB":>8} {"PSS MiB":>8} {"private":>8}'
+                          + ''.join(f' {path[:18]:>20}' for path in paths))
+        for name, result in results:
+            rates = ''.join(f' {result["rates"][path]:>14.0f} req/s' for path in paths)
+            self.stdout.write(
+                f'{name:<18} {result["workers"]:>8} {result["boot_ms"]:>8.0f} {result["rss"] / 1048576:>8.1f} '
+                f'{result["pss"] / 1048576:>8.1f} {result["private"] / 1048576:>8.1f}{rates}'
+            )
+            for path in paths:
+                p50, p99 = result['latency'][path]
+                self.stdout.write(f'{"":<18} {path}: p50 {p50:.2f}ms, p99 {p99:.2f}ms')
+
+    def run(self, args, env, paths, options):
+        port = free_port()
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--chdir', str(settings.BASE_DIR),
+                   *args, 'backend.wsgi:application']
+        start = time.perf_counter()
+        # Started outside the backend directory so the legacy run does not pick up ./gunicorn.conf.py.
+        # Access logs (stdout) are discarded; boot and worker memory lines stay on stderr.
+        process = subprocess.Popen(command, cwd=tempfile.gettempdir(), env=env, stdout=subprocess.DEVNULL)
+        try:
+            self.wait_ready(port, process)
+            boot_ms = (time.perf_counter() - start) * 1000
+            # Let every worker finish booting before measuring memory
+            time.sleep(2)
+            workers = child_pids(process.pid)
+
+            rates, latency = {}, {}
+            for path in paths:
+                rates[path], latency[path] = self.load(port, path, options['duration'], options['concurrency'])
+
+            memory = [process_memory(pid) for pid in [process.pid, *workers]]
+            return {
+                'workers': len(workers),
+                'boot_ms': boot_ms,
+                'rss': sum(m['rss'] for m in memory),
+                'pss': sum(m['pss'] for m in memory),
+                'private': sum(m['private'] for m in memory),
+                'rates': rates,
+                'latency': latency,
+            }
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+
+    def wait_ready(self, port: int, process, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {process.returncode}')
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+                connection.request('GET', '/api/health/')
+                if connection.getresponse().status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.05)
+        raise CommandError('gunicorn did not become ready')
+
+    def load(self, port: int, path: str, duration: float, concurrency: int):
+        """Drive one path with keep-alive clients; returns (requests/s, (p50 ms, p99 ms))"""
+        deadline = time.monotonic() + duration
+
+        def client():
+            timings = []
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            while time.monotonic() < deadline:
+                begin = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers={'Accept-Encoding': 'br, gzip'})
+                    connection.getresponse().read()
+                except (OSError, http.client.HTTPException):
+                    # The worker closed the connection (e.g. max_requests); reconnect
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                    continue
+                timings.append((time.perf_counter() - begin) * 1000)
+            connection.close()
+            return timings
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = [t for result in pool.map(lambda _: client(), range(concurrency)) for t in result]
+        if not timings:
+            return 0.0, (0.0, 0.0)
+        timings.sort()
+        return len(timings) / duration, (statistics.median(timings), timings[int(len(timings) * 0.99) - 1])
@@ -0,0 +1,164 @@
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand
+from django.db import connections, models, transaction
+from django.utils import timezone
+from newsletter.models import EMAIL_HASH_BYTES, FixedBinaryField, hash_email
+import random
+import statistics
+import time
+
+
+def build_models(suffix: str) -> dict:
+    """
+    Throwaway copies of the subscription table before 0007 and once email_hash is the only key,
+    registered in a private app registry so they never touch real migrations.
+    """
+    registry = Apps()
+
+    class LegacySubscription(models.Model):
+        # As left by 0003: unique + db_index + an explicit index on email
+        email = models.EmailField(unique=True, db_index=True)
+        subscribed_at = models.DateTimeField(default=timezone.now, db_index=True)
+        confirmed_at = models.DateTimeField(null=True)
+
+        class Meta:
+            app_label = 'newsletter'
+            apps = registry
+            db_table = f'bench_subscription_legacy_{suffix}'
+            indexes = [
+                models.Index(fields=['email'], name=f'bench_legacy_email_{suffix}'),
+                models.Index(fields=['-subscribed_at'], name=f'bench_legacy_subscr_{suffix}'),
+            ]
+
+    class LeanSubscription(models.Model):
+        email = models.EmailField()
+        email_hash = FixedBinaryField(max_length=EMAIL_HASH_BYTES, unique=True)
+        subscribed_at = models.DateTimeField(default=timezone.now)
+        confirmed_at = models.DateTimeField(null=True)
+
+        class Meta:
+            app_label = 'newsletter'
+            apps = registry
+            db_table = f'bench_subscription_lean_{suffix}'
+            indexes = [models.Index(fields=['-subscribed_at'], name=f'bench_lean_subscr_{suffix}')]
+
+    return {'before': LegacySubscription, 'after': LeanSubscription}
+
+
+def index_sizes(connection, table: str) -> dict:
+    """Bytes used by each index of a table, where the backend exposes it"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'microsoft':
+            cursor.execute(
+                'SELECT i.name, SUM(s.used_page_count) * 8192 FROM sys.dm_db_partition_stats s '
+                'JOIN sys.indexes i ON i.object_id = s.object_id AND i.index_id = s.index_id '
+                'WHERE s.object_id = OBJECT_ID(%s) AND i.index_id > 1 GROUP BY i.name', [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT indexrelname, pg_relation_size(indexrelid) FROM pg_stat_user_indexes '
+                'WHERE relname = %s', [table]
+            )
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT m.name, SUM(d.pgsize) FROM dbstat d JOIN sqlite_master m ON m.name = d.name "
+                    "WHERE m.type = 'index' AND m.tbl_name = %s GROUP BY m.name", [table]
+                )
+            except Exception:
+                return {}
+        else:
+            return {}
+        return dict(cursor.fetchall())
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Compare inserts and address lookups on the old subscription schema (three email indexes) '
+            'and the lean one (16-byte email_hash key) using temporary tables')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Rows bulk-loaded into each table')
+        parser.add_argument('--operations', type=int, default=2000,
+                            help='Single-row signups and lookups timed on each table')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk insert')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--keep', action='store_true', help='Leave the benchmark tables in place')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        suffix = f'{int(time.time())}'
+        variants = build_models(suffix)
+        domains = ['gmail.com', 'outlook.com', 'yardeespaces.com', 'example.org']
+        emails = [f'subscriber.{i:07d}.{random.getrandbits(24):06x}@{domains[i % 4]}' for i in range(options['rows'])]
+        # Real signups arrive in no particular alphabetical order
+        random.shuffle(emails)
+        new_emails = [f'signup.{i:06d}@{domains[i % 4]}' for i in range(options['operations'])]
+        probes = random.sample(emails, min(options['operations'], len(emails)))
+
+        results = {}
+        for label, model in variants.items():
+            lean = label == 'after'
+
+            def key(email):
+                return {'email_hash': hash_email(email)} if lean else {'email': email}
+
+            def row(email):
+                return model(email=email, email_hash=hash_email(email)) if lean else model(email=email)
+
+            with connection.schema_editor() as editor:
+                editor.create_model(model)
+            try:
+                manager = model.objects.using(options['database'])
+                start = time.perf_counter()
+                for index in range(0, len(emails), options['batch_size']):
+                    chunk = emails[index:index + options['batch_size']]
+                    with transaction.atomic(using=options['database']):
+                        manager.bulk_create([row(email) for email in chunk])
+                bulk_elapsed = time.perf_counter() - start
+
+                # The subscribe path: look the address up under lock, insert if new, commit
+                insert_us = []
+                for email in new_emails:
+                    begin = time.perf_counter()
+                    with transaction.atomic(using=options['database']):
+                        manager.select_for_update().get_or_create(defaults={'email': email}, **key(email))
+                    insert_us.append((time.perf_counter() - begin) * 1e6)
+
+                lookup_us = []
+                for email in probes:
+                    begin = time.perf_counter()
+                    found = manager.filter(**key(email)).values_list('pk', flat=True).first()
+                    lookup_us.append((time.perf_counter() - begin) * 1e6)
+                    assert found is not None
+
+                results[label] = {
+                    'bulk': len(emails) / bulk_elapsed,
+                    'insert_p50': statistics.median(insert_us),
+                    'insert_p99': percentile(insert_us, 0.99),
+                    'lookup_p50': statistics.median(lookup_us),
+                    'lookup_p99': percentile(lookup_us, 0.99),
+                    'indexes': index_sizes(connection, model._meta.db_table),
+                }
+            finally:
+                if not options['keep']:
+                    with connection.schema_editor() as editor:
+                        editor.delete_model(model)
+
+        self.stdout.write(f'{options["rows"]} rows, {options["operations"]} signups and lookups per schema '
+                          f'on {connection.vendor}')
+        for label, result in results.items():
+            self.stdout.write(
+                f'{label:<7} bulk insert {result["bulk"]:>9,.0f} rows/s   '
+                f'signup p50 {result["insert_p50"]:>7.0f}us p99 {result["insert_p99"]:>7.0f}us   '
+                f'lookup p50 {result["lookup_p50"]:>6.0f}us p99 {result["lookup_p99"]:>6.0f}us'
+            )
+            for name, size in sorted(result['indexes'].items()):
+                self.stdout.write(f'          index {name:<48} {size / 1024:>9,.0f} KiB')
+            if result['indexes']:
+                self.stdout.write(f'          {len(result["indexes"])} secondary indexes, '
+                                  f'{sum(result["indexes"].values()) / 1024:,.0f} KiB total')
@@ -0,0 +1,158 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from newsletter import metrics
+from newsletter.events import SUBSCRIPTION_CREATED
+from newsletter.webhooks import ID_HEADER, SIGNATURE_HEADER, TIMESTAMP_HEADER, build_dispatcher, verify_signature
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+
+
+class Receiver:
+    """Stand-in downstream system: verifies signatures, deduplicates batches and records event lag"""
+
+    def __init__(self, secret: str, latency: float = 0.0, fail_rate: float = 0.0, verbose: bool = False):
+        self.secret = secret
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.batch_ids = set()
+        self.events = 0
+        self.duplicates = 0
+        self.bad_signatures = 0
+        self.failures_injected = 0
+        self.connections = 0
+        self.lags = []
+
+    def handler_class(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with receiver.lock:
+                    receiver.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status = receiver.receive(self.headers, body)
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def receive(self, headers, body: bytes) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.secret and not verify_signature(self.secret, headers.get(TIMESTAMP_HEADER), body,
+                                                headers.get(SIGNATURE_HEADER)):
+            with self.lock:
+                self.bad_signatures += 1
+            return 401
+        if self.fail_rate and random.random() < self.fail_rate:
+            with self.lock:
+                self.failures_injected += 1
+            return 503
+
+        received = datetime.now().astimezone()
+        payload = json.loads(body)
+        with self.lock:
+            if headers.get(ID_HEADER) in self.batch_ids:
+                self.duplicates += 1
+                return 200
+            self.batch_ids.add(headers.get(ID_HEADER))
+            self.events += len(payload['events'])
+            for event in payload['events']:
+                self.lags.append((received - datetime.fromisoformat(event['occurred_at'])).total_seconds() * 1000)
+        if self.verbose:
+            types = sorted({event['type'] for event in payload['events']})
+            print(f"{headers.get(ID_HEADER)}: {len(payload['events'])} events {', '.join(types)}", flush=True)
+        return 200
+
+
+class Command(BaseCommand):
+    help = ('Publish subscription events through the webhook dispatcher to a local stand-in receiver '
+            'and report throughput, delivery lag and retries (or run just the receiver with --serve)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20000, help='Events to publish')
+        parser.add_argument('--rate', type=float, default=0, help='Events per second to publish (0 = as fast as possible)')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--flush-interval', type=float, default=0.2)
+        parser.add_argument('--concurrency', type=int, default=2, help='Sender threads per target')
+        parser.add_argument('--latency', type=float, default=0.01, help='Receiver processing time per batch, seconds')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of batches answered with 503')
+        parser.add_argument('--secret', default='bench-secret')
+        parser.add_argument('--serve', type=int, metavar='PORT',
+                            help='Only run the receiver on this port (point WEBHOOK_URLS at it)')
+
+    def handle(self, *args, **options):
+        receiver = Receiver(options['secret'], options['latency'], options['fail_rate'], verbose=bool(options['serve']))
+        server = ThreadingHTTPServer(('127.0.0.1', options['serve'] or 0), receiver.handler_class())
+        server.daemon_threads = True
+        url = f'http://127.0.0.1:{server.server_port}/webhooks'
+        if options['serve']:
+            self.stdout.write(f'Receiving on {url} (secret "{options["secret"]}"), Ctrl+C to stop')
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            return
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        dispatcher = build_dispatcher(
+            [url], secret=options['secret'], batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'], concurrency=options['concurrency'],
+            max_buffer=max(options['events'], 10000), backoff=0.05,
+        )
+        publish_us = []
+        start = time.perf_counter()
+        for index in range(options['events']):
+            if options['rate']:
+                delay = start + index / options['rate'] - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            occurred_at = datetime.now().astimezone().isoformat()
+            event = {'id': uuid.uuid4().hex, 'type': SUBSCRIPTION_CREATED,
+                     'email': f'bench{index}@example.com', 'occurred_at': occurred_at}
+            begin = time.perf_counter()
+            dispatcher.publish([event])
+            publish_us.append((time.perf_counter() - begin) * 1_000_000)
+        published = time.perf_counter() - start
+        drained = dispatcher.flush(timeout=120)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+        lags = sorted(receiver.lags)
+        snapshot = metrics.snapshot()
+        retries = sum(v for k, v in snapshot['counters'].items() if k.startswith('webhooks.retries'))
+        failed = sum(v for k, v in snapshot['counters'].items() if k.startswith('webhooks.failed_events'))
+        publish_us.sort()
+
+        self.stdout.write(f'Published {options["events"]} events in {published:.2f}s '
+                          f'(publish p50 {statistics.median(publish_us):.1f}us, '
+                          f'p99 {publish_us[int(len(publish_us) * 0.99) - 1]:.1f}us)')
+        self.stdout.write(f'Delivered {receiver.events} events in {len(receiver.batch_ids)} batches over '
+                          f'{receiver.connections} connections in {elapsed:.2f}s '
+                          f'({receiver.events / elapsed:,.0f} events/s)')
+        if lags:
+            self.stdout.write(f'Lag p50 {statistics.median(lags):.0f}ms, p99 {lags[int(len(lags) * 0.99) - 1]:.0f}ms, '
+                              f'max {lags[-1]:.0f}ms')
+        self.stdout.write(f'Retries {retries:.0f} ({receiver.failures_injected} injected failures), '
+                          f'duplicates {receiver.duplicates}, bad signatures {receiver.bad_signatures}, '
+                          f'failed events {failed:.0f}')
+        if drained and receiver.events == options['events'] and not receiver.bad_signatures:
+            self.stdout.write(self.style.SUCCESS('✓ All events delivered'))
+        else:
+            self.stdout.write(self.style.ERROR('✗ Some events were not delivered'))
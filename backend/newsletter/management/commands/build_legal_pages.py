@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from newsletter.legal import (
+    FINGERPRINT_LENGTH, LEGAL_PAGES, MANIFEST_NAME, compress_variants, content_hash,
+    get_source_dir, render_legal_page,
+)
+from pathlib import Path
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+ENCODING_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+
+class Command(BaseCommand):
+    help = ('Build the privacy and terms pages from the repository text files: fingerprinted HTML, '
+            'gzip/brotli variants and a manifest for ETag/Cache-Control serving')
+
+    def add_arguments(self, parser):
+        frontend = Path(settings.BASE_DIR).parent / 'frontend'
+        parser.add_argument('--source-dir', default=None, help='Directory with the .txt sources (defaults to the repo root)')
+        parser.add_argument('--output-dir', default=str(frontend / 'public'), help='Frontend public directory')
+        parser.add_argument(
+            '--frontend-manifest', default=str(frontend / 'src' / 'legal-manifest.json'),
+            help='Fingerprint map bundled into main.js'
+        )
+        parser.add_argument('--check', action='store_true', help='Fail if the built files are out of date (CI drift guard)')
+
+    def build(self, source_dir: Path):
+        """Return {relative path: bytes} for every output file plus the manifest entries"""
+        files = {}
+        pages = {}
+        for name, (source_name, _) in LEGAL_PAGES.items():
+            source = source_dir / source_name
+            if not source.exists():
+                raise CommandError(f'Legal source not found: {source}')
+            html = render_legal_page(name, source.read_text(encoding='utf-8')).encode('utf-8')
+            digest = content_hash(html)
+            fingerprint = digest[:FINGERPRINT_LENGTH]
+            filename = f'{name}.{fingerprint}.html'
+
+            # Stable URL used by direct links; same bytes as the fingerprinted copy
+            files[f'{name}.html'] = html
+            files[f'legal/{filename}'] = html
+            encodings, encoded_sizes = {}, {}
+            for encoding, data in compress_variants(html).items():
+                encoded_name = filename + ENCODING_SUFFIXES[encoding]
+                files[f'legal/{encoded_name}'] = data
+                encodings[encoding] = encoded_name
+                encoded_sizes[encoding] = len(data)
+
+            pages[name] = {
+                'source': source_name,
+                'file': filename,
+                'fingerprint': fingerprint,
+                'sha256': digest,
+                'size': len(html),
+                'encodings': encodings,
+                'encoded_sizes': encoded_sizes,
+            }
+        manifest = json.dumps({'pages': pages}, indent=2, sort_keys=True) + '\n'
+        files[f'legal/{MANIFEST_NAME}'] = manifest.encode('utf-8')
+        return files, pages
+
+    def handle(self, *args, **options):
+        source_dir = Path(options['source_dir']) if options['source_dir'] else get_source_dir()
+        output_dir = Path(options['output_dir'])
+        frontend_manifest = Path(options['frontend_manifest'])
+
+        files, pages = self.build(source_dir)
+        fingerprints = json.dumps({name: page['fingerprint'] for name, page in pages.items()}, indent=2, sort_keys=True) + '\n'
+        outputs = {output_dir / path: data for path, data in files.items()}
+        outputs[frontend_manifest] = fingerprints.encode('utf-8')
+
+        legal_dir = output_dir / 'legal'
+        current = set(outputs)
+        stale = [path for path in legal_dir.glob('*') if path not in current] if legal_dir.exists() else []
+
+        if options['check']:
+            changed = [path for path, data in outputs.items() if not path.exists() or path.read_bytes() != data]
+            if changed or stale:
+                listing = '\n'.join(f'  {path}' for path in changed + stale)
+                raise CommandError(f'Legal pages are out of date; run manage.py build_legal_pages:\n{listing}')
+            self.stdout.write(self.style.SUCCESS('✓ Legal pages are up to date'))
+            return
+
+        legal_dir.mkdir(parents=True, exist_ok=True)
+        for path, data in outputs.items():
+            if path.exists() and path.read_bytes() == data:
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+        # Old fingerprints are no longer referenced by any manifest
+        for path in stale:
+            path.unlink()
+
+        for name, page in pages.items():
+            sizes = ', '.join(f'{encoding} {size:,}' for encoding, size in sorted(page['encoded_sizes'].items()))
+            self.stdout.write(f'{name:<8} {page["file"]:<28} {page["size"]:>7,} bytes ({sizes})')
+        logger.info(f'Built legal pages into {output_dir}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Built {len(pages)} legal pages into {output_dir}'))
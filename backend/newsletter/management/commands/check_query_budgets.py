@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.test import Client
+from django.test.utils import override_settings
+from newsletter.confirmation import make_confirmation_token
+from newsletter.models import Subscription, Suppression, hash_email
+from newsletter.querystats import record_queries
+from newsletter.unsubscribe import get_suppression_list, get_unsubscribe_queue, make_unsubscribe_token
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Exercise the API and admin views and fail if any exceeds its QUERY_BUDGETS entry (CI-friendly)'
+
+    def scenarios(self, new_email):
+        """(budget key, description, callable(client)) for each checked path"""
+        subscribe_body = json.dumps({'email': new_email})
+        return [
+            ('subscribe_email', 'new subscription', lambda c: c.post(
+                '/api/subscribe/', subscribe_body, content_type='application/json', HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)),
+            ('subscribe_email', 'existing subscription', lambda c: c.post(
+                '/api/subscribe/', subscribe_body, content_type='application/json', HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)),
+            ('subscribe_email', 'preflight', lambda c: c.options('/api/subscribe/')),
+            ('health_check', 'health check', lambda c: c.get('/api/health/')),
+            ('confirm_subscription', 'confirmation page', lambda c: c.get(
+                f'/api/confirm/{make_confirmation_token(new_email)}/')),
+            ('confirm_subscription', 'confirmation', lambda c: c.post(
+                f'/api/confirm/{make_confirmation_token(new_email)}/')),
+            ('unsubscribe', 'unsubscribe page', lambda c: c.get(
+                f'/api/unsubscribe/{make_unsubscribe_token(new_email)}/')),
+            ('unsubscribe', 'one-click unsubscribe', lambda c: c.post(
+                f'/api/unsubscribe/{make_unsubscribe_token(new_email)}/',
+                'List-Unsubscribe=One-Click', content_type='application/x-www-form-urlencoded')),
+            ('legal_page', 'legal page', lambda c: c.get('/api/legal/privacy/', HTTP_ACCEPT_ENCODING='br, gzip')),
+            ('admin', 'subscription changelist', lambda c: c.get('/admin/newsletter/subscription/')),
+            ('admin', 'subscription search', lambda c: c.get('/admin/newsletter/subscription/', {'q': 'example.com'})),
+        ]
+
+    def handle(self, *args, **options):
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        failures = []
+
+        # Never send real mail or hit the shared cache while checking
+        overrides = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'IDEMPOTENCY_CACHE_ALIAS': 'default',
+            'ALLOWED_HOSTS': ['testserver'],
+            'SECURE_SSL_REDIRECT': False,
+        }
+        # Not wrapped in a transaction: an outer atomic block would add savepoints
+        # to every view transaction and skew the counts. Created rows are deleted instead.
+        # Views pick their database through the router: writes go to the primary, and
+        # read-only paths to the replica when one is configured and fresh.
+        new_email = f'budget-check-{uuid.uuid4().hex[:12]}@example.com'
+        with override_settings(**overrides):
+            user = get_user_model().objects.create_superuser(
+                username=f'budget-check-{uuid.uuid4().hex[:8]}', email='', password=None
+            )
+            try:
+                client = Client()
+                client.force_login(user)
+                # Warm per-process state (DB warmup, caches) so steady-state counts are measured
+                client.get('/api/health/')
+                get_suppression_list().load()
+
+                for key, description, run in self.scenarios(new_email):
+                    budget = budgets.get(key)
+                    with record_queries() as stats:
+                        response = run(client)
+                    status = f'{response.status_code}'
+                    if set(stats.by_alias) - {DEFAULT_DB_ALIAS}:
+                        status += ' ' + ', '.join(f'{alias}={n}' for alias, n in sorted(stats.by_alias.items()))
+                    if budget is None:
+                        self.stdout.write(f'  {key:<16} {description:<26} {stats.count:>3} queries  (no budget) [{status}]')
+                    elif stats.count > budget:
+                        failures.append(f'{key} / {description}: {stats.count} queries > budget {budget}')
+                        self.stdout.write(self.style.ERROR(
+                            f'✗ {key:<16} {description:<26} {stats.count:>3} queries  budget {budget} [{status}]'
+                        ))
+                        for sql in stats.statements:
+                            self.stdout.write(f'      {sql}')
+                    else:
+                        self.stdout.write(self.style.SUCCESS(
+                            f'✓ {key:<16} {description:<26} {stats.count:>3} queries  budget {budget} [{status}]'
+                        ))
+            finally:
+                # Apply the queued unsubscribe now so its rows can be cleaned up too
+                get_unsubscribe_queue().flush()
+                Subscription.objects.filter(email_hash=hash_email(new_email)).delete()
+                Suppression.objects.filter(email=new_email).delete()
+                user.delete()
+
+        if failures:
+            raise CommandError('Query budgets exceeded:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All query budgets met'))
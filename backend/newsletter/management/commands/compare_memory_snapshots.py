@@ -0,0 +1,126 @@
+from django.core.management.base import BaseCommand, CommandError
+from newsletter.memory import (
+    META_SUFFIX, diff_sites, get_snapshot_dir, group_by_site, list_snapshots, parse_snapshot_filename,
+)
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+import json
+import tracemalloc
+
+
+def load_sites(path: Path) -> dict:
+    return group_by_site(tracemalloc.Snapshot.load(str(path)))
+
+
+def load_meta(path: Path) -> dict:
+    try:
+        return json.loads(path.with_suffix(META_SUFFIX).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def mib(value: float) -> str:
+    return f'{value / 1048576:+.2f}' if value else '0'
+
+
+class Command(BaseCommand):
+    help = ('Diff tracemalloc snapshots written by the memory endpoint or SIGUSR2: growth per allocation '
+            'site within each worker, lined up across workers to separate leaks from one-off growth')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Snapshot directory (defaults to MEMORY_SNAPSHOT_DIR)')
+        parser.add_argument('--pid', type=int, action='append', help='Only these worker pids (repeatable)')
+        parser.add_argument('--label', help='Only snapshots with this label')
+        parser.add_argument('--limit', type=int, default=25, help='Rows per table')
+        parser.add_argument('--match', default='',
+                            help='Only sites containing this text, e.g. newsletter/ or newsletter/emails.py')
+        parser.add_argument('--files', nargs=2, metavar=('BEFORE', 'AFTER'), help='Diff exactly these two snapshots')
+
+    def handle(self, *args, **options):
+        if options['files']:
+            before, after = (Path(path) for path in options['files'])
+            rows = diff_sites(load_sites(before), load_sites(after))
+            self.print_growth(f'{before.name} -> {after.name}', rows, options)
+            return
+
+        snapshot_dir = Path(options['dir']) if options['dir'] else get_snapshot_dir()
+        if not snapshot_dir.is_dir():
+            raise CommandError(f'Snapshot directory not found: {snapshot_dir}')
+
+        by_pid = defaultdict(list)
+        for path in list_snapshots(snapshot_dir):
+            timestamp, pid, label = parse_snapshot_filename(path)
+            if options['pid'] and pid not in options['pid']:
+                continue
+            if options['label'] and label != options['label']:
+                continue
+            by_pid[pid].append((timestamp, path))
+        if not by_pid:
+            raise CommandError(f'No matching snapshots in {snapshot_dir}')
+
+        # Per worker: growth between its first and last snapshot
+        growth = {}
+        latest = {}
+        self.stdout.write(f'{"pid":>8}  {"snapshots":>9}  {"span":>8}  {"RSS MiB":>16}  {"traced MiB":>16}  threads')
+        for pid, snapshots in sorted(by_pid.items()):
+            (first_ts, first), (last_ts, last) = snapshots[0], snapshots[-1]
+            first_meta, last_meta = load_meta(first), load_meta(last)
+            latest[pid] = load_sites(last)
+            if len(snapshots) > 1:
+                growth[pid] = {site: (size, count) for site, size, count, _ in diff_sites(load_sites(first), latest[pid])}
+            self.stdout.write(
+                f'{pid:>8}  {len(snapshots):>9}  {(last_ts - first_ts) / 60000:>7.1f}m  '
+                f'{last_meta.get("rss", 0) / 1048576:>7.1f} ({mib(last_meta.get("rss", 0) - first_meta.get("rss", 0)):>6})  '
+                f'{last_meta.get("traced", 0) / 1048576:>7.1f} ({mib(last_meta.get("traced", 0) - first_meta.get("traced", 0)):>6})  '
+                f'{first_meta.get("threads", "?")} -> {last_meta.get("threads", "?")}'
+            )
+            started = datetime.fromtimestamp(first_ts / 1000)
+            self.stdout.write(f'{"":>8}  first {started:%Y-%m-%d %H:%M:%S}, last {last.name}')
+
+        match = options['match']
+        if growth:
+            # A site that grows in every worker that was sampled twice is the leak candidate;
+            # growth in one worker only is usually a cache warming up or a single large request
+            combined = defaultdict(lambda: [0, 0, 0])
+            for pid_growth in growth.values():
+                for site, (size, count) in pid_growth.items():
+                    totals = combined[site]
+                    totals[0] += size
+                    totals[1] += count
+                    if size > 0:
+                        totals[2] += 1
+            rows = sorted(
+                ((site, size, count, workers) for site, (size, count, workers) in combined.items()
+                 if match in site and size > 0),
+                key=lambda row: (row[3], row[1]), reverse=True,
+            )[:options['limit']]
+            self.stdout.write('')
+            self.stdout.write(f'Growth since each worker\'s first snapshot ({len(growth)} workers), '
+                              'sites growing in the most workers first:')
+            self.stdout.write(f'{"MiB":>8}  {"allocs":>8}  {"workers":>7}  site')
+            for site, size, count, workers in rows:
+                self.stdout.write(f'{mib(size):>8}  {count:>+8}  {workers:>3}/{len(growth):<3}  {site}')
+        else:
+            self.stdout.write(self.style.WARNING('Only one snapshot per worker; take another later to see growth'))
+
+        # Where the memory currently sits, summed over the workers' latest snapshots
+        current = defaultdict(lambda: [0, 0])
+        for sites in latest.values():
+            for site, (size, count) in sites.items():
+                current[site][0] += size
+                current[site][1] += count
+        rows = sorted(((site, size, count) for site, (size, count) in current.items() if match in site),
+                      key=lambda row: row[1], reverse=True)[:options['limit']]
+        self.stdout.write('')
+        self.stdout.write(f'Largest allocation sites in the latest snapshots ({len(latest)} workers):')
+        self.stdout.write(f'{"MiB":>8}  {"allocs":>8}  site')
+        for site, size, count in rows:
+            self.stdout.write(f'{size / 1048576:>8.2f}  {count:>8}  {site}')
+
+    def print_growth(self, title: str, rows: list, options: dict):
+        self.stdout.write(f'Growth {title}:')
+        self.stdout.write(f'{"MiB":>8}  {"allocs":>8}  {"now MiB":>8}  site')
+        rows = [row for row in rows if options['match'] in row[0]][:options['limit']]
+        for site, size, count, now in rows:
+            self.stdout.write(f'{mib(size):>8}  {count:>+8}  {now / 1048576:>8.2f}  {site}')
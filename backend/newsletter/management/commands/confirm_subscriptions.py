@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from newsletter.confirmation import iter_pk_chunks
+from newsletter.models import Subscription, hash_email
+from newsletter.events import SUBSCRIPTION_CONFIRMED, events_enabled, flush_events, publish_on_commit
+from datetime import datetime, time as dt_time
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-confirm pending subscriptions in chunked batches (e.g. to grandfather single opt-in signups)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Only confirm subscriptions created before this date/datetime (ISO 8601)')
+        parser.add_argument('--emails-file', help='Only confirm the addresses listed in this file, one per line')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows updated per transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Count matching rows without updating')
+
+    def handle(self, *args, **options):
+        pending = Subscription.objects.filter(confirmed_at__isnull=True)
+
+        if options['before']:
+            before = parse_datetime(options['before'])
+            if before is None:
+                day = parse_date(options['before'])
+                if day is None:
+                    raise CommandError(f"Invalid --before value: {options['before']}")
+                before = datetime.combine(day, dt_time.min)
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+            pending = pending.filter(subscribed_at__lt=before)
+
+        if options['emails_file']:
+            with open(options['emails_file'], encoding='utf-8') as f:
+                emails = {line.strip().lower() for line in f if line.strip()}
+            pending = pending.filter(email_hash__in=[hash_email(email) for email in emails])
+
+        if options['dry_run']:
+            self.stdout.write(f'{pending.count()} pending subscriptions would be confirmed')
+            return
+
+        total = 0
+        for pks in iter_pk_chunks(pending, options['batch_size']):
+            with transaction.atomic():
+                batch = Subscription.objects.filter(pk__in=pks, confirmed_at__isnull=True)
+                if events_enabled():
+                    publish_on_commit(SUBSCRIPTION_CONFIRMED, batch.select_for_update().values_list('email', flat=True))
+                # Pre-double-opt-in signups count as confirmed from the moment they subscribed
+                total += batch.update(confirmed_at=F('subscribed_at'))
+            # Log and deliver each chunk's events before the next, so the buffers never overflow
+            flush_events()
+            self.stdout.write(f'Confirmed {total} subscriptions (last id {pks[-1]})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Confirmed {total} subscriptions'))
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from newsletter.confirmation import iter_pk_chunks
+from newsletter.models import Subscription
+from newsletter.events import SUBSCRIPTION_EXPIRED, events_enabled, flush_events, publish_on_commit
+from datetime import timedelta
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Delete subscriptions that were never confirmed, in chunked batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'UNCONFIRMED_EXPIRY_DAYS', 14),
+            help='Expire pending subscriptions older than this many days'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Count matching rows without deleting')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = Subscription.objects.filter(confirmed_at__isnull=True, subscribed_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} unconfirmed subscriptions older than {options["days"]} days would be deleted')
+            return
+
+        total = 0
+        for pks in iter_pk_chunks(expired, options['batch_size']):
+            with transaction.atomic():
+                # Re-check the condition so a confirmation racing the job is never deleted
+                batch = Subscription.objects.filter(pk__in=pks, confirmed_at__isnull=True, subscribed_at__lt=cutoff)
+                if events_enabled():
+                    publish_on_commit(SUBSCRIPTION_EXPIRED, batch.select_for_update().values_list('email', flat=True))
+                deleted, _ = batch.delete()
+            # Log and deliver each chunk's events before the next, so the buffers never overflow
+            flush_events()
+            total += deleted
+            self.stdout.write(f'Deleted {total} unconfirmed subscriptions (last id {pks[-1]})')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        logger.info(f'Expired {total} unconfirmed subscriptions older than {options["days"]} days')
+        self.stdout.write(self.style.SUCCESS(f'✓ Deleted {total} unconfirmed subscriptions'))
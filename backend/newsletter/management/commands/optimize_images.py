@@ -0,0 +1,234 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pathlib import Path
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+RASTER_SUFFIXES = ('.png', '.jpg', '.jpeg')
+DEFAULT_WIDTHS = '320,640,960,1280,1920'
+# Pillow save arguments per output format
+FORMAT_OPTIONS = {
+    'avif': {'format': 'AVIF', 'quality': 55, 'speed': 6},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    # Quantized to a palette first, see palette()
+    'png': {'format': 'PNG', 'optimize': True},
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+}
+# Key under which the re-encoded original-format copy is recorded
+FALLBACK = 'fallback'
+# Bump when the encoding settings above change, so cached results are rebuilt
+PIPELINE_VERSION = 2
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def target_widths(natural_width: int, widths) -> list:
+    """Requested widths below the natural width, plus the natural width itself (never upscale)"""
+    return sorted({w for w in widths if w < natural_width} | {natural_width})
+
+
+def palette(image):
+    """
+    Quantize to a dithered 256-colour palette, as pngquant does.
+
+    Lossless PNG barely shrinks photographs; the palette makes the fallback a
+    fraction of the source size.
+    """
+    from PIL import Image
+
+    return image.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.FLOYDSTEINBERG)
+
+
+def encode_variants(source: str, output_dir: str, stem: str, fmt: str, widths: list) -> list:
+    """
+    Encode one source image into one format at several widths.
+
+    Runs in a worker process, so it only takes and returns plain values.
+
+    Returns:
+        list: (filename, width, height, bytes) for each written variant
+    """
+    from PIL import Image
+
+    results = []
+    with Image.open(source) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'P') else 'RGB')
+        if fmt == 'jpg' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            if fmt == 'png':
+                resized = palette(resized)
+            filename = f'{stem}-{width}w.{fmt}'
+            path = Path(output_dir) / filename
+            path.parent.mkdir(parents=True, exist_ok=True)
+            resized.save(path, **FORMAT_OPTIONS[fmt])
+            results.append((filename, width, height, path.stat().st_size))
+    return results
+
+
+class Command(BaseCommand):
+    help = ('Build responsive AVIF/WebP width variants (with a PNG fallback) of the landing page raster '
+            'images in parallel, skipping unchanged inputs, and write a srcset manifest')
+
+    def add_arguments(self, parser):
+        frontend = Path(settings.BASE_DIR).parent / 'frontend'
+        parser.add_argument('--source-dir', default=str(frontend / 'public' / 'assets'), help='Directory scanned for images')
+        parser.add_argument('--output-dir', default=str(frontend / 'public' / 'assets' / 'optimized'), help='Where variants are written')
+        parser.add_argument('--url-prefix', default='/assets/optimized', help='Public URL of --output-dir')
+        parser.add_argument('--manifest', default=str(frontend / 'src' / 'image-manifest.json'), help='srcset manifest bundled by the frontend')
+        parser.add_argument('--cache-file', default=str(frontend / '.image-cache.json'), help='Content-hash cache of processed inputs')
+        parser.add_argument('--widths', default=DEFAULT_WIDTHS, help='Comma-separated target widths in pixels')
+        parser.add_argument('--formats', default='avif,webp', help='Comma-separated modern formats (avif, webp)')
+        parser.add_argument('--min-bytes', type=int, default=50_000, help='Leave images smaller than this untouched')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+        parser.add_argument('--force', action='store_true', help='Re-encode even when the input is unchanged')
+
+    def find_sources(self, source_dir: Path, output_dir: Path, min_bytes: int) -> list:
+        return sorted(
+            path for path in source_dir.rglob('*')
+            if path.suffix.lower() in RASTER_SUFFIXES
+            and output_dir not in path.parents
+            and path.stat().st_size >= min_bytes
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from PIL import features
+        except ImportError:
+            raise CommandError('Pillow is required: pip install Pillow')
+
+        formats = [f.strip() for f in options['formats'].split(',') if f.strip()]
+        for fmt in formats:
+            if fmt not in ('avif', 'webp') or not features.check(fmt):
+                raise CommandError(f'Format "{fmt}" is not supported by this Pillow build')
+        widths = [int(w) for w in options['widths'].split(',') if w.strip()]
+
+        source_dir = Path(options['source_dir'])
+        output_dir = Path(options['output_dir'])
+        manifest_path = Path(options['manifest'])
+        cache_path = Path(options['cache_file'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        cache = json.loads(cache_path.read_text()) if cache_path.exists() else {}
+        settings_key = f'v{PIPELINE_VERSION}:{",".join(formats)}:{",".join(map(str, widths))}'
+        sources = self.find_sources(source_dir, output_dir, options['min_bytes'])
+        if not sources:
+            raise CommandError(f'No raster images of at least {options["min_bytes"]} bytes under {source_dir}')
+
+        entries = {}
+        jobs = []
+        skipped = 0
+        for source in sources:
+            key = source.relative_to(source_dir).as_posix()
+            digest = file_hash(source)
+            cached = cache.get(key)
+            if (not options['force'] and cached and cached['sha256'] == digest and cached['settings'] == settings_key
+                    and all((output_dir / v['file']).exists() for variants in cached['formats'].values() for v in variants)):
+                entries[key] = cached
+                skipped += 1
+                continue
+
+            from PIL import Image
+            with Image.open(source) as image:
+                natural_width, natural_height = image.size
+            # Variants mirror the source layout: images/hero-image.png -> images/hero-image-640w.avif
+            stem = key.rsplit('.', 1)[0]
+            entries[key] = {
+                'sha256': digest,
+                'settings': settings_key,
+                'width': natural_width,
+                'height': natural_height,
+                'original_bytes': source.stat().st_size,
+                'formats': {},
+            }
+            for fmt in formats:
+                jobs.append((key, fmt, fmt, str(source), stem, target_widths(natural_width, widths)))
+            # Browsers without AVIF/WebP get a re-encoded copy in the original format,
+            # downscaled only when the source is wider than the largest requested width
+            fallback_fmt = 'png' if source.suffix.lower() == '.png' else 'jpg'
+            jobs.append((key, FALLBACK, fallback_fmt, str(source), stem, [min(natural_width, max(widths))]))
+
+        start = time.perf_counter()
+        if jobs:
+            self.stdout.write(f'Encoding {len(jobs)} format jobs on {options["workers"]} workers ({skipped} images unchanged)...')
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                futures = {
+                    pool.submit(encode_variants, source, str(output_dir), stem, fmt, job_widths): (key, label)
+                    for key, label, fmt, source, stem, job_widths in jobs
+                }
+                for future in as_completed(futures):
+                    key, label = futures[future]
+                    entries[key]['formats'][label] = [
+                        {'file': filename, 'width': width, 'height': height, 'bytes': size}
+                        for filename, width, height, size in future.result()
+                    ]
+        elapsed = time.perf_counter() - start
+
+        self.write_manifest(entries, manifest_path, options['url_prefix'])
+        cache_path.write_text(json.dumps(entries, indent=2, sort_keys=True) + '\n')
+
+        # Remove variants no current entry refers to
+        referenced = {v['file'] for entry in entries.values() for variants in entry['formats'].values() for v in variants}
+        for path in output_dir.rglob('*'):
+            if path.is_file() and path.relative_to(output_dir).as_posix() not in referenced:
+                path.unlink()
+
+        self.report(entries, formats, elapsed)
+
+    def write_manifest(self, entries: dict, manifest_path: Path, url_prefix: str):
+        """Manifest keyed by original URL, e.g. '/assets/images/hero-image.png'"""
+        url_prefix = url_prefix.rstrip('/')
+        manifest = {}
+        for key, entry in sorted(entries.items()):
+            sources = {}
+            for fmt, variants in entry['formats'].items():
+                if fmt == FALLBACK:
+                    continue
+                sources[fmt] = ', '.join(f'{url_prefix}/{v["file"]} {v["width"]}w' for v in variants)
+            fallback = entry['formats'].get(FALLBACK)
+            manifest[f'/assets/{key}'] = {
+                'width': entry['width'],
+                'height': entry['height'],
+                'srcset': sources,
+                'fallback': f'{url_prefix}/{fallback[0]["file"]}' if fallback else f'/assets/{key}',
+            }
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+
+    def report(self, entries: dict, formats: list, elapsed: float):
+        original_total = 0
+        served_total = 0
+        self.stdout.write(f'{"image":<34} {"original":>10} {"best full-width":>16} {"saved":>7} {"fallback":>10}')
+        for key, entry in sorted(entries.items()):
+            # What a modern browser downloads at full width: the smallest modern variant at natural size
+            full_width = [variants[-1] for fmt, variants in entry['formats'].items() if fmt in formats]
+            best = min(full_width, key=lambda v: v['bytes'])
+            original_total += entry['original_bytes']
+            served_total += best['bytes']
+            saved = 1 - best['bytes'] / entry['original_bytes']
+            fallback = entry['formats'][FALLBACK][0]
+            self.stdout.write(f'{key:<34} {entry["original_bytes"]:>10,} {best["bytes"]:>10,} {best["file"].rsplit(".", 1)[1]:>5} '
+                              f'{saved:>7.0%} {fallback["bytes"]:>10,}')
+
+        saved_bytes = original_total - served_total
+        logger.info(f'Image optimization saved {saved_bytes} bytes in {elapsed:.1f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {len(entries)} images: {original_total:,} -> {served_total:,} bytes at full width, '
+            f'{saved_bytes:,} bytes saved ({saved_bytes / original_total:.0%}); encoding took {elapsed:.1f}s'
+        ))
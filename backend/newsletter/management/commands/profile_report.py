@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand, CommandError
+from newsletter.profiling import (
+    CPROFILE_SUFFIX, STACKS_SUFFIX, get_profile_dir, list_profiles,
+    make_profile_token, parse_profile_filename,
+)
+from collections import Counter, defaultdict
+from pathlib import Path
+import io
+import pstats
+
+
+def read_stacks(paths):
+    """Merge collapsed-stack files into one Counter"""
+    stacks = Counter()
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def top_frames(stacks, limit):
+    """Return (frame, self samples, inclusive samples) rows sorted by inclusive samples"""
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    return [(frame, own[frame], total) for frame, total in inclusive.most_common(limit)]
+
+
+class Command(BaseCommand):
+    help = 'Merge request profiles written by ProfilingMiddleware into a per-view report or collapsed-stack file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Profile directory (defaults to PROFILING_DIR)')
+        parser.add_argument('--view', action='append', help='Only include these view groups (repeatable)')
+        parser.add_argument(
+            '--format', choices=['text', 'collapsed'], default='text',
+            help='text: top functions per view; collapsed: flamegraph input with the view as root frame'
+        )
+        parser.add_argument('--sort', default='cumulative', help='pstats sort key for cProfile text output')
+        parser.add_argument('--limit', type=int, default=30, help='Rows per view in text output')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--make-token', action='store_true', help='Print a signed X-Profile-Token value and exit')
+
+    def handle(self, *args, **options):
+        if options['make_token']:
+            self.stdout.write(make_profile_token())
+            return
+
+        profile_dir = Path(options['dir']) if options['dir'] else get_profile_dir()
+        if not profile_dir.is_dir():
+            raise CommandError(f'Profile directory not found: {profile_dir}')
+
+        groups = defaultdict(lambda: defaultdict(list))
+        for path in list_profiles(profile_dir):
+            view = parse_profile_filename(path)
+            if options['view'] and view not in options['view']:
+                continue
+            groups[view][path.suffix].append(path)
+
+        if not groups:
+            self.stdout.write(self.style.WARNING(f'No profiles found in {profile_dir}'))
+            return
+
+        out = open(options['output'], 'w', encoding='utf-8') if options['output'] else io.StringIO()
+        try:
+            for view, by_suffix in sorted(groups.items()):
+                stack_paths = by_suffix.get(STACKS_SUFFIX, [])
+                prof_paths = by_suffix.get(CPROFILE_SUFFIX, [])
+                stacks = read_stacks(stack_paths)
+
+                if options['format'] == 'collapsed':
+                    if prof_paths:
+                        self.stderr.write(f'{view}: skipping {len(prof_paths)} cProfile files (no stack data)')
+                    for stack, count in sorted(stacks.items()):
+                        out.write(f'{view};{stack} {count}\n')
+                else:
+                    total = sum(stacks.values())
+                    if total:
+                        out.write(f'=== {view}: {len(stack_paths)} sampled profiles, {total} samples ===\n')
+                        out.write(f'{"self":>8} {"total":>8} {"total%":>7}  frame\n')
+                        for frame, own, inclusive in top_frames(stacks, options['limit']):
+                            out.write(f'{own:>8} {inclusive:>8} {100 * inclusive / total:>6.1f}%  {frame}\n')
+                        out.write('\n')
+                    if prof_paths:
+                        stats = pstats.Stats(*[str(p) for p in prof_paths], stream=out)
+                        out.write(f'=== {view}: {len(prof_paths)} cProfile profiles, {stats.total_tt:.3f}s total ===\n')
+                        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+
+                self.stderr.write(f'{view}: merged {len(stack_paths) + len(prof_paths)} profiles')
+        finally:
+            if options['output']:
+                out.close()
+                self.stdout.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+            else:
+                self.stdout.write(out.getvalue(), ending='')
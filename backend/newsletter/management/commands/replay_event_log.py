@@ -0,0 +1,198 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from newsletter.eventlog import list_segments, read_events
+from newsletter.events import (
+    SUBSCRIPTION_ARCHIVED, SUBSCRIPTION_CONFIRMED, SUBSCRIPTION_CREATED, SUBSCRIPTION_EXPIRED,
+    SUBSCRIPTION_UNSUBSCRIBED,
+)
+from newsletter.models import Subscription, hash_email
+from pathlib import Path
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+REMOVED = (SUBSCRIPTION_UNSUBSCRIBED, SUBSCRIPTION_EXPIRED, SUBSCRIPTION_ARCHIVED)
+
+
+def replay(events) -> tuple:
+    """
+    Fold events into the subscription state they describe.
+
+    Returns:
+        tuple: ({email: [subscribed_at, confirmed_at]}, {email: timestamp of its removal} for
+                addresses whose last event removed them, {date: Counter of event types},
+                timestamp of the first event or None, number of events)
+    """
+    state = {}
+    removed = {}
+    daily = defaultdict(Counter)
+    first_ts = None
+    count = 0
+    for event in events:
+        count += 1
+        ts = event['ts']
+        if first_ts is None:
+            first_ts = ts
+        email = event['email']
+        event_type = event['type']
+        daily[datetime.fromtimestamp(ts, dt_timezone.utc).date()][event_type] += 1
+        if event_type == SUBSCRIPTION_CREATED:
+            state[email] = [ts, None]
+            removed.pop(email, None)
+        elif event_type == SUBSCRIPTION_CONFIRMED:
+            if email in state:
+                state[email][1] = ts
+            else:
+                # Created before the log started
+                state[email] = [None, ts]
+                removed.pop(email, None)
+        elif event_type in REMOVED:
+            state.pop(email, None)
+            removed[email] = ts
+    return state, removed, daily, first_ts, count
+
+
+class Command(BaseCommand):
+    help = ('Replay the subscription event log: print daily rollups, verify the Subscription table '
+            'against it, or restore missing rows from it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=getattr(settings, 'EVENT_LOG_DIR', ''), help='Event log directory')
+        parser.add_argument('--verify', action='store_true',
+                            help='Compare the replayed state with the Subscription table; exits non-zero on drift '
+                                 '(rows the log never mentions are reported as unlogged, not drift)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Insert subscriptions missing from the table and set missing confirmations')
+        parser.add_argument('--delete-extra', action='store_true',
+                            help='With --rebuild, also delete rows whose last logged event removed them')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows written per transaction')
+        parser.add_argument('--strict', action='store_true', help='Fail on a torn or corrupt record')
+        parser.add_argument('--days', type=int, default=14, help='Days of rollups to print (0 = none)')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'])
+        segments = list_segments(directory) if options['dir'] else []
+        if not segments:
+            raise CommandError(f'No event log segments in {directory}')
+        size = sum(path.stat().st_size for path in segments)
+
+        start = time.perf_counter()
+        try:
+            state, removed, daily, first_ts, count = replay(read_events(directory, strict=options['strict']))
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+        confirmed = sum(1 for _, confirmed_at in state.values() if confirmed_at is not None)
+        self.stdout.write(f'Replayed {count} events from {len(segments)} segments ({size / 1024 / 1024:.1f} MiB) '
+                          f'in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} events/s)')
+        self.stdout.write(f'{len(state)} subscriptions, {confirmed} confirmed')
+
+        if options['days']:
+            for day in sorted(daily)[-options['days']:]:
+                counts = daily[day]
+                self.stdout.write(
+                    f'  {day}  created {counts[SUBSCRIPTION_CREATED]:>6}  confirmed {counts[SUBSCRIPTION_CONFIRMED]:>6}  '
+                    f'unsubscribed {counts[SUBSCRIPTION_UNSUBSCRIBED]:>6}  expired {counts[SUBSCRIPTION_EXPIRED]:>6}  '
+                    f'archived {counts[SUBSCRIPTION_ARCHIVED]:>6}'
+                )
+
+        if not (options['verify'] or options['rebuild']) or first_ts is None:
+            return
+
+        log_start = datetime.fromtimestamp(first_ts, dt_timezone.utc)
+        missing, unconfirmed, extra, unlogged = self.compare(state, removed, log_start)
+        self.stdout.write(f'Compared with the table (rows since {log_start:%Y-%m-%d %H:%M:%S} UTC): '
+                          f'{len(missing)} missing, {len(unconfirmed)} missing a confirmation, '
+                          f'{len(extra)} removed in the log, {len(unlogged)} unlogged')
+        if unlogged:
+            # Written by another container's log, created outside the app, or lost in a crash
+            # before its group commit: the log cannot tell which, so these are never touched
+            for email in sorted(unlogged)[:10]:
+                self.stdout.write(f'  unlogged: {email}')
+
+        if options['rebuild']:
+            self.rebuild(state, missing, unconfirmed, extra if options['delete_extra'] else [], options['batch_size'])
+        elif missing or unconfirmed or extra:
+            for label, emails in (('missing', missing), ('unconfirmed', unconfirmed), ('removed', extra)):
+                for email in sorted(emails)[:10]:
+                    self.stdout.write(f'  {label}: {email}')
+            raise CommandError('The Subscription table has drifted from the event log')
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ The Subscription table matches the event log'))
+
+    def compare(self, state: dict, removed: dict, log_start) -> tuple:
+        """
+        Diff the replayed state against the table, streaming the table in primary key order.
+
+        Returns:
+            tuple: (emails missing from the table, rows missing a confirmation, rows the log
+                    removed afterwards, rows since the log started that it never mentions)
+        """
+        missing = set(state)
+        unconfirmed = []
+        extra = []
+        unlogged = []
+        rows = Subscription.objects.order_by('pk').values_list('email', 'subscribed_at', 'confirmed_at')
+        for email, subscribed_at, confirmed_at in rows.iterator(chunk_size=2000):
+            replayed = state.get(email)
+            if replayed is None:
+                removed_at = removed.get(email)
+                if removed_at is not None and subscribed_at.timestamp() <= removed_at:
+                    extra.append(email)
+                elif subscribed_at >= log_start:
+                    # Rows older than the log were never seen being created, so they are not even unlogged
+                    unlogged.append(email)
+                continue
+            missing.discard(email)
+            if replayed[1] is not None and confirmed_at is None:
+                unconfirmed.append(email)
+        return sorted(missing), unconfirmed, extra, unlogged
+
+    def rebuild(self, state: dict, missing: list, unconfirmed: list, extra: list, batch_size: int):
+        def as_datetime(ts):
+            return datetime.fromtimestamp(ts, dt_timezone.utc) if ts is not None else None
+
+        created = updated = deleted = 0
+        for index in range(0, len(missing), batch_size):
+            hashes = {hash_email(email): email for email in missing[index:index + batch_size]}
+            with transaction.atomic():
+                # Rows may have been re-created since the diff was taken; insert only the
+                # still-missing ones (mssql-django does not support ignore_conflicts)
+                existing = set(
+                    bytes(email_hash) for email_hash in
+                    Subscription.objects.filter(email_hash__in=list(hashes)).order_by()
+                    .values_list('email_hash', flat=True)
+                )
+                rows = Subscription.objects.bulk_create([
+                    Subscription(
+                        email=email,
+                        email_hash=email_hash,
+                        subscribed_at=as_datetime(state[email][0] or state[email][1]),
+                        confirmed_at=as_datetime(state[email][1]),
+                    )
+                    for email_hash, email in hashes.items() if email_hash not in existing
+                ])
+            created += len(rows)
+
+        for index in range(0, len(unconfirmed), batch_size):
+            chunk = unconfirmed[index:index + batch_size]
+            with transaction.atomic():
+                for email in chunk:
+                    pending = Subscription.objects.filter(email_hash=hash_email(email), confirmed_at__isnull=True)
+                    updated += pending.update(confirmed_at=as_datetime(state[email][1]))
+
+        for index in range(0, len(extra), batch_size):
+            with transaction.atomic():
+                deleted += Subscription.objects.filter(
+                    email_hash__in=[hash_email(email) for email in extra[index:index + batch_size]]
+                ).delete()[0]
+
+        logger.info(f'Rebuilt subscriptions from the event log: {created} inserted, {updated} confirmed, '
+                    f'{deleted} deleted')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Inserted {created}, confirmed {updated}, deleted {deleted} subscriptions'
+        ))
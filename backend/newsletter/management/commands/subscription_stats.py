@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from newsletter.models import Subscription, Suppression
+from newsletter.querystats import record_queries
+from newsletter.routers import read_replica
+from datetime import timedelta
+
+
+class Command(BaseCommand):
+    help = 'Report subscription totals and recent daily signups, reading from the replica when one is configured'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14, help='Days of daily signup counts to show')
+        parser.add_argument(
+            '--max-staleness', type=float, default=None,
+            help='Seconds of replica lag to tolerate (defaults to REPLICA_MAX_STALENESS)'
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        with read_replica(options['max_staleness']) as alias, record_queries() as stats:
+            total = Subscription.objects.count()
+            confirmed = Subscription.objects.filter(confirmed_at__isnull=False).count()
+            suppressed = Suppression.objects.count()
+            daily = list(
+                Subscription.objects.filter(subscribed_at__gte=since)
+                .annotate(day=TruncDate('subscribed_at'))
+                .values('day').annotate(signups=Count('id')).order_by('day')
+            )
+
+        self.stdout.write(f'Source database:  {alias}')
+        self.stdout.write(f'Subscriptions:    {total}')
+        self.stdout.write(f'Confirmed:        {confirmed}')
+        self.stdout.write(f'Pending:          {total - confirmed}')
+        self.stdout.write(f'Unsubscribed:     {suppressed}')
+        self.stdout.write(f'\nSignups in the last {options["days"]} days:')
+        for row in daily:
+            self.stdout.write(f'  {row["day"]}  {row["signups"]:>6}')
+        by_alias = ', '.join(f'{name}={n}' for name, n in sorted(stats.by_alias.items()))
+        self.stdout.write(f'\nQueries by database: {by_alias}')
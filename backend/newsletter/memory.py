@@ -0,0 +1,272 @@
+"""
+Opt-in memory instrumentation
+
+Per-process RSS and thread counts are always cheap to read and are exported
+as gauges with /api/metrics/. With MEMORY_PROFILING_ENABLED=true the app also
+starts tracemalloc (MEMORY_TRACEMALLOC_FRAMES deep) when it loads, and a
+worker writes a snapshot to MEMORY_SNAPSHOT_DIR when asked:
+
+- ``POST /api/memory/`` with the metrics token (whichever worker serves it), or
+- ``kill -USR2 <worker pid>`` under gunicorn (never the master's pid: SIGUSR2
+  makes the master re-exec itself).
+
+Each allocation is attributed to the innermost frame inside this project, so
+growth shows up as e.g. ``newsletter/emails.py:180`` rather than somewhere in
+Django or the standard library. ``manage.py compare_memory_snapshots`` diffs
+each worker's snapshots and lines the workers up against each other.
+
+tracemalloc roughly doubles the cost of every allocation; enable it while
+investigating, not permanently.
+"""
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from django.conf import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.tmsnap'
+META_SUFFIX = '.json'
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+_snapshot_lock = threading.Lock()
+_last_snapshot = None
+
+
+def _read(path: str):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def process_memory(pid='self'):
+    """
+    Resident memory of a process in bytes, split into shared and private pages.
+
+    Returns:
+        dict: rss, pss, shared and private bytes (zeros if /proc is unavailable)
+    """
+    fields = {'Rss': 0, 'Pss': 0, 'Shared_Clean': 0, 'Shared_Dirty': 0, 'Private_Clean': 0, 'Private_Dirty': 0}
+    rollup = _read(f'/proc/{pid}/smaps_rollup')
+    for line in (rollup or '').splitlines():
+        key, _, rest = line.partition(':')
+        if key in fields:
+            fields[key] = int(rest.split()[0]) * 1024
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'shared': fields['Shared_Clean'] + fields['Shared_Dirty'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+def os_thread_count() -> int:
+    """Threads of this process as the kernel sees them (includes threads Python did not start)"""
+    for line in (_read('/proc/self/status') or '').splitlines():
+        if line.startswith('Threads:'):
+            return int(line.split()[1])
+    return threading.active_count()
+
+
+def process_stats() -> dict:
+    """RSS, thread and tracemalloc figures for this process; also updates the gauges"""
+    memory = process_memory()
+    stats = {
+        'pid': os.getpid(),
+        'rss': memory['rss'],
+        'private': memory['private'],
+        'threads': threading.active_count(),
+        'os_threads': os_thread_count(),
+        'thread_names': sorted(thread.name for thread in threading.enumerate()),
+        'tracing': tracemalloc.is_tracing(),
+    }
+    metrics.set_gauge('process.rss_bytes', memory['rss'])
+    metrics.set_gauge('process.private_bytes', memory['private'])
+    metrics.set_gauge('process.threads', stats['threads'])
+    metrics.set_gauge('process.os_threads', stats['os_threads'])
+    if stats['tracing']:
+        stats['traced'], stats['traced_peak'] = tracemalloc.get_traced_memory()
+        metrics.set_gauge('tracemalloc.traced_bytes', stats['traced'])
+        metrics.set_gauge('tracemalloc.peak_bytes', stats['traced_peak'])
+    return stats
+
+
+def memory_profiling_enabled() -> bool:
+    return getattr(settings, 'MEMORY_PROFILING_ENABLED', False)
+
+
+def start_tracing():
+    """Start tracemalloc if MEMORY_PROFILING_ENABLED; called when the app loads"""
+    if memory_profiling_enabled() and not tracemalloc.is_tracing():
+        frames = getattr(settings, 'MEMORY_TRACEMALLOC_FRAMES', 16)
+        tracemalloc.start(frames)
+        logger.info(f"tracemalloc started ({frames} frames) in pid {os.getpid()}")
+
+
+def get_snapshot_dir() -> Path:
+    return Path(getattr(settings, 'MEMORY_SNAPSHOT_DIR', None) or Path(settings.BASE_DIR) / 'memory')
+
+
+def list_snapshots(snapshot_dir: Path) -> list:
+    return sorted(snapshot_dir.glob(f'*{SNAPSHOT_SUFFIX}'))
+
+
+def parse_snapshot_filename(path: Path) -> tuple:
+    """Return (timestamp ms, pid, label) encoded in a snapshot filename"""
+    # <timestamp ms>-<pid>-<label>.tmsnap
+    timestamp, pid, label = path.stem.split('-', 2)
+    return int(timestamp), int(pid), label
+
+
+def format_site(filename: str, lineno: int) -> str:
+    """Short file:line for display: project-relative, or from site-packages / the stdlib directory on"""
+    path = Path(filename)
+    try:
+        return f"{path.relative_to(PROJECT_ROOT)}:{lineno}"
+    except ValueError:
+        pass
+    parts = path.parts
+    if 'site-packages' in parts:
+        parts = parts[parts.index('site-packages') + 1:]
+    else:
+        parts = parts[-2:]
+    return f"{'/'.join(parts)}:{lineno}"
+
+
+def is_project_file(filename: str) -> bool:
+    return filename.startswith(str(PROJECT_ROOT)) and 'site-packages' not in filename
+
+
+def group_by_site(snapshot: tracemalloc.Snapshot) -> dict:
+    """
+    Sum traced memory per allocation site.
+
+    The site is the innermost frame in project code, so allocations made by
+    Django, logging or the email library on our behalf are charged to the line
+    of ours that asked for them; traces with no project frame keep their own
+    innermost frame.
+
+    Returns:
+        dict: {site: [bytes, allocations]}
+    """
+    sites = defaultdict(lambda: [0, 0])
+    # Many traces share a traceback object, so resolve each one only once
+    resolved = {}
+    for trace in snapshot.traces:
+        traceback = trace.traceback
+        site = resolved.get(traceback)
+        if site is None:
+            # Frames run oldest to newest; the last one made the allocation
+            frame = next((frame for frame in reversed(traceback) if is_project_file(frame.filename)), traceback[-1])
+            site = format_site(frame.filename, frame.lineno)
+            resolved[traceback] = site
+        totals = sites[site]
+        totals[0] += trace.size
+        totals[1] += 1
+    return dict(sites)
+
+
+def diff_sites(before: dict, after: dict) -> list:
+    """Rows of (site, bytes delta, allocations delta, bytes now), largest growth first"""
+    rows = []
+    for site in set(before) | set(after):
+        old_size, old_count = before.get(site, (0, 0))
+        new_size, new_count = after.get(site, (0, 0))
+        if new_size != old_size or new_count != old_count:
+            rows.append((site, new_size - old_size, new_count - old_count, new_size))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return rows
+
+
+def top_sites(sites: dict, limit: int) -> list:
+    return [
+        {'site': site, 'bytes': size, 'allocations': count}
+        for site, (size, count) in sorted(sites.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    ]
+
+
+def rotate_snapshots(snapshot_dir: Path, max_files: int):
+    """Delete the oldest snapshots (and their metadata) so at most max_files remain"""
+    snapshots = list_snapshots(snapshot_dir)
+    for path in snapshots[:max(len(snapshots) - max_files, 0)]:
+        for stale in (path, path.with_suffix(META_SUFFIX)):
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+
+def take_snapshot(label: str = 'manual', limit: int = 20) -> dict:
+    """
+    Write a tracemalloc snapshot of this process and summarize it.
+
+    Returns:
+        dict: Process stats, the snapshot path, the top sites and the growth
+        since this process's previous snapshot (None on the first one)
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError('tracemalloc is not running; set MEMORY_PROFILING_ENABLED=true')
+    label = ''.join(ch if ch.isalnum() or ch == '_' else '_' for ch in label)[:40] or 'manual'
+
+    with _snapshot_lock:
+        start = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            # Anything allocated under this module (summaries, stats, the snapshot itself) is
+            # instrumentation, not the app's memory; all_frames also drops what it allocates via callees
+            tracemalloc.Filter(False, __file__, all_frames=True),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ])
+        sites = group_by_site(snapshot)
+        stats = process_stats()
+
+        snapshot_dir = get_snapshot_dir()
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        path = snapshot_dir / f"{int(time.time() * 1000):013d}-{os.getpid()}-{label}{SNAPSHOT_SUFFIX}"
+        snapshot.dump(str(path))
+        path.with_suffix(META_SUFFIX).write_text(json.dumps(stats))
+        rotate_snapshots(snapshot_dir, getattr(settings, 'MEMORY_SNAPSHOT_MAX_FILES', 200))
+
+        growth = None
+        if _last_snapshot is not None and _last_snapshot[0] == os.getpid():
+            growth = [
+                {'site': site, 'bytes': size_delta, 'allocations': count_delta}
+                for site, size_delta, count_delta, _ in diff_sites(_last_snapshot[1], sites)[:limit]
+            ]
+        _last_snapshot = (os.getpid(), sites)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+    metrics.incr('memory.snapshots')
+    metrics.observe('memory.snapshot_ms', elapsed_ms)
+    logger.info(f"Memory snapshot {path.name}: RSS {stats['rss'] / 1048576:.1f} MiB, "
+                f"traced {stats['traced'] / 1048576:.1f} MiB, {stats['threads']} threads ({elapsed_ms:.0f}ms)")
+    return {**stats, 'snapshot': str(path), 'top': top_sites(sites, limit), 'growth': growth}
+
+
+def _snapshot_in_background(signum, frame):
+    # Signal handlers run between bytecodes of the main thread; do the work elsewhere
+    threading.Thread(target=_snapshot_safely, args=('signal',), name='memory-snapshot', daemon=True).start()
+
+
+def _snapshot_safely(label: str):
+    try:
+        take_snapshot(label)
+    except Exception as e:
+        logger.error(f"Memory snapshot failed: {e}")
+
+
+def install_snapshot_signal():
+    """Take a snapshot on SIGUSR2; call from the gunicorn worker (post_worker_init) only"""
+    if memory_profiling_enabled() and tracemalloc.is_tracing():
+        signal.signal(signal.SIGUSR2, _snapshot_in_background)
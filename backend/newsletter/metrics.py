@@ -0,0 +1,66 @@
+"""
+Lightweight in-process metrics registry
+
+Counters, gauges and timing summaries are kept per worker process and exposed
+as JSON by the token-protected /api/metrics/ endpoint.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_timings = {}
+
+
+def metric_name(name: str, **labels) -> str:
+    """Build a metric key such as ``db.queries{view=subscribe_email}``"""
+    if not labels:
+        return name
+    label_str = ','.join(f"{key}={value}" for key, value in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+def incr(name: str, value: float = 1, **labels):
+    key = metric_name(name, **labels)
+    with _lock:
+        _counters[key] += value
+
+
+def set_gauge(name: str, value: float, **labels):
+    key = metric_name(name, **labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name: str, value: float, **labels):
+    """Record one observation (e.g. a duration in ms) into a count/sum/max summary"""
+    key = metric_name(name, **labels)
+    with _lock:
+        summary = _timings.get(key)
+        if summary is None:
+            _timings[key] = [1, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            if value > summary[2]:
+                summary[2] = value
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'timings': {
+                key: {'count': count, 'sum': total, 'max': peak, 'avg': total / count}
+                for key, (count, total, peak) in _timings.items()
+            },
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
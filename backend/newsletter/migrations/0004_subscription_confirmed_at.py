@@ -0,0 +1,36 @@
+from django.db import migrations, models
+from django.db.models import F
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def confirm_existing_subscriptions(apps, schema_editor):
+    """Subscribers who signed up before double opt-in are treated as confirmed"""
+    Subscription = apps.get_model('newsletter', 'Subscription')
+    db_alias = schema_editor.connection.alias
+    pending = Subscription.objects.using(db_alias).filter(confirmed_at__isnull=True)
+    last_pk = 0
+    while True:
+        pks = list(pending.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BACKFILL_BATCH_SIZE])
+        if not pks:
+            break
+        Subscription.objects.using(db_alias).filter(pk__in=pks).update(confirmed_at=F('subscribed_at'))
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+    # Each backfill batch commits on its own instead of one long table-wide transaction
+    atomic = False
+
+    dependencies = [
+        ('newsletter', '0003_alter_subscription_options_alter_subscription_email_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='confirmed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(confirm_existing_subscriptions, migrations.RunPython.noop),
+    ]
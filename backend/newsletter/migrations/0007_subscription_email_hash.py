@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.utils.timezone
+import newsletter.models
+
+
+class Migration(migrations.Migration):
+    """
+    Step 1 of 2 towards one index per access path on newsletter_subscription.
+
+    0003 left email with a unique constraint, db_index=True and an explicit
+    index, and subscribed_at with db_index=True next to an explicit
+    descending index. Drop the duplicates and add email_hash as a nullable
+    column with a unique index (filtered to non-NULL rows on SQL Server).
+
+    Workers of the previous release keep inserting rows without a hash until
+    the rollout finishes, so email keeps its unique constraint and email_hash
+    stays nullable in this release; see DEPLOYMENT.md for the follow-up.
+    """
+
+    dependencies = [
+        ('newsletter', '0006_archivedsubscription'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='subscription',
+            name='newsletter__email_3ce146_idx',
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='subscribed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='email_hash',
+            field=newsletter.models.FixedBinaryField(editable=False, max_length=16, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, transaction
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+import hashlib
+
+BATCH_SIZE = 1000
+
+
+def hash_email(email: str) -> bytes:
+    # Frozen copy of newsletter.models.hash_email as of this migration, so later
+    # changes to the live function cannot change what this step writes
+    return hashlib.blake2b(email.strip().lower().encode(), digest_size=16).digest()
+
+
+def backfill_email_hashes(apps, schema_editor):
+    """
+    Fill email_hash for existing rows in primary key order, one short
+    transaction per batch, so signups keep flowing while it runs. Rows written
+    by the new code already carry a hash and are skipped, which also makes the
+    step safe to re-run.
+    """
+    Subscription = apps.get_model('newsletter', 'Subscription')
+    db = schema_editor.connection.alias
+
+    # Addresses stored before signups were lowercased would collide on the unique
+    # email_hash index once normalized; list them instead of failing mid-backfill
+    duplicates = list(
+        Subscription.objects.using(db).filter(email_hash__isnull=True).order_by()
+        .values(normalized=Lower(Trim('email'))).annotate(rows=Count('pk')).filter(rows__gt=1)
+        .values_list('normalized', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            f'Addresses subscribed more than once when compared case-insensitively: '
+            f'{", ".join(sorted(duplicates))}. Delete the extra rows and run migrate again.'
+        )
+
+    pending = Subscription.objects.using(db).filter(email_hash__isnull=True).order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(pending.filter(pk__gt=last_pk).only('pk', 'email')[:BATCH_SIZE])
+        if not rows:
+            break
+        for row in rows:
+            row.email_hash = hash_email(row.email)
+        with transaction.atomic(using=db):
+            Subscription.objects.using(db).bulk_update(rows, ['email_hash'])
+        last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+    """Step 2 of 2: chunked backfill of email_hash (no long-running transaction)"""
+
+    atomic = False
+
+    dependencies = [
+        ('newsletter', '0007_subscription_email_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_email_hashes, migrations.RunPython.noop),
+    ]
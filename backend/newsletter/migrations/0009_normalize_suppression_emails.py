@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_suppression_emails(apps, schema_editor):
+    """
+    Store suppressed addresses trimmed and lowercased, as the app now looks
+    them up. Case variants of the same address collapse into a single row.
+    """
+    Suppression = apps.get_model('newsletter', 'Suppression')
+    db = schema_editor.connection.alias
+
+    rows = list(
+        Suppression.objects.using(db).annotate(normalized=Lower(Trim('email')))
+        .exclude(email=F('normalized')).order_by('created_at', 'pk')
+        .values_list('pk', 'normalized')
+    )
+    for pk, normalized in rows:
+        if Suppression.objects.using(db).filter(email=normalized).exists():
+            Suppression.objects.using(db).filter(pk=pk).delete()
+        else:
+            Suppression.objects.using(db).filter(pk=pk).update(email=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0008_backfill_subscription_email_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_suppression_emails, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,78 @@
+import hashlib
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
+EMAIL_HASH_BYTES = 16
+
+def normalize_email(email: str) -> str:
+    """Trimmed, lowercased form of an address, used for every lookup key"""
+    return email.strip().lower()
+
+def hash_email(email: str) -> bytes:
+    """Fixed-width lookup key for an address: BLAKE2b-128 of the normalized (trimmed, lowercased) email"""
+    return hashlib.blake2b(normalize_email(email).encode(), digest_size=EMAIL_HASH_BYTES).digest()
+
+class FixedBinaryField(models.BinaryField):
+    """binary(n) on SQL Server rather than varbinary(n): no length prefix, keys compare as fixed-width"""
+    def db_type(self, connection):
+        if connection.vendor == 'microsoft':
+            return f'binary({self.max_length})'
+        return super().db_type(connection)
+
 class Subscription(models.Model):
-    email = models.EmailField(unique=True)  # Keep simple for now to avoid migration issues
+    email = models.EmailField(unique=True)  # Unique until every row has email_hash; look rows up by email_hash
+    # hash_email(email); NULL only on rows written by the previous release during its rollout
+    email_hash = FixedBinaryField(max_length=EMAIL_HASH_BYTES, unique=True, null=True, editable=False)
     subscribed_at = models.DateTimeField(default=timezone.now)
+    confirmed_at = models.DateTimeField(null=True, blank=True)  # Set by double opt-in confirmation
 
     class Meta:
         ordering = ['-subscribed_at']  # Default ordering by newest first
+        indexes = [
+            # Admin listing and the expiry/archive scans
+            models.Index(fields=['-subscribed_at'], name='newsletter__subscri_e4a0d3_idx'),
+        ]
+
+    def validate_unique(self, exclude=None):
+        # email's own unique check is case-sensitive, so check the normalized key too
+        super().validate_unique(exclude)
+        if exclude and 'email' in exclude:
+            return
+        duplicate = Subscription.objects.filter(email_hash=hash_email(self.email)).exclude(pk=self.pk)
+        if duplicate.exists():
+            raise ValidationError({'email': 'This address is already subscribed.'})
+
+    def save(self, *args, **kwargs):
+        self.email_hash = hash_email(self.email)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.email
+
+class Suppression(models.Model):
+    """Addresses that must never be mailed again (unsubscribed); ``email`` is stored normalized"""
+    email = models.EmailField(unique=True)
+    reason = models.CharField(max_length=32, default='unsubscribe')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.email
+
+class ArchivedSubscription(models.Model):
+    """Subscriptions moved out of the live table by manage.py archive_subscriptions"""
+    original_id = models.BigIntegerField(unique=True)  # Subscription.pk, so re-running a chunk is harmless
+    email = models.EmailField()
+    subscribed_at = models.DateTimeField()
+    confirmed_at = models.DateTimeField(null=True, blank=True)
+    reason = models.CharField(max_length=32)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-archived_at']
 
     def __str__(self):
         return self.email
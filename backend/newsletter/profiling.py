@@ -0,0 +1,239 @@
+"""
+Opt-in per-request profiling
+
+Enable with PROFILING_ENABLED=true. A request is profiled when it is sampled
+(PROFILING_SAMPLE_RATE) or carries a valid signed X-Profile-Token header (see
+make_profile_token). Two modes are supported:
+
+- 'sampling' (default): a background thread snapshots the request thread's
+  stack every PROFILING_INTERVAL seconds and writes collapsed stacks (.stacks).
+  Low overhead, and any number of requests can be profiled concurrently.
+- 'cprofile': deterministic cProfile, written as pstats files (.prof). Only one
+  request per process is profiled at a time.
+
+Profiles go to PROFILING_DIR, keeping at most PROFILING_MAX_FILES, and are
+merged per view with `manage.py profile_report`.
+"""
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+PROFILE_TOKEN_SALT = 'newsletter.profiling'
+CPROFILE_SUFFIX = '.prof'
+STACKS_SUFFIX = '.stacks'
+PROFILE_SUFFIXES = (CPROFILE_SUFFIX, STACKS_SUFFIX)
+
+# cProfile hooks are process-wide on Python 3.12+, so only one request at a
+# time can be cProfiled; concurrent requests simply run unprofiled.
+_cprofile_lock = threading.Lock()
+
+
+def make_profile_token() -> str:
+    """Create a signed token that forces profiling of the request sending it"""
+    return signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).sign('profile')
+
+
+def has_valid_profile_token(request) -> bool:
+    token = request.META.get(PROFILE_TOKEN_HEADER)
+    if not token:
+        return False
+    try:
+        signing.TimestampSigner(salt=PROFILE_TOKEN_SALT).unsign(
+            token, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+        )
+        return True
+    except signing.BadSignature:
+        logger.warning("Rejected invalid or expired profile token")
+        return False
+
+
+def get_view_group(request) -> str:
+    """Name used to group profiles: the URL name, or 'admin' for the admin site"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    if match.app_name == 'admin':
+        return 'admin'
+    return match.url_name or match.view_name or 'unnamed'
+
+
+def get_profile_dir() -> Path:
+    return Path(getattr(settings, 'PROFILING_DIR', None) or Path(settings.BASE_DIR) / 'profiles')
+
+
+def parse_profile_filename(path: Path) -> str:
+    """Return the view group encoded in a profile filename"""
+    # <timestamp>-<pid>-<view group>-<duration ms>.<suffix>
+    parts = path.stem.split('-', 2)
+    if len(parts) < 3:
+        return 'unknown'
+    return parts[2].rsplit('-', 1)[0]
+
+
+def list_profiles(profile_dir: Path) -> list:
+    return sorted(p for p in profile_dir.iterdir() if p.suffix in PROFILE_SUFFIXES)
+
+
+def rotate_profiles(profile_dir: Path, max_files: int):
+    """Delete the oldest profiles so at most max_files remain"""
+    profiles = list_profiles(profile_dir)
+    for path in profiles[:max(len(profiles) - max_files, 0)]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """Render a frame and its parents as a root-first, ';'-separated stack"""
+    names = []
+    while frame is not None:
+        names.append(format_frame(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    Process-wide sampler thread shared by all profiled requests.
+
+    Each registered thread gets a Counter of collapsed stacks. The sampler only
+    runs while at least one request is registered.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id: int) -> Counter:
+        samples = Counter()
+        with self._lock:
+            self._targets[thread_id] = samples
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+                self._thread.start()
+        return samples
+
+    def stop(self, thread_id: int) -> Counter:
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                targets = list(self._targets.items())
+            frames = sys._current_frames()
+            for thread_id, samples in targets:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[collapse_stack(frame)] += 1
+            time.sleep(self.interval)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler() -> StackSampler:
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = StackSampler(float(getattr(settings, 'PROFILING_INTERVAL', 0.005)))
+        return _sampler
+
+
+class ProfilingMiddleware:
+    """
+    Profile sampled or explicitly requested requests.
+
+    Place first in MIDDLEWARE so the rest of the middleware stack is included
+    in the profile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mode = getattr(settings, 'PROFILING_MODE', 'sampling')
+        self.sample_rate = float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0))
+        self.max_files = int(getattr(settings, 'PROFILING_MAX_FILES', 500))
+        self.profile_dir = get_profile_dir()
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+
+    def should_profile(self, request) -> bool:
+        if has_valid_profile_token(request):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        if self.mode == 'cprofile':
+            return self.profile_with_cprofile(request)
+        return self.profile_with_sampler(request)
+
+    def profile_with_sampler(self, request):
+        sampler = get_sampler()
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        sampler.start(thread_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            samples = sampler.stop(thread_id)
+        duration_ms = int((time.perf_counter() - start) * 1000)
+
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in samples.items():
+                    f.write(f"{stack} {count}\n")
+
+        return self.save(request, response, write, STACKS_SUFFIX, duration_ms)
+
+    def profile_with_cprofile(self, request):
+        if not _cprofile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            _cprofile_lock.release()
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        return self.save(request, response, profiler.dump_stats, CPROFILE_SUFFIX, duration_ms)
+
+    def save(self, request, response, write, suffix: str, duration_ms: int):
+        try:
+            timestamp = f"{time.strftime('%Y%m%dT%H%M%S')}_{time.time_ns() % 1_000_000_000:09d}"
+            path = self.profile_dir / f"{timestamp}-{os.getpid()}-{get_view_group(request)}-{duration_ms}{suffix}"
+            write(path)
+            rotate_profiles(self.profile_dir, self.max_files)
+            logger.debug(f"Wrote profile {path.name} ({duration_ms} ms)")
+            if settings.DEBUG:
+                response['X-Profile-File'] = path.name
+        except Exception as e:
+            logger.error(f"Failed to write request profile: {e}")
+        return response
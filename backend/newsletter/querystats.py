@@ -0,0 +1,146 @@
+"""
+Per-request SQL query accounting and query budgets
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+from . import metrics
+from .profiling import get_view_group
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block or view issues more queries than its budget allows"""
+
+
+class QueryStats:
+    """
+    Database execute wrapper that records query count, total time and the
+    slowest statement. Install with ``record_queries()``.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.by_alias = Counter()
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(context['connection'].alias, sql, time.perf_counter() - start)
+
+    def record(self, alias: str, sql: str, duration: float):
+        self.count += 1
+        self.total_time += duration
+        self.by_alias[alias] += 1
+        self.statements.append(sql)
+        if duration >= self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_sql = sql
+
+    @property
+    def total_ms(self) -> float:
+        return self.total_time * 1000
+
+    @property
+    def slowest_ms(self) -> float:
+        return self.slowest_time * 1000
+
+
+@contextmanager
+def record_queries(using=None):
+    """
+    Record every query run on this thread's connections inside the block.
+
+    Args:
+        using: Database alias or list of aliases (defaults to all databases)
+    """
+    if using is None:
+        aliases = list(connections)
+    elif isinstance(using, str):
+        aliases = [using]
+    else:
+        aliases = list(using)
+
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+@contextmanager
+def query_budget(max_queries: int, using=None, label: str = 'block'):
+    """
+    Fail with QueryBudgetExceeded if the block issues more than max_queries.
+
+    Intended for tests and CI checks::
+
+        with query_budget(4, label='subscribe_email'):
+            client.post('/api/subscribe/', ...)
+    """
+    with record_queries(using) as stats:
+        yield stats
+    if stats.count > max_queries:
+        statements = '\n'.join(f"  {sql}" for sql in stats.statements)
+        raise QueryBudgetExceeded(
+            f"{label} issued {stats.count} queries (budget {max_queries}):\n{statements}"
+        )
+
+
+class QueryAccountingMiddleware:
+    """
+    Count queries and DB time per request.
+
+    Results feed the metrics registry per view, are compared against
+    QUERY_BUDGETS, and are returned as X-DB-* response headers when DEBUG or
+    QUERY_STATS_HEADERS is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        self.headers = settings.DEBUG or getattr(settings, 'QUERY_STATS_HEADERS', False)
+        self.slow_query_ms = getattr(settings, 'SLOW_QUERY_MS', 500)
+
+    def __call__(self, request):
+        with record_queries() as stats:
+            response = self.get_response(request)
+
+        view = get_view_group(request)
+        metrics.incr('db.requests', view=view)
+        metrics.incr('db.queries', stats.count, view=view)
+        metrics.observe('db.time_ms', stats.total_ms, view=view)
+        for alias, count in stats.by_alias.items():
+            metrics.incr('db.queries_by_alias', count, alias=alias, view=view)
+
+        if stats.slowest_ms >= self.slow_query_ms:
+            logger.warning(f"Slow query in {view} ({stats.slowest_ms:.1f} ms): {stats.slowest_sql}")
+
+        budget = self.budgets.get(view)
+        if budget is not None and stats.count > budget:
+            message = f"{view} issued {stats.count} queries (budget {budget})"
+            metrics.incr('db.budget_exceeded', view=view)
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        if self.headers:
+            response['X-DB-Query-Count'] = str(stats.count)
+            response['X-DB-Time-Ms'] = f"{stats.total_ms:.2f}"
+            response['X-DB-Slowest-Ms'] = f"{stats.slowest_ms:.2f}"
+            if stats.by_alias:
+                response['X-DB-Queries-By-Alias'] = ', '.join(
+                    f"{alias}={count}" for alias, count in sorted(stats.by_alias.items())
+                )
+        return response
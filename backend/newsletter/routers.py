@@ -0,0 +1,151 @@
+"""
+Primary/replica database routing
+
+All writes, and every read that is not explicitly marked read-only, go to the
+primary ('default') alias, so subscribe_email keeps read-your-writes. Heavy
+read-only paths (admin lists, exports, stats, warmup) opt in with
+``read_replica()`` and are sent to REPLICA_DB_ALIAS while the replica's
+measured staleness is within tolerance; otherwise they fall back to primary.
+
+Locally the router can be exercised with two SQLite files: run with
+DB_ENGINE=sqlite DB_READ_REPLICA=true and copy db.sqlite3 to db-replica.sqlite3.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.utils import timezone
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_read_alias = ContextVar('newsletter_read_alias', default=None)
+
+
+def get_replica_alias():
+    """The configured replica alias, or None if there is no replica"""
+    alias = getattr(settings, 'REPLICA_DB_ALIAS', '')
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def measure_replica_lag(alias: str) -> float:
+    """
+    Estimate how far the replica trails the primary, in seconds.
+
+    Compares the newest subscription on each side. If the replica is missing
+    rows, the age of its own newest row is used, which overstates the lag
+    rather than understating it. Override with REPLICA_LAG_PROBE (a dotted path
+    to a callable taking the alias) to use engine-specific lag reporting.
+    """
+    from .models import Subscription
+    primary_latest = Subscription.objects.using(DEFAULT_DB_ALIAS).aggregate(latest=Max('subscribed_at'))['latest']
+    replica_latest = Subscription.objects.using(alias).aggregate(latest=Max('subscribed_at'))['latest']
+    if primary_latest is None or (replica_latest is not None and replica_latest >= primary_latest):
+        return 0.0
+    if replica_latest is None:
+        return float('inf')
+    return max((timezone.now() - replica_latest).total_seconds(), 0.0)
+
+
+class ReplicaLagMonitor:
+    """Caches the replica lag estimate for REPLICA_LAG_CHECK_INTERVAL seconds per process"""
+
+    def __init__(self):
+        self._lag = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def lag(self, alias: str) -> float:
+        interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 10)
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < interval:
+            return self._lag
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= interval:
+                self._lag = self._probe(alias)
+                self._checked_at = time.monotonic()
+        return self._lag
+
+    def _probe(self, alias: str) -> float:
+        from django.utils.module_loading import import_string
+        probe_path = getattr(settings, 'REPLICA_LAG_PROBE', '')
+        probe = import_string(probe_path) if probe_path else measure_replica_lag
+        try:
+            lag = probe(alias)
+        except Exception as e:
+            # An unreachable replica is treated as infinitely stale
+            logger.warning(f"Replica lag check on '{alias}' failed: {e}")
+            lag = float('inf')
+        metrics.set_gauge('db.replica_lag_seconds', lag if lag != float('inf') else -1, alias=alias)
+        return lag
+
+    def reset(self):
+        with self._lock:
+            self._lag = None
+            self._checked_at = None
+
+
+lag_monitor = ReplicaLagMonitor()
+
+
+def get_read_alias(max_staleness: float = None) -> str:
+    """
+    Pick the alias for a read-only operation.
+
+    Args:
+        max_staleness: Seconds of replica lag the caller tolerates
+            (defaults to REPLICA_MAX_STALENESS; a negative value skips the check)
+
+    Returns:
+        str: The replica alias if it is configured and fresh enough, else 'default'
+    """
+    alias = get_replica_alias()
+    if alias is None:
+        return DEFAULT_DB_ALIAS
+    if max_staleness is None:
+        max_staleness = getattr(settings, 'REPLICA_MAX_STALENESS', 30)
+    if max_staleness < 0:
+        return alias
+    lag = lag_monitor.lag(alias)
+    if lag > max_staleness:
+        metrics.incr('db.replica_fallbacks', alias=alias)
+        logger.info(f"Replica '{alias}' lag {lag:.1f}s exceeds {max_staleness}s, reading from primary")
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+@contextmanager
+def read_replica(max_staleness: float = None):
+    """
+    Route reads inside the block to the replica when it is fresh enough.
+
+    Writes inside the block still go to primary. Yields the chosen alias.
+    """
+    alias = get_read_alias(max_staleness)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Database router: primary for writes and by default, replica only inside read_replica()"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema changes through replication
+        return db != get_replica_alias()
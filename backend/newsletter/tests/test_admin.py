@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from unittest import mock
+from newsletter.events import SUBSCRIPTION_CREATED, SUBSCRIPTION_UNSUBSCRIBED
+from newsletter.models import Subscription
+
+CHANGELIST = '/admin/newsletter/subscription/'
+
+
+# The admin's static files are not collected for tests
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class SubscriptionAdminEventTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser(username='admin-events', email='', password=None)
+        self.client.force_login(user)
+        patcher = mock.patch('newsletter.admin.publish_on_commit')
+        self.publish = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def published(self):
+        return [(call.args[0], list(call.args[1]), call.kwargs) for call in self.publish.call_args_list]
+
+    def test_add_publishes_created(self):
+        response = self.client.post(f'{CHANGELIST}add/', {'email': 'added@example.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.published(), [(SUBSCRIPTION_CREATED, ['added@example.com'], {'source': 'admin'})])
+
+    def test_changing_the_address_publishes_removal_and_creation(self):
+        subscription = Subscription.objects.create(email='old@example.com')
+        response = self.client.post(f'{CHANGELIST}{subscription.pk}/change/', {'email': 'new@example.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.published(), [
+            (SUBSCRIPTION_UNSUBSCRIBED, ['old@example.com'], {'source': 'admin'}),
+            (SUBSCRIPTION_CREATED, ['new@example.com'], {'source': 'admin'}),
+        ])
+
+    def test_saving_without_changes_publishes_nothing(self):
+        subscription = Subscription.objects.create(email='same@example.com')
+        self.client.post(f'{CHANGELIST}{subscription.pk}/change/', {'email': 'same@example.com'})
+        self.assertEqual(self.published(), [])
+
+    def test_delete_publishes_unsubscribed(self):
+        subscription = Subscription.objects.create(email='deleted@example.com')
+        response = self.client.post(f'{CHANGELIST}{subscription.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.published(), [(SUBSCRIPTION_UNSUBSCRIBED, ['deleted@example.com'], {'source': 'admin'})])
+
+    def test_bulk_delete_publishes_every_address(self):
+        pks = [Subscription.objects.create(email=f'bulk-{n}@example.com').pk for n in range(3)]
+        response = self.client.post(CHANGELIST, {
+            'action': 'delete_selected', '_selected_action': pks, 'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Subscription.objects.exists())
+        [(event_type, emails, data)] = self.published()
+        self.assertEqual((event_type, sorted(emails), data),
+                         (SUBSCRIPTION_UNSUBSCRIBED, [f'bulk-{n}@example.com' for n in range(3)], {'source': 'admin'}))
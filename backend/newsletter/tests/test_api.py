@@ -0,0 +1,41 @@
+from django.test import TestCase, override_settings
+from newsletter.confirmation import make_confirmation_token
+from newsletter.unsubscribe import make_unsubscribe_token
+
+ORIGIN = 'http://localhost:5173'
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False)
+class ApiRouterTests(TestCase):
+    def test_html_pages_cannot_be_framed(self):
+        for path in (
+            f'/api/confirm/{make_confirmation_token("person@example.com")}/',
+            f'/api/unsubscribe/{make_unsubscribe_token("person@example.com")}/',
+            '/api/confirm/invalid-token/',
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path)['X-Frame-Options'], 'DENY')
+
+    def test_legal_pages_cannot_be_framed(self):
+        response = self.client.get('/api/legal/privacy/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_unresolved_paths_use_the_full_stack(self):
+        response = self.client.get('/api/no-such-endpoint/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_cors_headers_for_allowed_origins_only(self):
+        response = self.client.get('/api/health/', HTTP_ORIGIN=ORIGIN)
+        self.assertEqual(response['Access-Control-Allow-Origin'], ORIGIN)
+        self.assertIn('Origin', response['Vary'])
+        response = self.client.get('/api/health/', HTTP_ORIGIN='https://evil.example')
+        self.assertNotIn('Access-Control-Allow-Origin', response)
+
+    def test_preflight_is_answered_by_the_router(self):
+        response = self.client.options('/api/subscribe/', HTTP_ORIGIN=ORIGIN,
+                                       HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Access-Control-Allow-Origin'], ORIGIN)
+        self.assertIn('POST', response['Access-Control-Allow-Methods'])
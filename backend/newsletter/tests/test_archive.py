@@ -0,0 +1,93 @@
+from datetime import timedelta
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from io import StringIO
+from newsletter.models import ArchivedSubscription, Subscription, Suppression
+from pathlib import Path
+import gzip
+import json
+import shutil
+import tempfile
+
+
+@override_settings(EVENT_LOG_ENABLED=False, WEBHOOK_URLS=[])
+class ArchiveSubscriptionsTests(TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.checkpoint = self.directory / 'checkpoint.json'
+        now = timezone.now()
+        old = now - timedelta(days=30)
+        self.stale = [Subscription.objects.create(email=f'stale-{n}@example.com', subscribed_at=old) for n in range(3)]
+        self.gone = Subscription.objects.create(email='gone@example.com', subscribed_at=now, confirmed_at=now)
+        Suppression.objects.create(email='gone@example.com')
+        Subscription.objects.create(email='pending@example.com', subscribed_at=now)
+        Subscription.objects.create(email='confirmed@example.com', subscribed_at=old, confirmed_at=old)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('archive_subscriptions', '--checkpoint', str(self.checkpoint), '--output-dir', str(self.directory),
+                     '--sleep', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def live(self):
+        return sorted(Subscription.objects.values_list('email', flat=True))
+
+    def archived(self):
+        return dict(ArchivedSubscription.objects.values_list('email', 'reason'))
+
+    def test_archives_unconfirmed_and_unsubscribed_rows(self):
+        self.run_command()
+        self.assertEqual(self.live(), ['confirmed@example.com', 'pending@example.com'])
+        self.assertEqual(self.archived(), {
+            'gone@example.com': 'unsubscribed',
+            **{subscription.email: 'unconfirmed' for subscription in self.stale},
+        })
+        self.assertTrue(json.loads(self.checkpoint.read_text())['completed'])
+
+    def test_interrupted_run_resumes_after_the_last_chunk(self):
+        output = self.run_command('--batch-size', '1', '--time-limit', '0.000001')
+        self.assertIn('run again to resume', output)
+        self.assertEqual(ArchivedSubscription.objects.count(), 1)
+        state = json.loads(self.checkpoint.read_text())
+        self.assertEqual((state['last_pk'], state['archived'], state['completed']), (self.stale[0].pk, 1, False))
+
+        output = self.run_command('--batch-size', '2')
+        self.assertIn(f'Resuming after id {self.stale[0].pk} (1 rows already archived)', output)
+        self.assertEqual(ArchivedSubscription.objects.count(), 4)
+        state = json.loads(self.checkpoint.read_text())
+        self.assertEqual((state['archived'], state['completed']), (4, True))
+
+    def test_resume_requires_the_same_reasons(self):
+        self.run_command('--batch-size', '1', '--time-limit', '0.000001')
+        with self.assertRaises(CommandError):
+            self.run_command('--reason', 'unsubscribed')
+        self.run_command('--reason', 'unsubscribed', '--restart')
+        self.assertEqual(self.archived()['gone@example.com'], 'unsubscribed')
+
+    def test_rows_already_archived_by_a_crashed_run_are_skipped(self):
+        # The archive copy of this chunk committed, but the rows are still live
+        first = self.stale[0]
+        ArchivedSubscription.objects.create(original_id=first.pk, email=first.email,
+                                            subscribed_at=first.subscribed_at, reason='unconfirmed')
+        self.run_command()
+        self.assertEqual(ArchivedSubscription.objects.filter(original_id=first.pk).count(), 1)
+        self.assertEqual(ArchivedSubscription.objects.count(), 4)
+        self.assertFalse(Subscription.objects.filter(pk=first.pk).exists())
+
+    def test_ndjson_resume_appends_to_the_same_file(self):
+        self.run_command('--to', 'ndjson', '--batch-size', '1', '--time-limit', '0.000001')
+        self.run_command('--to', 'ndjson', '--batch-size', '2')
+        [path] = self.directory.glob('*.ndjson.gz')
+        with gzip.open(path, 'rt') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(sorted(record['email'] for record in records),
+                         ['gone@example.com'] + [subscription.email for subscription in self.stale])
+        self.assertFalse(ArchivedSubscription.objects.exists())
+
+    def test_dry_run_changes_nothing(self):
+        output = self.run_command('--dry-run')
+        self.assertIn('4 subscriptions would be archived', output)
+        self.assertEqual(Subscription.objects.count(), 6)
+        self.assertFalse(self.checkpoint.exists())
@@ -0,0 +1,127 @@
+from django.core import signing
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from unittest import mock
+from newsletter import metrics
+from newsletter.confirmation import (
+    CONFIRMATION_SALT, confirm_email, make_confirmation_token, verify_confirmation_token,
+)
+from newsletter.models import Subscription
+import json
+import time
+import uuid
+
+
+class ConfirmationTokenTests(TestCase):
+    def test_round_trip(self):
+        token = make_confirmation_token('person@example.com')
+        self.assertEqual(verify_confirmation_token(token), 'person@example.com')
+
+    def test_tampered_token_is_rejected(self):
+        token = make_confirmation_token('person@example.com')
+        tampered = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        self.assertIsNone(verify_confirmation_token(tampered))
+        self.assertIsNone(verify_confirmation_token('not-a-token'))
+
+    def test_token_for_another_purpose_is_rejected(self):
+        token = signing.dumps('person@example.com', salt='newsletter.unsubscribe', compress=True)
+        self.assertIsNone(verify_confirmation_token(token))
+
+    def test_invalid_tokens_are_counted_not_logged_as_warnings(self):
+        key = metrics.metric_name('confirmation.invalid_tokens', reason='bad_signature')
+        before = metrics.snapshot()['counters'].get(key, 0)
+        with self.assertNoLogs('newsletter.confirmation', 'INFO'):
+            for _ in range(3):
+                verify_confirmation_token('not-a-token')
+        self.assertEqual(metrics.snapshot()['counters'][key], before + 3)
+
+    @override_settings(CONFIRMATION_TOKEN_MAX_AGE=60)
+    def test_expired_token_is_rejected(self):
+        token = make_confirmation_token('person@example.com')
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 61):
+            self.assertIsNone(verify_confirmation_token(token))
+        self.assertEqual(signing.loads(token, salt=CONFIRMATION_SALT), 'person@example.com')
+
+    def test_confirm_email_only_confirms_once(self):
+        Subscription.objects.create(email='person@example.com')
+        self.assertTrue(confirm_email('person@example.com'))
+        self.assertFalse(confirm_email('person@example.com'))
+        self.assertFalse(confirm_email('nobody@example.com'))
+
+
+@override_settings(CONFIRMATION_REDIRECT_URL='')
+class ConfirmSubscriptionViewTests(TestCase):
+    def setUp(self):
+        self.subscription = Subscription.objects.create(email='person@example.com')
+        self.url = f'/api/confirm/{make_confirmation_token("person@example.com")}/'
+
+    def confirmed_at(self):
+        self.subscription.refresh_from_db()
+        return self.subscription.confirmed_at
+
+    def test_get_renders_a_form_without_confirming(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<form method="post"')
+        self.assertIsNone(self.confirmed_at())
+
+    def test_post_confirms(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(self.confirmed_at())
+
+    @override_settings(CONFIRMATION_REDIRECT_URL='https://example.com/thanks')
+    def test_post_redirects_when_configured(self):
+        response = self.client.post(self.url)
+        self.assertRedirects(response, 'https://example.com/thanks?confirmed=1', fetch_redirect_response=False)
+        self.assertIsNotNone(self.confirmed_at())
+
+    def test_invalid_token_renders_an_error_page(self):
+        for method in (self.client.get, self.client.post):
+            response = method('/api/confirm/invalid-token/')
+            self.assertEqual(response.status_code, 400)
+        self.assertIsNone(self.confirmed_at())
+
+    @override_settings(CONFIRMATION_TOKEN_MAX_AGE=60)
+    def test_expired_token_does_not_confirm(self):
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 61):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(self.confirmed_at())
+
+
+@override_settings(IDEMPOTENCY_CACHE_ALIAS='default', EVENT_LOG_ENABLED=False, WEBHOOK_URLS=[])
+class ConfirmationResendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('newsletter.views.queue_confirmation_email')
+        self.queue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def subscribe(self, email='person@example.com'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/subscribe/', json.dumps({'email': email}),
+                                        content_type='application/json', HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_signing_up_again_while_unconfirmed_resends_once_per_interval(self):
+        self.subscribe()
+        self.subscribe()
+        self.subscribe()
+        self.assertEqual([call.args[0] for call in self.queue.call_args_list],
+                         ['person@example.com', 'person@example.com'])
+
+    @override_settings(CONFIRMATION_RESEND_INTERVAL=0)
+    def test_without_a_resend_interval_every_signup_resends(self):
+        self.subscribe()
+        self.subscribe()
+        self.subscribe()
+        self.assertEqual(self.queue.call_count, 3)
+
+    def test_confirmed_address_gets_no_email(self):
+        Subscription.objects.create(email='person@example.com', confirmed_at=timezone.now())
+        response = self.subscribe()
+        self.assertFalse(response.json()['created'])
+        self.queue.assert_not_called()
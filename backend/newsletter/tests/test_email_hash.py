@@ -0,0 +1,88 @@
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from newsletter.models import EMAIL_HASH_BYTES, Subscription, hash_email
+
+backfill = import_module('newsletter.migrations.0008_backfill_subscription_email_hash')
+
+
+def legacy_row(email: str) -> Subscription:
+    """A row as the previous release wrote it: no email_hash (bulk_create skips save())"""
+    Subscription.objects.bulk_create([Subscription(email=email)])
+    return Subscription.objects.get(email=email)
+
+
+class HashEmailTests(SimpleTestCase):
+    def test_fixed_width_key_of_the_normalized_address(self):
+        key = hash_email('person@example.com')
+        self.assertEqual(len(key), EMAIL_HASH_BYTES)
+        self.assertEqual(hash_email('  Person@Example.COM\n'), key)
+        self.assertNotEqual(hash_email('person2@example.com'), key)
+
+    def test_migration_keeps_a_frozen_copy(self):
+        for email in ('person@example.com', ' Mixed@Case.example '):
+            self.assertEqual(backfill.hash_email(email), hash_email(email))
+
+
+class SubscriptionHashTests(TestCase):
+    def test_save_sets_the_hash(self):
+        subscription = Subscription.objects.create(email='Person@Example.com')
+        subscription.refresh_from_db()
+        self.assertEqual(bytes(subscription.email_hash), hash_email('person@example.com'))
+
+    def test_case_variants_are_rejected(self):
+        Subscription.objects.create(email='person@example.com')
+        with self.assertRaises(ValidationError):
+            Subscription(email='PERSON@example.com').full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Subscription.objects.create(email='PERSON@example.com')
+
+
+class BackfillMigrationTests(TestCase):
+    def run_backfill(self):
+        backfill.backfill_email_hashes(apps, mock.Mock(connection=connection))
+
+    def test_fills_missing_hashes(self):
+        with mock.patch.object(backfill, 'BATCH_SIZE', 2):
+            rows = [legacy_row(f'person-{n}@example.com') for n in range(5)]
+            Subscription.objects.create(email='current@example.com')
+            self.run_backfill()
+        for row in rows:
+            row.refresh_from_db()
+            self.assertEqual(bytes(row.email_hash), hash_email(row.email))
+
+    def test_case_duplicates_stop_the_migration_before_any_write(self):
+        legacy_row('person@example.com')
+        legacy_row('Person@Example.com ')
+        legacy_row('other@example.com')
+        with self.assertRaisesMessage(RuntimeError, 'person@example.com'):
+            self.run_backfill()
+        self.assertEqual(Subscription.objects.filter(email_hash__isnull=True).count(), 3)
+
+
+class BackfillCommandTests(TestCase):
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('backfill_email_hashes', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_counts(self):
+        legacy_row('person@example.com')
+        self.assertIn('1 subscriptions have no email_hash', self.run_command('--dry-run'))
+        self.assertTrue(Subscription.objects.filter(email_hash__isnull=True).exists())
+
+    def test_hashes_rows_and_reports_case_conflicts(self):
+        Subscription.objects.create(email='person@example.com')
+        legacy_row('PERSON@example.com')
+        legacy_row('other@example.com')
+        with self.assertRaisesMessage(CommandError, 'PERSON@example.com'):
+            self.run_command()
+        self.assertEqual(
+            list(Subscription.objects.filter(email_hash__isnull=True).values_list('email', flat=True)),
+            ['PERSON@example.com'],
+        )
@@ -0,0 +1,139 @@
+from django.test import SimpleTestCase
+from unittest import mock
+from newsletter import metrics
+from newsletter.emails import CircuitBreaker, EmailExecutor
+import smtplib
+import threading
+
+
+def rejected(reason: str) -> int:
+    return metrics.snapshot()['counters'].get(metrics.metric_name('emails.rejected', reason=reason), 0)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('newsletter.emails.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+
+    def open_breaker(self):
+        with self.assertLogs('newsletter.emails', 'WARNING'):
+            for _ in range(3):
+                self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.open_breaker()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.now += 10
+        self.assertEqual(self.breaker.acquire(), 20)
+
+    def test_success_resets_the_count(self):
+        for _ in range(5):
+            self.breaker.record_failure()
+            self.breaker.record_failure()
+            self.breaker.record_success()
+        self.assertEqual((self.breaker.state, self.breaker.failures), (CircuitBreaker.CLOSED, 0))
+
+    def test_half_open_lets_one_probe_through(self):
+        self.open_breaker()
+        self.now += 30
+        with self.assertLogs('newsletter.emails', 'WARNING'):
+            self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.acquire(), 0)
+        self.assertEqual(self.breaker.acquire(), 0.5)
+
+        with self.assertLogs('newsletter.emails', 'WARNING'):
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.acquire(), 0)
+
+    def test_failed_probe_reopens_for_another_period(self):
+        self.open_breaker()
+        self.now += 30
+        with self.assertLogs('newsletter.emails', 'WARNING'):
+            self.assertEqual(self.breaker.acquire(), 0)
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.acquire(), 30)
+
+    def test_release_ends_a_probe_without_a_verdict(self):
+        self.open_breaker()
+        self.now += 30
+        with self.assertLogs('newsletter.emails', 'WARNING'):
+            self.breaker.acquire()
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.acquire(), 0)
+
+
+class EmailExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+        self.executor = EmailExecutor(workers=1, queue_size=1, breaker=self.breaker)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def send(self, fn, description):
+        """Submit one send and wait for the sender thread to finish it"""
+        self.assertTrue(self.executor.submit(fn, description=description))
+        self.executor._queue.join()
+
+    def block_worker(self):
+        """Occupy the only sender thread until self.release is set"""
+        started = threading.Event()
+
+        def blocked():
+            started.set()
+            self.release.wait(5)
+
+        self.assertTrue(self.executor.submit(blocked, description='blocked'))
+        self.assertTrue(started.wait(5))
+
+    def test_full_queue_rejects_without_blocking(self):
+        self.block_worker()
+        self.assertTrue(self.executor.submit(lambda: None, description='queued'))
+        before = rejected('queue_full')
+        with self.assertLogs('newsletter.emails', 'ERROR'):
+            self.assertFalse(self.executor.submit(lambda: None, description='overflow'))
+        self.assertEqual(rejected('queue_full'), before + 1)
+        self.release.set()
+        self.assertTrue(self.executor.drain(5))
+
+    def test_smtp_errors_open_the_breaker_and_new_work_is_rejected(self):
+        def fail():
+            raise smtplib.SMTPServerDisconnected('gone')
+
+        self.send(fail, 'failing')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        with self.assertLogs('newsletter.emails', 'WARNING'):
+            self.send(fail, 'failing')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        before = rejected('breaker_open')
+        with self.assertLogs('newsletter.emails', 'ERROR'):
+            self.assertFalse(self.executor.submit(lambda: None, description='rejected'))
+        self.assertEqual(rejected('breaker_open'), before + 1)
+
+    def test_refused_recipients_do_not_count_as_failures(self):
+        def refuse():
+            raise smtplib.SMTPRecipientsRefused({'bad@example.com': (550, b'no such user')})
+
+        for _ in range(3):
+            self.send(refuse, 'refused')
+        self.assertEqual((self.breaker.state, self.breaker.failures), (CircuitBreaker.CLOSED, 0))
+
+    def test_drain_reports_sends_left_at_the_deadline(self):
+        self.block_worker()
+        self.executor.submit(lambda: None, description='left@example.com')
+        with self.assertLogs('newsletter.emails', 'ERROR') as logs:
+            self.assertFalse(self.executor.drain(0.05))
+        self.assertIn('left@example.com', logs.output[-1])
+        with self.assertLogs('newsletter.emails', 'ERROR'):
+            self.assertFalse(self.executor.submit(lambda: None, description='late'))
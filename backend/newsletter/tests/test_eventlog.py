@@ -0,0 +1,171 @@
+from datetime import date, datetime, timezone as dt_timezone
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from io import StringIO
+from newsletter.eventlog import MAGIC, EventLog, encode_record, iter_segment, list_segments, read_events
+from newsletter.events import (
+    SUBSCRIPTION_ARCHIVED, SUBSCRIPTION_CONFIRMED, SUBSCRIPTION_CREATED, SUBSCRIPTION_EXPIRED,
+    SUBSCRIPTION_UNSUBSCRIBED,
+)
+from newsletter.management.commands.replay_event_log import replay
+from newsletter.models import Subscription, hash_email
+from pathlib import Path
+import shutil
+import tempfile
+import time
+
+
+def write_segment(directory: Path, events: list, name: str = '0000000000001-100-000001.seg') -> Path:
+    path = directory / name
+    path.write_bytes(MAGIC + b''.join(encode_record(event) for event in events))
+    return path
+
+
+def at(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, dt_timezone.utc)
+
+
+class SegmentFormatTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.events = [{'type': SUBSCRIPTION_CREATED, 'email': f'{n}@example.com', 'ts': float(n)} for n in range(3)]
+
+    def test_torn_last_record_is_ignored(self):
+        path = write_segment(self.directory, self.events)
+        # A crash mid-write leaves only part of the last record
+        path.write_bytes(path.read_bytes()[:-5])
+        with self.assertLogs('newsletter.eventlog', 'WARNING'):
+            self.assertEqual(list(iter_segment(path)), self.events[:2])
+        with self.assertRaises(ValueError):
+            list(iter_segment(path, strict=True))
+
+    def test_partial_header_is_ignored(self):
+        path = write_segment(self.directory, self.events)
+        with open(path, 'ab') as f:
+            f.write(b'\x10\x00')
+        self.assertEqual(list(iter_segment(path)), self.events)
+
+    def test_reading_stops_at_a_corrupt_record(self):
+        path = write_segment(self.directory, self.events)
+        data = bytearray(path.read_bytes())
+        second = len(MAGIC) + len(encode_record(self.events[0]))
+        data[second + 12] ^= 0xFF
+        path.write_bytes(bytes(data))
+        with self.assertLogs('newsletter.eventlog', 'WARNING'):
+            self.assertEqual(list(iter_segment(path)), self.events[:1])
+
+    def test_empty_and_foreign_files(self):
+        empty = self.directory / 'empty.seg'
+        empty.write_bytes(MAGIC)
+        self.assertEqual(list(iter_segment(empty)), [])
+        foreign = self.directory / 'foreign.seg'
+        foreign.write_bytes(b'not a segment at all')
+        with self.assertRaises(ValueError):
+            list(iter_segment(foreign))
+
+    def test_writers_are_merged_in_timestamp_order(self):
+        write_segment(self.directory, [self.events[0], self.events[2]], '0000000000001-100-000001.seg')
+        write_segment(self.directory, [self.events[1]], '0000000000002-200-000001.seg')
+        self.assertEqual(list(read_events(self.directory)), self.events)
+
+    def test_writer_rotates_segments_and_reads_back(self):
+        log = EventLog(self.directory, segment_bytes=150, commit_interval=0, fsync=False)
+        for n in range(6):
+            log.append(SUBSCRIPTION_CREATED, [f'{n}@example.com'], source='test')
+            self.assertTrue(log.flush(5))
+        self.assertGreater(len(list_segments(self.directory)), 1)
+        events = list(read_events(self.directory, strict=True))
+        self.assertEqual([event['email'] for event in events], [f'{n}@example.com' for n in range(6)])
+        self.assertEqual({event['source'] for event in events}, {'test'})
+
+
+class ReplayFoldTests(SimpleTestCase):
+    def test_confirmation_without_creation_predates_the_log(self):
+        state, removed, _, _, _ = replay([{'type': SUBSCRIPTION_CONFIRMED, 'email': 'a@example.com', 'ts': 5.0}])
+        self.assertEqual((state, removed), ({'a@example.com': [None, 5.0]}, {}))
+
+    def test_every_removal_type_removes(self):
+        events = []
+        for n, event_type in enumerate((SUBSCRIPTION_UNSUBSCRIBED, SUBSCRIPTION_EXPIRED, SUBSCRIPTION_ARCHIVED)):
+            email = f'{n}@example.com'
+            events += [{'type': SUBSCRIPTION_CREATED, 'email': email, 'ts': 10.0 * n},
+                       {'type': SUBSCRIPTION_CONFIRMED, 'email': email, 'ts': 10.0 * n + 1},
+                       {'type': event_type, 'email': email, 'ts': 10.0 * n + 2}]
+        state, removed, _, _, count = replay(events)
+        self.assertEqual(state, {})
+        self.assertEqual(removed, {'0@example.com': 2.0, '1@example.com': 12.0, '2@example.com': 22.0})
+        self.assertEqual(count, 9)
+
+    def test_daily_rollups(self):
+        day = 86400.0
+        _, _, daily, first_ts, _ = replay([
+            {'type': SUBSCRIPTION_CREATED, 'email': 'a@example.com', 'ts': day},
+            {'type': SUBSCRIPTION_CREATED, 'email': 'b@example.com', 'ts': day + 1},
+            {'type': SUBSCRIPTION_UNSUBSCRIBED, 'email': 'a@example.com', 'ts': 2 * day},
+        ])
+        self.assertEqual(first_ts, day)
+        self.assertEqual(daily[date(1970, 1, 2)][SUBSCRIPTION_CREATED], 2)
+        self.assertEqual(daily[date(1970, 1, 3)][SUBSCRIPTION_UNSUBSCRIBED], 1)
+
+    def test_empty_log(self):
+        self.assertEqual(replay([])[3:], (None, 0))
+
+
+@override_settings(EVENT_LOG_ENABLED=False)
+class ReplayCommandTests(TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.start = time.time() - 3600
+        write_segment(self.directory, [
+            {'type': SUBSCRIPTION_CREATED, 'email': 'kept@example.com', 'ts': self.start},
+            {'type': SUBSCRIPTION_CREATED, 'email': 'gone@example.com', 'ts': self.start + 1},
+            {'type': SUBSCRIPTION_UNSUBSCRIBED, 'email': 'gone@example.com', 'ts': self.start + 60},
+        ])
+        Subscription.objects.create(email='kept@example.com', subscribed_at=at(self.start))
+        # The log removed it, but the row survived (e.g. restored from a backup)
+        Subscription.objects.create(email='gone@example.com', subscribed_at=at(self.start + 1))
+        # Never logged here: written by another container or created outside the app
+        Subscription.objects.create(email='unlogged@example.com', subscribed_at=at(self.start + 30))
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('replay_event_log', '--dir', str(self.directory), '--days', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_replay_tracks_addresses_whose_last_event_removed_them(self):
+        state, removed, _, first_ts, count = replay([
+            {'type': SUBSCRIPTION_CREATED, 'email': 'a@example.com', 'ts': 1.0},
+            {'type': SUBSCRIPTION_UNSUBSCRIBED, 'email': 'a@example.com', 'ts': 2.0},
+            {'type': SUBSCRIPTION_CREATED, 'email': 'b@example.com', 'ts': 3.0},
+            {'type': SUBSCRIPTION_UNSUBSCRIBED, 'email': 'b@example.com', 'ts': 4.0},
+            {'type': SUBSCRIPTION_CREATED, 'email': 'b@example.com', 'ts': 5.0},
+        ])
+        self.assertEqual(state, {'b@example.com': [5.0, None]})
+        self.assertEqual(removed, {'a@example.com': 2.0})
+        self.assertEqual((first_ts, count), (1.0, 5))
+
+    def test_verify_reports_unlogged_rows_without_failing(self):
+        Subscription.objects.filter(email_hash=hash_email('gone@example.com')).delete()
+        output = self.run_command('--verify')
+        self.assertIn('0 removed in the log, 1 unlogged', output)
+        self.assertIn('unlogged: unlogged@example.com', output)
+
+    def test_verify_fails_on_rows_the_log_removed(self):
+        with self.assertRaises(CommandError):
+            self.run_command('--verify')
+
+    def test_delete_extra_only_deletes_rows_the_log_removed(self):
+        self.run_command('--rebuild', '--delete-extra')
+        self.assertEqual(
+            sorted(Subscription.objects.values_list('email', flat=True)),
+            ['kept@example.com', 'unlogged@example.com'],
+        )
+
+    def test_row_recreated_after_its_removal_is_kept(self):
+        Subscription.objects.filter(email_hash=hash_email('gone@example.com')).update(
+            subscribed_at=at(self.start + 120)
+        )
+        self.run_command('--rebuild', '--delete-extra')
+        self.assertTrue(Subscription.objects.filter(email_hash=hash_email('gone@example.com')).exists())
@@ -0,0 +1,122 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+from unittest import mock
+from newsletter import metrics
+from newsletter.faultdb.base import ENGINE, fault_settings, mark_idle, wrap_settings
+import os
+import shutil
+import tempfile
+
+
+def connections(**databases) -> ConnectionHandler:
+    """A private connection handler, so the test aliases never touch the test database"""
+    return ConnectionHandler({'default': {'ENGINE': 'django.db.backends.dummy'}, **databases})
+
+
+def counter(name: str, alias: str) -> float:
+    return metrics.snapshot()['counters'].get(metrics.metric_name(name, alias=alias), 0)
+
+
+class FaultDatabaseTestCase(SimpleTestCase):
+    alias = 'faultdb_test'
+
+    def connect(self, **faults):
+        # A file, not :memory:, since the sqlite backend never closes in-memory connections
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connection = connections(**{self.alias: {
+            'ENGINE': ENGINE, 'INNER_ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'db.sqlite3'),
+            'FAULTS': faults,
+        }})[self.alias]
+        self.addCleanup(connection.close)
+        return connection
+
+    def query(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0]
+
+
+class DisconnectTests(FaultDatabaseTestCase):
+    def test_dropped_connection_fails_until_django_reconnects(self):
+        connection = self.connect()
+        self.assertEqual(self.query(connection), 1)
+        connects = counter('db.faults.connects', self.alias)
+
+        connection.faults['DISCONNECT_RATE'] = 1.0
+        with self.assertLogs('newsletter.faultdb', 'INFO'), self.assertRaises(OperationalError):
+            self.query(connection)
+        connection.faults['DISCONNECT_RATE'] = 0.0
+        # Everything else on the dropped connection fails too
+        with self.assertRaises(OperationalError):
+            self.query(connection)
+        self.assertFalse(connection.is_usable())
+
+        # What Django does at the end of every request
+        connection.close_if_unusable_or_obsolete()
+        self.assertIsNone(connection.connection)
+        self.assertEqual(self.query(connection), 1)
+        self.assertEqual(counter('db.faults.connects', self.alias), connects + 1)
+        self.assertTrue(connection.is_usable())
+
+    def test_seeded_disconnects_are_repeatable(self):
+        def failures(seed):
+            connection = self.connect(DISCONNECT_RATE=0.3, SEED=seed)
+            outcomes = []
+            with self.assertLogs('newsletter.faultdb', 'INFO'):
+                for _ in range(20):
+                    try:
+                        self.query(connection)
+                        outcomes.append(True)
+                    except OperationalError:
+                        outcomes.append(False)
+                        connection.close()
+            return outcomes
+
+        self.assertEqual(failures(7), failures(7))
+        self.assertIn(False, failures(7))
+
+
+class LatencyTests(FaultDatabaseTestCase):
+    def test_each_round_trip_sleeps(self):
+        connection = self.connect(LATENCY_MS=5, CONNECT_MS=40)
+        with mock.patch('newsletter.faultdb.base.time.sleep') as sleep:
+            self.query(connection)
+            self.query(connection)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.04, 0.005, 0.005])
+
+    def test_cold_start_after_idling(self):
+        mark_idle(self.alias)
+        connection = self.connect(COLD_START_MS=3000, IDLE_SECONDS=300)
+        with mock.patch('newsletter.faultdb.base.time.sleep') as sleep:
+            self.query(connection)
+            connection.close()
+            self.query(connection)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [3.0])
+
+
+class FaultSettingsTests(SimpleTestCase):
+    def test_profiles_and_overrides(self):
+        faults = fault_settings({'FAULTS': {'PROFILE': 'azure_sql', 'DISCONNECT_RATE': 0.5}})
+        self.assertEqual((faults['LATENCY_MS'], faults['DISCONNECT_RATE'], faults['PROFILE']), (20, 0.5, 'azure_sql'))
+        self.assertEqual(fault_settings({})['LATENCY_MS'], 0.0)
+
+    def test_unknown_profile_or_key(self):
+        with self.assertRaises(ImproperlyConfigured):
+            fault_settings({'FAULTS': {'PROFILE': 'moon'}})
+        with self.assertRaises(ImproperlyConfigured):
+            fault_settings({'FAULTS': {'LATENCY': 5}})
+
+    def test_wrap_settings_keeps_the_real_engine(self):
+        wrapped = wrap_settings({'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db'}, 'lan')
+        self.assertEqual((wrapped['ENGINE'], wrapped['INNER_ENGINE']), (ENGINE, 'django.db.backends.sqlite3'))
+        rewrapped = wrap_settings(wrapped, 'azure_sql', SEED=1)
+        self.assertEqual((rewrapped['INNER_ENGINE'], rewrapped['FAULTS']),
+                         ('django.db.backends.sqlite3', {'PROFILE': 'azure_sql', 'SEED': 1}))
+
+    def test_inner_engine_is_required(self):
+        handler = connections(broken={'ENGINE': ENGINE, 'NAME': ':memory:'})
+        with self.assertRaisesMessage(ImproperlyConfigured, 'INNER_ENGINE'):
+            handler['broken']
@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from unittest import mock
+from newsletter.idempotency import REPLAY_HEADER, derive_idempotency_key, idempotent
+import json
+
+
+def make_request(body=None, key='key-1'):
+    headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+    return RequestFactory().post('/api/subscribe/', json.dumps(body or {'email': 'person@example.com'}),
+                                 content_type='application/json', **headers)
+
+
+def lock_key(request) -> str:
+    return f'{derive_idempotency_key(request)}:lock'
+
+
+@override_settings(IDEMPOTENCY_CACHE_ALIAS='default', IDEMPOTENCY_TTL=600, IDEMPOTENCY_WINDOW=60,
+                   IDEMPOTENCY_WAIT_TIMEOUT=0.2)
+class IdempotentViewTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.calls = []
+        self.status = 200
+
+        @idempotent
+        def view(request):
+            self.calls.append(json.loads(request.body))
+            return JsonResponse({'call': len(self.calls)}, status=self.status)
+
+        self.view = view
+
+    def post(self, body=None, key='key-1'):
+        return self.view(make_request(body, key))
+
+    def test_retries_replay_the_stored_response(self):
+        first = self.post()
+        second = self.post()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second[REPLAY_HEADER], 'true')
+        self.assertFalse(first.has_header(REPLAY_HEADER))
+
+    def test_reused_key_with_another_body_is_rejected(self):
+        self.post({'email': 'person@example.com'})
+        response = self.post({'email': 'other@example.com'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_server_errors_are_not_stored(self):
+        self.status = 503
+        self.post()
+        self.status = 200
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_duplicate_of_an_in_flight_request_gets_409(self):
+        request = make_request()
+        # A concurrent request holds the lock and has not stored a result yet
+        cache.add(lock_key(request), 'first-request', 30)
+        response = self.view(request)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.calls, [])
+
+    def test_takes_over_when_the_first_request_gave_up(self):
+        request = make_request()
+        cache.add(lock_key(request), 'first-request', 30)
+        # The first request fails with a 5xx and releases its lock without a result
+        with mock.patch('newsletter.idempotency.time.sleep', side_effect=lambda _: cache.delete(lock_key(request))):
+            response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_lock_is_released_after_the_view(self):
+        request = make_request()
+        self.view(request)
+        self.assertIsNone(cache.get(lock_key(request)))
+
+    def test_lock_taken_over_after_expiry_is_not_released(self):
+        request = make_request()
+
+        def view(request):
+            # This request outlived its lock and a duplicate took it over
+            cache.set(lock_key(request), 'other-request')
+            return JsonResponse({})
+
+        idempotent(view)(request)
+        self.assertEqual(cache.get(lock_key(request)), 'other-request')
+
+    def test_email_keyed_requests_collapse_for_the_window_regardless_of_the_clock(self):
+        # 59s apart across a multiple of the window: a fixed time bucket would split these
+        start = 60 * 1000 - 30.0
+        with mock.patch('time.time', return_value=start):
+            self.post(key=None)
+        with mock.patch('time.time', return_value=start + 59):
+            self.assertEqual(self.post(key=None)[REPLAY_HEADER], 'true')
+        with mock.patch('time.time', return_value=start + 61):
+            self.assertFalse(self.post(key=None).has_header(REPLAY_HEADER))
+        self.assertEqual(len(self.calls), 2)
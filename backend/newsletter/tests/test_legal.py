@@ -0,0 +1,110 @@
+from django.test import SimpleTestCase, override_settings
+from newsletter.legal import IMMUTABLE_CACHE_CONTROL, MANIFEST_NAME, REVALIDATE_CACHE_CONTROL, load_legal_pages
+from pathlib import Path
+import gzip
+import hashlib
+import json
+import shutil
+import tempfile
+
+HTML = b'<!doctype html><title>Privacy Policy</title><p>We keep your address private.</p>'
+SHA = hashlib.sha256(HTML).hexdigest()
+FINGERPRINT = SHA[:12]
+URL = '/api/legal/privacy/'
+
+
+def write_pages(directory: Path, encodings=('gzip', 'br')):
+    filename = f'privacy.{FINGERPRINT}.html'
+    (directory / filename).write_bytes(HTML)
+    variants = {'gzip': gzip.compress(HTML, mtime=0), 'br': b'brotli-bytes'}
+    suffixes = {'gzip': '.gz', 'br': '.br'}
+    for encoding in encodings:
+        (directory / f'{filename}{suffixes[encoding]}').write_bytes(variants[encoding])
+    manifest = {'pages': {'privacy': {
+        'file': filename, 'fingerprint': FINGERPRINT, 'sha256': SHA,
+        'encodings': {encoding: f'{filename}{suffix}' for encoding, suffix in suffixes.items()},
+    }}}
+    (directory / MANIFEST_NAME).write_text(json.dumps(manifest), encoding='utf-8')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False)
+class LegalPageTests(SimpleTestCase):
+    encodings = ('gzip', 'br')
+
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        write_pages(directory, self.encodings)
+        settings_override = override_settings(LEGAL_PAGES_DIR=str(directory))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        load_legal_pages.cache_clear()
+        self.addCleanup(load_legal_pages.cache_clear)
+
+    def get(self, url=URL, accept_encoding='', **headers):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=accept_encoding, **headers)
+
+    def test_identity_response(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, HTML)
+        self.assertEqual(response['ETag'], f'"{SHA}"')
+        self.assertEqual(response['Content-Length'], str(len(HTML)))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Cache-Control'], REVALIDATE_CACHE_CONTROL)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_each_encoding_has_its_own_etag(self):
+        gzipped = self.get(accept_encoding='gzip, deflate')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(gzipped['ETag'], f'"{SHA}-gz"')
+        self.assertEqual(gzip.decompress(gzipped.content), HTML)
+
+        brotli = self.get(accept_encoding='gzip, deflate, br')
+        self.assertEqual(brotli['Content-Encoding'], 'br')
+        self.assertEqual(brotli['ETag'], f'"{SHA}-br"')
+        self.assertIn('Accept-Encoding', brotli['Vary'])
+
+    def test_refused_encodings_are_not_used(self):
+        response = self.get(accept_encoding='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(self.get(accept_encoding='br;q=0.0').has_header('Content-Encoding'))
+
+    def test_revalidation_returns_304_for_any_representation(self):
+        for if_none_match in (f'"{SHA}"', f'"{SHA}-gz"', f'W/"{SHA}-br"', f'"stale", "{SHA}-gz"', '*'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.get(accept_encoding='gzip', HTTP_IF_NONE_MATCH=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                # The ETag names the representation this client would get
+                self.assertEqual(response['ETag'], f'"{SHA}-gz"')
+
+    def test_outdated_etag_gets_the_page(self):
+        response = self.get(HTTP_IF_NONE_MATCH='"0123456789abcdef"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, HTML)
+
+    def test_fingerprinted_url_is_immutable(self):
+        response = self.get(f'/api/legal/privacy.{FINGERPRINT}.html')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        outdated = self.get('/api/legal/privacy.000000000000.html')
+        self.assertEqual(outdated.content, HTML)
+        self.assertEqual(outdated['Cache-Control'], REVALIDATE_CACHE_CONTROL)
+
+    def test_unknown_pages_and_methods(self):
+        self.assertEqual(self.get('/api/legal/cookies/').status_code, 404)
+        self.assertEqual(self.client.post(URL).status_code, 405)
+
+
+class MissingVariantTests(LegalPageTests):
+    """A build without Brotli installed lists .br files that were never written"""
+
+    encodings = ('gzip',)
+
+    def test_each_encoding_has_its_own_etag(self):
+        response = self.get(accept_encoding='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], f'"{SHA}-gz"')
+
+    def test_refused_encodings_are_not_used(self):
+        self.assertFalse(self.get(accept_encoding='br').has_header('Content-Encoding'))
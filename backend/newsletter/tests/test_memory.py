@@ -0,0 +1,96 @@
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from io import StringIO
+from newsletter import memory
+from newsletter.memory import diff_sites, format_site, list_snapshots, parse_snapshot_filename, take_snapshot
+from pathlib import Path
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+
+class SnapshotFilenameTests(SimpleTestCase):
+    def test_parses_timestamp_pid_and_label(self):
+        self.assertEqual(parse_snapshot_filename(Path('/tmp/1760000000123-4242-after_load.tmsnap')),
+                         (1760000000123, 4242, 'after_load'))
+
+    def test_rejects_foreign_names(self):
+        for name in ('snapshot.tmsnap', 'abc-4242-signal.tmsnap', '1760000000123-pid-signal.tmsnap'):
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                parse_snapshot_filename(Path(name))
+
+    def test_format_site(self):
+        self.assertEqual(format_site(str(memory.PROJECT_ROOT / 'newsletter' / 'emails.py'), 12),
+                         'newsletter/emails.py:12')
+        self.assertEqual(format_site('/usr/lib/python3/site-packages/django/db/models/query.py', 3),
+                         'django/db/models/query.py:3')
+        self.assertEqual(format_site('/usr/lib/python3.11/json/decoder.py', 7), 'json/decoder.py:7')
+
+
+class DiffSitesTests(SimpleTestCase):
+    def test_rows_are_deltas_largest_growth_first(self):
+        before = {'a.py:1': [100, 1], 'b.py:2': [500, 5], 'same.py:3': [10, 1], 'gone.py:4': [50, 2]}
+        after = {'a.py:1': [1100, 11], 'b.py:2': [400, 4], 'same.py:3': [10, 1], 'new.py:5': [300, 3]}
+        self.assertEqual(diff_sites(before, after), [
+            ('a.py:1', 1000, 10, 1100),
+            ('new.py:5', 300, 3, 300),
+            ('gone.py:4', -50, -2, 0),
+            ('b.py:2', -100, -1, 400),
+        ])
+
+    def test_no_change(self):
+        self.assertEqual(diff_sites({'a.py:1': [1, 1]}, {'a.py:1': [1, 1]}), [])
+
+
+class SnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(MEMORY_SNAPSHOT_DIR=str(self.directory), MEMORY_SNAPSHOT_MAX_FILES=3)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+            self.addCleanup(tracemalloc.stop)
+        # Growth is reported against this process's previous snapshot
+        memory._last_snapshot = None
+        self.retained = []
+
+    def allocate(self):
+        # Attributed to this line, the innermost project frame
+        self.retained.append([bytearray(1024) for _ in range(200)])
+
+    def snapshot(self, label):
+        with self.assertLogs('newsletter.memory', 'INFO'):
+            return take_snapshot(label)
+
+    def test_growth_is_attributed_to_the_allocating_line(self):
+        first = self.snapshot('before')
+        self.allocate()
+        second = self.snapshot('after load!')
+
+        timestamp, pid, label = parse_snapshot_filename(Path(second['snapshot']))
+        self.assertEqual((pid, label), (os.getpid(), 'after_load_'))
+        self.assertIsNone(first['growth'])
+        top = second['growth'][0]
+        self.assertTrue(top['site'].startswith('newsletter/tests/test_memory.py:'), top)
+        self.assertGreaterEqual(top['bytes'], 200 * 1024)
+        self.assertFalse(any(row['site'].startswith('newsletter/memory.py') for row in second['top']))
+
+    def test_compare_command_diffs_each_worker(self):
+        self.snapshot('before')
+        self.allocate()
+        self.snapshot('after')
+        out = StringIO()
+        call_command('compare_memory_snapshots', '--dir', str(self.directory), '--match', 'test_memory.py', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Growth since each worker\'s first snapshot (1 workers)', output)
+        self.assertIn('newsletter/tests/test_memory.py:', output)
+
+    def test_old_snapshots_are_rotated(self):
+        for n in range(5):
+            self.snapshot(f'n{n}')
+        snapshots = list_snapshots(self.directory)
+        self.assertEqual([parse_snapshot_filename(path)[2] for path in snapshots], ['n2', 'n3', 'n4'])
+        self.assertEqual(len(list(self.directory.glob('*.json'))), 3)
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from newsletter.confirmation import make_confirmation_token
+from newsletter.models import Subscription, Suppression, hash_email
+from newsletter.querystats import query_budget
+from newsletter.routers import get_read_alias, lag_monitor
+from newsletter.unsubscribe import get_suppression_list, get_unsubscribe_queue, make_unsubscribe_token
+import json
+import uuid
+
+
+# Never send real mail, hit the shared cache or write event log segments while testing
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    IDEMPOTENCY_CACHE_ALIAS='default',
+    ALLOWED_HOSTS=['testserver'],
+    SECURE_SSL_REDIRECT=False,
+    EVENT_LOG_ENABLED=False,
+    WEBHOOK_URLS=[],
+    # The admin's static files are not collected for tests
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Each view stays within its QUERY_BUDGETS entry, the same check as
+    `manage.py check_query_budgets`.
+
+    TransactionTestCase rather than TestCase: TestCase's outer transaction turns
+    every view transaction into savepoints, which would be counted as queries.
+    """
+
+    databases = '__all__'
+
+    def setUp(self):
+        self.email = f'budget-{uuid.uuid4().hex[:12]}@example.com'
+        # Warm per-process state, as gunicorn does before serving, so steady-state counts are measured
+        lag_monitor.reset()
+        get_read_alias()
+        get_suppression_list().load()
+        self.client.get('/api/health/')
+
+    def tearDown(self):
+        # Apply queued unsubscribes before the tables are flushed
+        get_unsubscribe_queue().flush()
+        lag_monitor.reset()
+
+    def within_budget(self, key: str, label: str):
+        return query_budget(settings.QUERY_BUDGETS[key], label=f'{key} / {label}')
+
+    def subscribe(self):
+        return self.client.post('/api/subscribe/', json.dumps({'email': self.email}),
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex)
+
+    def test_subscribe_new(self):
+        with self.within_budget('subscribe_email', 'new subscription'):
+            response = self.subscribe()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['created'])
+
+    def test_subscribe_existing(self):
+        self.subscribe()
+        with self.within_budget('subscribe_email', 'existing subscription'):
+            response = self.subscribe()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['created'])
+
+    def test_subscribe_preflight(self):
+        with self.within_budget('subscribe_email', 'preflight'):
+            response = self.client.options('/api/subscribe/')
+        self.assertLess(response.status_code, 300)
+
+    def test_health_check(self):
+        with self.within_budget('health_check', 'health check'):
+            response = self.client.get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_test_email(self):
+        with self.within_budget('test_email', 'invalid body'):
+            response = self.client.post('/api/test-email/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_confirmation_page(self):
+        self.subscribe()
+        token = make_confirmation_token(self.email)
+        with self.within_budget('confirm_subscription', 'confirmation page'):
+            response = self.client.get(f'/api/confirm/{token}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Subscription.objects.get(email_hash=hash_email(self.email)).confirmed_at)
+
+    def test_confirmation(self):
+        self.subscribe()
+        token = make_confirmation_token(self.email)
+        with self.within_budget('confirm_subscription', 'confirmation'):
+            response = self.client.post(f'/api/confirm/{token}/')
+        self.assertLess(response.status_code, 400)
+        self.assertIsNotNone(Subscription.objects.get(email_hash=hash_email(self.email)).confirmed_at)
+
+    def test_unsubscribe_page(self):
+        token = make_unsubscribe_token(self.email)
+        with self.within_budget('unsubscribe', 'unsubscribe page'):
+            response = self.client.get(f'/api/unsubscribe/{token}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_one_click_unsubscribe(self):
+        self.subscribe()
+        token = make_unsubscribe_token(self.email)
+        with self.within_budget('unsubscribe', 'one-click unsubscribe'):
+            response = self.client.post(f'/api/unsubscribe/{token}/', 'List-Unsubscribe=One-Click',
+                                        content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 200)
+        get_unsubscribe_queue().flush()
+        self.assertTrue(Suppression.objects.filter(email=self.email).exists())
+        self.assertFalse(Subscription.objects.filter(email_hash=hash_email(self.email)).exists())
+
+    def test_legal_page(self):
+        with self.within_budget('legal_page', 'legal page'):
+            response = self.client.get('/api/legal/privacy/', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_changelist_and_search(self):
+        user = get_user_model().objects.create_superuser(username='budget-admin', email='', password=None)
+        self.client.force_login(user)
+        self.subscribe()
+        with self.within_budget('admin', 'subscription changelist'):
+            response = self.client.get('/admin/newsletter/subscription/')
+        self.assertEqual(response.status_code, 200)
+        with self.within_budget('admin', 'subscription search'):
+            response = self.client.get('/admin/newsletter/subscription/', {'q': 'example.com'})
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.test import TestCase, override_settings
+from unittest import skipUnless
+from newsletter.models import Subscription
+from newsletter.querystats import record_queries
+from newsletter.routers import get_read_alias, lag_monitor, read_replica
+
+HAS_REPLICA = 'replica' in settings.DATABASES
+PROBE_LAG = {'seconds': 0.0}
+
+
+def fixed_lag_probe(alias: str) -> float:
+    return PROBE_LAG['seconds']
+
+
+def failing_lag_probe(alias: str) -> float:
+    raise ConnectionError('replica unreachable')
+
+
+@skipUnless(HAS_REPLICA, 'needs DB_ENGINE=sqlite DB_READ_REPLICA=true (or a configured replica)')
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'} if HAS_REPLICA else {'default'}
+
+    def setUp(self):
+        lag_monitor.reset()
+        self.addCleanup(lag_monitor.reset)
+
+    def test_reads_go_to_primary_outside_read_replica(self):
+        self.assertEqual(Subscription.objects.all().db, DEFAULT_DB_ALIAS)
+
+    def test_reads_go_to_fresh_replica(self):
+        # Both aliases hold the same (empty) data, so the default probe measures no lag
+        with read_replica() as alias:
+            self.assertEqual(alias, 'replica')
+            self.assertEqual(Subscription.objects.all().db, 'replica')
+            with record_queries(using='replica') as stats:
+                list(Subscription.objects.all())
+            self.assertEqual(stats.count, 1)
+        self.assertEqual(Subscription.objects.all().db, DEFAULT_DB_ALIAS)
+
+    @override_settings(REPLICA_LAG_PROBE='newsletter.tests.test_routers.fixed_lag_probe')
+    def test_stale_replica_falls_back_to_primary(self):
+        PROBE_LAG['seconds'] = 120.0
+        self.addCleanup(PROBE_LAG.update, seconds=0.0)
+        with read_replica(max_staleness=30) as alias:
+            self.assertEqual(alias, DEFAULT_DB_ALIAS)
+            self.assertEqual(Subscription.objects.all().db, DEFAULT_DB_ALIAS)
+        # A caller that tolerates the lag still gets the replica
+        self.assertEqual(get_read_alias(max_staleness=300), 'replica')
+
+    @override_settings(REPLICA_LAG_PROBE='newsletter.tests.test_routers.failing_lag_probe')
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with self.assertLogs('newsletter.routers', 'WARNING'):
+            self.assertEqual(get_read_alias(max_staleness=30), DEFAULT_DB_ALIAS)
+
+    @override_settings(REPLICA_LAG_PROBE='newsletter.tests.test_routers.fixed_lag_probe',
+                       REPLICA_LAG_CHECK_INTERVAL=60)
+    def test_lag_is_cached_between_checks(self):
+        self.assertEqual(get_read_alias(max_staleness=30), 'replica')
+        PROBE_LAG['seconds'] = 120.0
+        self.addCleanup(PROBE_LAG.update, seconds=0.0)
+        self.assertEqual(get_read_alias(max_staleness=30), 'replica')
+        lag_monitor.reset()
+        self.assertEqual(get_read_alias(max_staleness=30), DEFAULT_DB_ALIAS)
+
+    @override_settings(REPLICA_DB_ALIAS='')
+    def test_no_replica_configured(self):
+        with read_replica() as alias:
+            self.assertEqual(alias, DEFAULT_DB_ALIAS)
+
+
+@skipUnless(HAS_REPLICA, 'needs DB_ENGINE=sqlite DB_READ_REPLICA=true (or a configured replica)')
+class ReplicaWriteTests(TestCase):
+    # Writes only: the SQLite mirror shares the primary's test database, and a read
+    # through it inside the test transaction would lock the table against this write
+    databases = {'default'}
+
+    def test_writes_stay_on_primary_inside_read_replica(self):
+        with read_replica(max_staleness=-1) as alias:
+            self.assertEqual(alias, 'replica')
+            subscription = Subscription.objects.create(email='router@example.com')
+        self.assertEqual(subscription._state.db, DEFAULT_DB_ALIAS)
+        self.assertTrue(Subscription.objects.filter(pk=subscription.pk).exists())
@@ -0,0 +1,97 @@
+from django.apps import apps
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from importlib import import_module
+from unittest import mock
+from newsletter.models import Subscription, Suppression, hash_email
+from newsletter.unsubscribe import (
+    SuppressionList, UnsubscribeQueue, apply_unsubscribes, get_unsubscribe_queue, lift_suppression,
+    make_unsubscribe_token, recover_unsubscribes,
+)
+
+
+def subscription_exists(email: str) -> bool:
+    return Subscription.objects.filter(email_hash=hash_email(email)).exists()
+
+
+@override_settings(EVENT_LOG_ENABLED=False, WEBHOOK_URLS=[])
+class OneClickUnsubscribeTests(TestCase):
+    def setUp(self):
+        # Flush from the test instead of the background thread
+        patcher = mock.patch.object(UnsubscribeQueue, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = get_unsubscribe_queue()
+        self.addCleanup(self.queue.flush)
+        Subscription.objects.create(email='person@example.com')
+
+    def one_click(self, email='person@example.com'):
+        return self.client.post(f'/api/unsubscribe/{make_unsubscribe_token(email)}/',
+                                'List-Unsubscribe=One-Click', content_type='application/x-www-form-urlencoded')
+
+    def test_suppression_is_recorded_before_acknowledging(self):
+        response = self.one_click('Person@Example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Suppression.objects.values_list('email', flat=True)), ['person@example.com'])
+        # The delete itself is batched
+        self.assertTrue(subscription_exists('person@example.com'))
+        self.queue.flush()
+        self.assertFalse(subscription_exists('person@example.com'))
+
+    def test_repeated_clicks_record_one_row(self):
+        self.one_click()
+        self.one_click('PERSON@example.com')
+        self.assertEqual(Suppression.objects.count(), 1)
+
+    def test_not_acknowledged_when_the_write_fails(self):
+        with mock.patch('newsletter.unsubscribe.Suppression.objects.create', side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                self.one_click()
+        self.assertEqual(self.queue.depth(), 0)
+
+    def test_recovery_applies_unsubscribes_a_crashed_process_left_behind(self):
+        Subscription.objects.create(email='other@example.com')
+        Suppression.objects.create(email='person@example.com')
+        self.assertEqual(recover_unsubscribes(), 1)
+        self.assertFalse(subscription_exists('person@example.com'))
+        self.assertTrue(subscription_exists('other@example.com'))
+        self.assertEqual(recover_unsubscribes(), 0)
+
+
+class SuppressionNormalizationTests(TestCase):
+    def setUp(self):
+        Suppression.objects.create(email='person@example.com')
+
+    def test_lookups_ignore_case_and_whitespace(self):
+        suppressions = SuppressionList(ttl=60)
+        # Before the first load a lookup queries the one address
+        self.assertIn(' Person@Example.COM', suppressions)
+        suppressions.load()
+        self.assertIn('PERSON@example.com', suppressions)
+        self.assertNotIn('someone@example.com', suppressions)
+
+    def test_local_additions_and_removals_are_normalized(self):
+        suppressions = SuppressionList(ttl=60)
+        suppressions.load()
+        suppressions.add('New@Example.com')
+        self.assertIn('new@example.com', suppressions)
+        suppressions.discard('PERSON@EXAMPLE.COM')
+        self.assertNotIn('person@example.com', suppressions)
+
+    @override_settings(EVENT_LOG_ENABLED=False, WEBHOOK_URLS=[])
+    def test_apply_does_not_duplicate_case_variants(self):
+        Subscription.objects.create(email='person@example.com')
+        self.assertEqual(apply_unsubscribes(['Person@Example.com', 'person@example.com ']), 1)
+        self.assertEqual(list(Suppression.objects.values_list('email', flat=True)), ['person@example.com'])
+
+    def test_lift_matches_any_case(self):
+        lift_suppression('Person@Example.com')
+        self.assertFalse(Suppression.objects.exists())
+
+    def test_migration_normalizes_existing_rows(self):
+        Suppression.objects.create(email='Person@Example.com')
+        Suppression.objects.create(email='Mixed@Example.com')
+        migration = import_module('newsletter.migrations.0009_normalize_suppression_emails')
+        migration.normalize_suppression_emails(apps, mock.Mock(connection=connection))
+        self.assertEqual(sorted(Suppression.objects.values_list('email', flat=True)),
+                         ['mixed@example.com', 'person@example.com'])
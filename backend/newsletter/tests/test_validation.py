@@ -0,0 +1,113 @@
+from django.test import SimpleTestCase, override_settings
+from unittest import mock
+from newsletter import validation
+from newsletter.validation import (
+    DISPOSABLE_DOMAIN, INVALID_DOMAIN, INVALID_SYNTAX, NO_MX_RECORD, VALID,
+    MXCache, StaticMXResolver, check_domain, clear_domain_cache, set_mx_resolver, validate_email,
+)
+
+
+class ValidationTestCase(SimpleTestCase):
+    def setUp(self):
+        clear_domain_cache()
+        self.addCleanup(clear_domain_cache)
+        self.addCleanup(set_mx_resolver, None)
+
+
+class EmailSyntaxTests(ValidationTestCase):
+    def test_normalizes_valid_addresses(self):
+        self.assertEqual(validate_email('  Person.Name+tag@Example.COM '),
+                         ('person.name+tag@example.com', True, VALID))
+        self.assertEqual(validate_email('"quoted name"@example.com').reason, VALID)
+
+    def test_rejects_malformed_addresses(self):
+        for email in ('', None, 'no-at-sign', '@example.com', 'person@', 'a..b@example.com',
+                      '.a@example.com', 'a b@example.com', f'{"a" * 65}@example.com'):
+            with self.subTest(email=email):
+                self.assertEqual(validate_email(email).reason, INVALID_SYNTAX)
+
+    def test_rejects_overlong_addresses(self):
+        domain = '.'.join(['a' * 60] * 4) + '.com'
+        self.assertEqual(validate_email(f'{"b" * 10}@{domain}').reason, INVALID_SYNTAX)
+
+    def test_rejects_invalid_domains(self):
+        for domain in ('localhost', 'example.c', 'example.123', '-bad.example.com', 'exa_mple.com',
+                       f'{"a" * 64}.com'):
+            with self.subTest(domain=domain):
+                self.assertEqual(validate_email(f'person@{domain}').reason, INVALID_DOMAIN)
+
+    def test_idna_domains_are_encoded(self):
+        self.assertEqual(validate_email('person@Bücher.de'), ('person@xn--bcher-kva.de', True, VALID))
+        self.assertEqual(validate_email('person@example.xn--p1ai').reason, VALID)
+        self.assertEqual(validate_email('person@\udcff.com').reason, INVALID_DOMAIN)
+
+    def test_disposable_domains_and_their_subdomains(self):
+        self.assertEqual(validate_email('person@mailinator.com').reason, DISPOSABLE_DOMAIN)
+        self.assertEqual(validate_email('person@eu.mailinator.com').reason, DISPOSABLE_DOMAIN)
+
+
+class DomainCacheTests(ValidationTestCase):
+    def test_cache_is_sized_from_settings_on_first_use(self):
+        with override_settings(EMAIL_DOMAIN_CACHE_SIZE=2):
+            clear_domain_cache()
+            for domain in ('a.com', 'b.com', 'c.com', 'a.com'):
+                check_domain(domain)
+        info = validation._domain_cache.cache_info()
+        self.assertEqual((info.maxsize, info.currsize, info.hits), (2, 2, 0))
+
+    def test_repeated_domains_are_cached(self):
+        with mock.patch.object(validation, 'normalize_domain', wraps=validation.normalize_domain) as normalize:
+            for _ in range(3):
+                validate_email('person@example.com')
+        normalize.assert_called_once_with('example.com')
+
+    def test_disposable_list_follows_its_setting_after_clearing(self):
+        with override_settings(DISPOSABLE_EMAIL_DOMAINS_FILE='/nonexistent/domains.txt'):
+            clear_domain_cache()
+            self.assertEqual(validate_email('person@mailinator.com').reason, VALID)
+
+
+class MXLookupTests(ValidationTestCase):
+    def test_domains_without_mx_are_rejected(self):
+        set_mx_resolver(StaticMXResolver(['example.com', 'xn--bcher-kva.de']))
+        self.assertEqual(validate_email('person@example.com').reason, VALID)
+        self.assertEqual(validate_email('person@bücher.de').reason, VALID)
+        self.assertEqual(validate_email('person@example.org'), ('person@example.org', False, NO_MX_RECORD))
+
+    def test_lookup_errors_fail_open(self):
+        set_mx_resolver(mock.Mock(side_effect=TimeoutError('timed out')))
+        with self.assertLogs('newsletter.validation', 'WARNING'):
+            self.assertEqual(validate_email('person@example.com').reason, VALID)
+
+    def test_no_lookups_without_a_resolver(self):
+        with override_settings(EMAIL_MX_RESOLVER=''):
+            set_mx_resolver(None)
+            self.assertIsNone(validation.get_mx_cache())
+            self.assertEqual(validate_email('person@example.org').reason, VALID)
+
+    def test_results_are_cached_until_the_ttl_expires(self):
+        resolver = mock.Mock(return_value=['mx.example.com'])
+        cache = MXCache(resolver, ttl=60)
+        with mock.patch('newsletter.validation.time.monotonic', return_value=1000.0):
+            self.assertTrue(cache.has_mx('example.com'))
+            self.assertTrue(cache.has_mx('example.com'))
+        self.assertEqual(resolver.call_count, 1)
+        with mock.patch('newsletter.validation.time.monotonic', return_value=1061.0):
+            cache.has_mx('example.com')
+        self.assertEqual(resolver.call_count, 2)
+
+    def test_failed_lookups_are_not_cached(self):
+        resolver = mock.Mock(side_effect=[OSError('no route'), []])
+        cache = MXCache(resolver)
+        with self.assertLogs('newsletter.validation', 'WARNING'):
+            self.assertTrue(cache.has_mx('example.com'))
+        self.assertFalse(cache.has_mx('example.com'))
+        self.assertFalse(cache.has_mx('example.com'))
+        self.assertEqual(resolver.call_count, 2)
+
+    def test_least_recently_used_domains_are_evicted(self):
+        resolver = mock.Mock(return_value=['mx'])
+        cache = MXCache(resolver, maxsize=2)
+        for domain in ('a.com', 'b.com', 'a.com', 'c.com', 'a.com', 'b.com'):
+            cache.has_mx(domain)
+        self.assertEqual([call.args[0] for call in resolver.call_args_list], ['a.com', 'b.com', 'c.com', 'b.com'])
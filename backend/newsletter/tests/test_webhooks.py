@@ -0,0 +1,137 @@
+from django.test import SimpleTestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from newsletter import metrics
+from newsletter.webhooks import ID_HEADER, SIGNATURE_HEADER, TIMESTAMP_HEADER, build_dispatcher, verify_signature
+import hashlib
+import hmac
+import json
+import threading
+
+SECRET = 'test-secret'
+
+
+class Receiver(ThreadingHTTPServer):
+    """In-process webhook receiver answering with queued statuses (then 200)"""
+
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, statuses=()):
+        super().__init__(('127.0.0.1', 0), ReceiverHandler)
+        self.statuses = list(statuses)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/hooks?source=test'
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with self.server.lock:
+            self.server.requests.append((self.path, dict(self.headers), body))
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookDeliveryTests(SimpleTestCase):
+    def start_receiver(self, statuses=()) -> Receiver:
+        receiver = Receiver(statuses)
+        thread = threading.Thread(target=receiver.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        self.addCleanup(receiver.server_close)
+        self.addCleanup(receiver.shutdown)
+        return receiver
+
+    def dispatcher(self, receiver, secret=SECRET, **overrides):
+        options = {'batch_size': 10, 'flush_interval': 0.05, 'concurrency': 1, 'max_buffer': 100,
+                   'max_attempts': 3, 'backoff': 0.01, 'timeout': 5.0}
+        options.update(overrides)
+        return build_dispatcher([receiver.url], secret, **options)
+
+    def counter(self, name, receiver):
+        label = f'127.0.0.1:{receiver.server_address[1]}'
+        return metrics.snapshot()['counters'].get(metrics.metric_name(name, target=label), 0)
+
+    def test_batches_are_signed_over_timestamp_and_body(self):
+        receiver = self.start_receiver()
+        dispatcher = self.dispatcher(receiver)
+        dispatcher.publish([{'id': '1', 'type': 'subscription.created'}, {'id': '2', 'type': 'subscription.confirmed'}])
+        self.assertTrue(dispatcher.flush(5))
+
+        [(path, headers, body)] = receiver.requests
+        self.assertEqual(path, '/hooks?source=test')
+        self.assertEqual([event['id'] for event in json.loads(body)['events']], ['1', '2'])
+        timestamp, signature = headers[TIMESTAMP_HEADER], headers[SIGNATURE_HEADER]
+        expected = hmac.new(SECRET.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+        self.assertEqual(signature, f'sha256={expected}')
+        self.assertTrue(verify_signature(SECRET, timestamp, body, signature))
+        self.assertFalse(verify_signature('other-secret', timestamp, body, signature))
+        self.assertFalse(verify_signature(SECRET, timestamp, body + b' ', signature))
+        self.assertFalse(verify_signature(SECRET, str(int(timestamp) - 301), body, signature))
+
+    def test_unsigned_without_a_secret(self):
+        receiver = self.start_receiver()
+        with self.assertLogs('newsletter.webhooks', 'WARNING'):
+            dispatcher = self.dispatcher(receiver, secret='')
+        dispatcher.publish([{'id': '1'}])
+        self.assertTrue(dispatcher.flush(5))
+        self.assertNotIn(SIGNATURE_HEADER, receiver.requests[0][1])
+
+    def test_429_and_5xx_are_retried_with_the_same_id(self):
+        receiver = self.start_receiver([429, 503])
+        retries = self.counter('webhooks.retries', receiver)
+        dispatcher = self.dispatcher(receiver)
+        dispatcher.publish([{'id': '1'}])
+        with self.assertLogs('newsletter.webhooks', 'WARNING'):
+            self.assertTrue(dispatcher.flush(5))
+
+        self.assertEqual(len(receiver.requests), 3)
+        self.assertEqual(len({headers[ID_HEADER] for _, headers, _ in receiver.requests}), 1)
+        self.assertEqual(len({body for _, _, body in receiver.requests}), 1)
+        self.assertEqual(self.counter('webhooks.retries', receiver), retries + 2)
+        self.assertEqual(self.counter('webhooks.delivered_events', receiver), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        receiver = self.start_receiver([500, 502, 504])
+        dispatcher = self.dispatcher(receiver)
+        dispatcher.publish([{'id': '1'}, {'id': '2'}])
+        with self.assertLogs('newsletter.webhooks', 'WARNING'):
+            self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(len(receiver.requests), 3)
+        self.assertEqual(self.counter('webhooks.failed_events', receiver), 2)
+
+    def test_other_4xx_responses_are_not_retried(self):
+        receiver = self.start_receiver([400])
+        dispatcher = self.dispatcher(receiver)
+        dispatcher.publish([{'id': '1'}])
+        with self.assertLogs('newsletter.webhooks', 'ERROR'):
+            self.assertTrue(dispatcher.flush(5))
+        self.assertEqual(len(receiver.requests), 1)
+        self.assertEqual(self.counter('webhooks.failed_events', receiver), 1)
+
+    def test_full_buffer_drops_the_oldest_events(self):
+        receiver = self.start_receiver()
+        dispatcher = self.dispatcher(receiver, max_buffer=3)
+        [target] = dispatcher.targets
+        # Buffer without sending, as if the receiver had fallen behind
+        with mock.patch.object(target, '_ensure_senders'):
+            with self.assertLogs('newsletter.webhooks', 'WARNING'):
+                dispatcher.publish([{'id': str(n)} for n in range(5)])
+        self.assertEqual(self.counter('webhooks.dropped', receiver), 2)
+
+        self.assertTrue(dispatcher.flush(5))
+        delivered = [event['id'] for _, _, body in receiver.requests for event in json.loads(body)['events']]
+        self.assertEqual(delivered, ['2', '3', '4'])
@@ -0,0 +1,359 @@
+"""
+One-click unsubscribe (RFC 8058) and the suppression list
+
+Unsubscribe links carry the subscriber's email signed with SECRET_KEY, so the
+endpoint verifies them without a query. Before acknowledging, the address is
+written to the suppression table (one small insert), so an accepted request
+survives a crash or redeploy. Deleting the subscription is the expensive part:
+addresses are queued in-process and a background thread deletes them in
+batches, so a post-campaign burst turns into a handful of deletes instead of
+one per click. Deletes lost with a process are picked up from the suppression
+table when the next worker starts.
+
+Every send path checks ``is_suppressed()``, which reads an in-memory copy of
+the suppression list refreshed every SUPPRESSION_CACHE_TTL seconds. The copy is
+loaded before gunicorn forks (or by the worker's background thread), never on
+a request path; until it is loaded, a check is a single indexed lookup.
+Addresses are compared normalized (trimmed, lowercased), as email_hash is.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from . import metrics
+from .models import Subscription, Suppression, hash_email, normalize_email
+from .events import SUBSCRIPTION_UNSUBSCRIBED, publish_on_commit
+
+logger = logging.getLogger(__name__)
+
+UNSUBSCRIBE_SALT = 'newsletter.unsubscribe'
+ONE_CLICK_POST_VALUE = 'List-Unsubscribe=One-Click'
+
+
+def make_unsubscribe_token(email: str) -> str:
+    """Create a signed unsubscribe token; unlike confirmation tokens it never expires"""
+    return signing.dumps(email, salt=UNSUBSCRIBE_SALT, compress=True)
+
+
+def verify_unsubscribe_token(token: str):
+    """
+    Verify an unsubscribe token without touching the database.
+
+    Returns:
+        str: The email address, or None if the signature is invalid
+    """
+    try:
+        return signing.loads(token, salt=UNSUBSCRIBE_SALT)
+    except signing.BadSignature:
+        # Anyone can send garbage tokens to a public endpoint: count them, don't flood the log
+        metrics.incr('unsubscribe.invalid_tokens')
+        logger.debug("Invalid unsubscribe token")
+        return None
+
+
+def get_unsubscribe_url(email: str) -> str:
+    """Absolute unsubscribe link for use in emails"""
+    base_url = getattr(settings, 'API_BASE_URL', '') or getattr(settings, 'COMPANY_WEBSITE_URL', '')
+    path = reverse('unsubscribe', args=[make_unsubscribe_token(email)])
+    return f"{base_url.rstrip('/')}{path}"
+
+
+def get_list_unsubscribe_headers(email: str, unsubscribe_url: str = None) -> dict:
+    """
+    List-Unsubscribe and List-Unsubscribe-Post headers for an outgoing message.
+
+    Args:
+        email: Recipient address
+        unsubscribe_url: Precomputed link, to avoid signing twice per message
+
+    Returns:
+        dict: Headers to pass to EmailMessage(headers=...)
+    """
+    targets = [f"<{unsubscribe_url or get_unsubscribe_url(email)}>"]
+    mailto = getattr(settings, 'UNSUBSCRIBE_MAILTO', '')
+    if mailto:
+        targets.append(f"<mailto:{mailto}?subject=unsubscribe>")
+    return {
+        'List-Unsubscribe': ', '.join(targets),
+        'List-Unsubscribe-Post': ONE_CLICK_POST_VALUE,
+    }
+
+
+def apply_unsubscribes(emails, batch_size: int = None) -> int:
+    """
+    Suppress and delete subscriptions for a set of addresses in chunked transactions.
+
+    Returns:
+        int: Number of subscriptions deleted
+    """
+    batch_size = batch_size or getattr(settings, 'UNSUBSCRIBE_BATCH_SIZE', 500)
+    emails = sorted({normalize_email(email) for email in emails})
+    deleted_total = 0
+    for start in range(0, len(emails), batch_size):
+        chunk = emails[start:start + batch_size]
+        with transaction.atomic():
+            # Usually already recorded by suppress(); insert only new addresses, since
+            # SQL Server (mssql-django) has no ignore_conflicts. A concurrent insert of
+            # the same address fails the chunk, which is retried.
+            existing = set(Suppression.objects.filter(email__in=chunk).order_by().values_list('email', flat=True))
+            Suppression.objects.bulk_create([Suppression(email=email) for email in chunk if email not in existing])
+            deleted, _ = Subscription.objects.filter(email_hash__in=[hash_email(email) for email in chunk]).delete()
+            publish_on_commit(SUBSCRIPTION_UNSUBSCRIBED, chunk)
+        deleted_total += deleted
+    return deleted_total
+
+
+def suppress(email: str, reason: str = 'unsubscribe'):
+    """
+    Durably record an unsubscribe: one indexed lookup, plus one insert the first time.
+
+    Raises on database errors, so the request is not acknowledged and the
+    mailbox provider retries it.
+    """
+    email = normalize_email(email)
+    if Suppression.objects.filter(email=email).exists():
+        return
+    try:
+        with transaction.atomic():
+            Suppression.objects.create(email=email, reason=reason)
+    except IntegrityError:
+        # A concurrent click on the same link recorded it first
+        pass
+
+
+def recover_unsubscribes() -> int:
+    """
+    Delete subscriptions whose address is suppressed but still subscribed, i.e.
+    unsubscribes a previous process recorded but did not get to apply.
+
+    Returns:
+        int: Number of subscriptions deleted
+    """
+    with transaction.atomic():
+        rows = list(
+            Subscription.objects.select_for_update()
+            .filter(email__in=Suppression.objects.values('email'))
+            .order_by().values_list('pk', 'email')
+        )
+        if not rows:
+            return 0
+        deleted, _ = Subscription.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        publish_on_commit(SUBSCRIPTION_UNSUBSCRIBED, [email for _, email in rows])
+    logger.info(f"Recovered {deleted} unsubscribes recorded but not applied")
+    return deleted
+
+
+class SuppressionList:
+    """
+    Per-process copy of the suppressed addresses.
+
+    The gunicorn master loads it before forking and the unsubscribe worker
+    reloads it in the background, so lookups on send paths are a set
+    membership test. Until the first load, lookups query the one address.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._emails = frozenset()
+        self._local = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def load(self):
+        """Reload the list from the database; on failure keep the previous copy"""
+        with self._lock:
+            try:
+                emails = frozenset(
+                    normalize_email(email) for email in Suppression.objects.order_by().values_list('email', flat=True)
+                )
+            except Exception as e:
+                logger.error(f"Failed to load suppression list: {e}")
+                emails = self._emails
+            self._emails = emails
+            # Local additions are now either in the table or still queued
+            self._local -= emails
+            self._loaded_at = time.monotonic()
+        metrics.set_gauge('suppression.size', len(self._emails))
+
+    def __contains__(self, email: str) -> bool:
+        email = normalize_email(email)
+        if email in self._local:
+            return True
+        if self._loaded_at is None:
+            # Not loaded yet: one indexed lookup instead of loading the table on a request path
+            return Suppression.objects.filter(email=email).exists()
+        return email in self._emails
+
+    def add(self, email: str):
+        with self._lock:
+            self._local.add(normalize_email(email))
+
+    def discard(self, email: str):
+        email = normalize_email(email)
+        with self._lock:
+            self._local.discard(email)
+            if email in self._emails:
+                self._emails = self._emails - {email}
+
+
+class UnsubscribeQueue:
+    """
+    Record verified unsubscribes durably, and delete the subscriptions from a
+    background thread.
+
+    The thread flushes when UNSUBSCRIBE_BATCH_SIZE addresses are pending or
+    every UNSUBSCRIBE_FLUSH_INTERVAL seconds, and refreshes the suppression
+    list when it goes stale. Anything still pending is flushed at exit; what a
+    crashed process never flushed is recovered by the next worker thread.
+    """
+
+    def __init__(self, suppressions: SuppressionList, batch_size: int, flush_interval: float):
+        self.suppressions = suppressions
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def put(self, email: str):
+        email = normalize_email(email)
+        suppress(email)
+        self.suppressions.add(email)
+        with self._lock:
+            self._pending.add(email)
+            depth = len(self._pending)
+        metrics.incr('unsubscribe.requests')
+        metrics.set_gauge('unsubscribe.queue_depth', depth)
+        self._ensure_worker()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    def discard(self, email: str):
+        with self._lock:
+            self._pending.discard(normalize_email(email))
+
+    def wake(self):
+        """Start the worker if needed and have it flush and refresh now"""
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Apply everything pending; failed batches are re-queued for the next flush"""
+        with self._lock:
+            batch, self._pending = self._pending, set()
+        if not batch:
+            return 0
+        start = time.perf_counter()
+        try:
+            deleted = apply_unsubscribes(batch, self.batch_size)
+        except Exception as e:
+            logger.error(f"Failed to apply {len(batch)} unsubscribes, will retry: {e}")
+            metrics.incr('unsubscribe.flush_errors')
+            with self._lock:
+                self._pending |= batch
+            return 0
+        metrics.incr('unsubscribe.applied', len(batch))
+        metrics.observe('unsubscribe.flush_ms', (time.perf_counter() - start) * 1000)
+        metrics.set_gauge('unsubscribe.queue_depth', self.depth())
+        logger.info(f"Applied {len(batch)} unsubscribes ({deleted} subscriptions deleted)")
+        return len(batch)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='unsubscribe-worker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        from django.db import connection
+        recovered = False
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                if not recovered:
+                    try:
+                        recover_unsubscribes()
+                        recovered = True
+                    except Exception as e:
+                        logger.error(f"Failed to recover unapplied unsubscribes, will retry: {e}")
+                self.flush()
+                if self.suppressions.stale:
+                    self.suppressions.load()
+            finally:
+                connection.close_if_unusable_or_obsolete()
+
+
+_suppressions = None
+_queue = None
+_init_lock = threading.Lock()
+
+
+def get_suppression_list() -> SuppressionList:
+    global _suppressions
+    if _suppressions is None:
+        with _init_lock:
+            if _suppressions is None:
+                _suppressions = SuppressionList(getattr(settings, 'SUPPRESSION_CACHE_TTL', 60))
+    return _suppressions
+
+
+def get_unsubscribe_queue() -> UnsubscribeQueue:
+    global _queue
+    if _queue is None:
+        suppressions = get_suppression_list()
+        with _init_lock:
+            if _queue is None:
+                _queue = UnsubscribeQueue(
+                    suppressions,
+                    batch_size=getattr(settings, 'UNSUBSCRIBE_BATCH_SIZE', 500),
+                    flush_interval=getattr(settings, 'UNSUBSCRIBE_FLUSH_INTERVAL', 2.0),
+                )
+                atexit.register(_queue.flush)
+    return _queue
+
+
+def is_suppressed(email: str) -> bool:
+    """Cheap check used by every send path"""
+    suppressions = get_suppression_list()
+    if suppressions.stale:
+        # (Re)load off the request path; this lookup uses the current copy
+        get_unsubscribe_queue().wake()
+    return email in suppressions
+
+
+def enqueue_unsubscribe(email: str):
+    """Record the unsubscribe durably, suppress it in this process and queue the delete"""
+    get_unsubscribe_queue().put(email)
+
+
+def lift_suppression(email: str):
+    """Remove an address from the suppression list after it explicitly subscribes again"""
+    email = normalize_email(email)
+    Suppression.objects.filter(email=email).delete()
+    if _queue is not None:
+        _queue.discard(email)
+    get_suppression_list().discard(email)
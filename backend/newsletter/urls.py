@@ -1,8 +1,14 @@
 from django.urls import path
-from .views import subscribe_email, health_check, test_email
+from .views import subscribe_email, health_check, test_email, confirm_subscription, unsubscribe, legal_page, metrics_view, memory_view
 
 urlpatterns = [
     path('subscribe/', subscribe_email, name='subscribe_email'),
     path('health/', health_check, name='health_check'),
     path('test-email/', test_email, name='test_email'),
+    path('confirm/<str:token>/', confirm_subscription, name='confirm_subscription'),
+    path('unsubscribe/<str:token>/', unsubscribe, name='unsubscribe'),
+    path('legal/<slug:name>/', legal_page, name='legal_page'),
+    path('legal/<slug:name>.<slug:fingerprint>.html', legal_page, name='legal_page_fingerprinted'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('memory/', memory_view, name='memory'),
 ]
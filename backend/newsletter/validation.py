@@ -0,0 +1,249 @@
+"""
+Email address validation for the subscription endpoints
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple, Optional
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISPOSABLE_DOMAINS_FILE = Path(__file__).resolve().parent / 'data' / 'disposable_domains.txt'
+
+# RFC 5321 size limits
+MAX_LOCAL_LENGTH = 64
+MAX_DOMAIN_LENGTH = 253
+MAX_EMAIL_LENGTH = 254
+
+# RFC 5322 dot-atom local part: atext runs separated by single dots
+_ATEXT = r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]"
+LOCAL_PART_RE = re.compile(rf"^{_ATEXT}+(?:\.{_ATEXT}+)*\Z")
+
+# RFC 5322 quoted-string local part (printable ASCII, escaped quotes/backslashes)
+QUOTED_LOCAL_PART_RE = re.compile(r'^"(?:[\x20\x21\x23-\x5b\x5d-\x7e]|\\[\x20-\x7e])*"\Z')
+
+# RFC 1035 hostname label after IDNA encoding; TLD must not be all-numeric
+DOMAIN_LABEL_RE = re.compile(r'^(?!-)[a-z0-9-]{1,63}(?<!-)\Z')
+TLD_RE = re.compile(r'^(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})\Z')
+
+# Verdicts
+VALID = 'valid'
+INVALID_SYNTAX = 'invalid_syntax'
+INVALID_DOMAIN = 'invalid_domain'
+DISPOSABLE_DOMAIN = 'disposable_domain'
+NO_MX_RECORD = 'no_mx_record'
+
+
+class EmailValidationResult(NamedTuple):
+    """Outcome of validating one address; ``email`` is normalized when valid"""
+    email: str
+    valid: bool
+    reason: str
+
+
+@lru_cache(maxsize=None)
+def get_disposable_domains() -> frozenset:
+    """Load the disposable domain list once per process"""
+    path = Path(getattr(settings, 'DISPOSABLE_EMAIL_DOMAINS_FILE', None) or DEFAULT_DISPOSABLE_DOMAINS_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            domains = frozenset(
+                line.strip().lower() for line in f
+                if line.strip() and not line.startswith('#')
+            )
+        logger.info(f"Loaded {len(domains)} disposable email domains from {path}")
+        return domains
+    except OSError as e:
+        logger.warning(f"Could not load disposable email domains from {path}: {e}")
+        return frozenset()
+
+
+def normalize_domain(domain: str) -> Optional[str]:
+    """
+    Lowercase and IDNA-encode a domain, returning None if it is not a valid hostname
+    """
+    domain = domain.rstrip('.').lower()
+    if not domain:
+        return None
+    if not domain.isascii():
+        try:
+            domain = domain.encode('idna').decode('ascii')
+        except UnicodeError:
+            return None
+    if len(domain) > MAX_DOMAIN_LENGTH:
+        return None
+    labels = domain.split('.')
+    if len(labels) < 2 or not TLD_RE.match(labels[-1]):
+        return None
+    if not all(DOMAIN_LABEL_RE.match(label) for label in labels):
+        return None
+    return domain
+
+
+class MXCache:
+    """
+    Bounded TTL cache in front of a pluggable MX resolver.
+
+    The resolver is any callable taking an ASCII domain and returning a truthy
+    value when the domain accepts mail (e.g. a list of MX hosts).
+    """
+
+    def __init__(self, resolver: Callable[[str], object], ttl: int = 3600, maxsize: int = 4096):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def has_mx(self, domain: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(domain)
+                return entry[0]
+
+        try:
+            result = bool(self.resolver(domain))
+        except Exception as e:
+            # Fail open: a DNS hiccup should not reject a real subscriber
+            logger.warning(f"MX lookup failed for {domain}: {e}")
+            return True
+
+        with self._lock:
+            self._entries[domain] = (result, now + self.ttl)
+            self._entries.move_to_end(domain)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StaticMXResolver:
+    """Local stub resolver for tests: only the given domains have MX records"""
+
+    def __init__(self, domains: Iterable[str]):
+        self.domains = frozenset(d.lower() for d in domains)
+
+    def __call__(self, domain: str) -> list:
+        return [f"mx.{domain}"] if domain in self.domains else []
+
+
+def dns_mx_resolver(domain: str) -> list:
+    """Resolve MX hosts with dnspython (optional dependency)"""
+    import dns.exception
+    import dns.resolver
+
+    try:
+        answers = dns.resolver.resolve(domain, 'MX', lifetime=getattr(settings, 'EMAIL_MX_LOOKUP_TIMEOUT', 2.0))
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+        return []
+    except dns.exception.Timeout:
+        raise
+    return [str(record.exchange).rstrip('.') for record in answers]
+
+
+_mx_cache = None
+_mx_cache_lock = threading.Lock()
+
+
+def get_mx_cache() -> Optional[MXCache]:
+    """Return the process-wide MX cache, or None when MX lookups are disabled"""
+    global _mx_cache
+    if _mx_cache is not None:
+        return _mx_cache
+    resolver_path = getattr(settings, 'EMAIL_MX_RESOLVER', None)
+    if not resolver_path:
+        return None
+    with _mx_cache_lock:
+        if _mx_cache is None:
+            resolver = import_string(resolver_path) if isinstance(resolver_path, str) else resolver_path
+            _mx_cache = MXCache(resolver, ttl=getattr(settings, 'EMAIL_MX_CACHE_TTL', 3600))
+    return _mx_cache
+
+
+def set_mx_resolver(resolver: Optional[Callable[[str], object]], ttl: int = 3600):
+    """Install (or with None, reset) the MX resolver, e.g. a StaticMXResolver in tests"""
+    global _mx_cache
+    with _mx_cache_lock:
+        _mx_cache = MXCache(resolver, ttl=ttl) if resolver is not None else None
+
+
+def _check_domain(domain: str) -> tuple:
+    normalized = normalize_domain(domain)
+    if normalized is None:
+        return None, INVALID_DOMAIN
+    if normalized in get_disposable_domains() or normalized.split('.', 1)[-1] in get_disposable_domains():
+        return normalized, DISPOSABLE_DOMAIN
+    return normalized, VALID
+
+
+_domain_cache = None
+_domain_cache_lock = threading.Lock()
+
+
+def check_domain(domain: str) -> tuple:
+    """
+    Validate a domain and return ``(normalized_domain, reason)``.
+
+    Static verdicts (syntax, IDNA, disposable list) are cached per process in
+    an LRU of EMAIL_DOMAIN_CACHE_SIZE entries, built on first use so the
+    setting is read once Django is configured. MX results are cached
+    separately with a TTL by ``MXCache``.
+    """
+    global _domain_cache
+    if _domain_cache is None:
+        with _domain_cache_lock:
+            if _domain_cache is None:
+                _domain_cache = lru_cache(maxsize=getattr(settings, 'EMAIL_DOMAIN_CACHE_SIZE', 4096))(_check_domain)
+    return _domain_cache(domain)
+
+
+def clear_domain_cache():
+    """Drop cached domain verdicts and the disposable list, e.g. after changing their settings"""
+    global _domain_cache
+    with _domain_cache_lock:
+        _domain_cache = None
+    get_disposable_domains.cache_clear()
+
+
+def validate_email(email: str) -> EmailValidationResult:
+    """
+    Validate a single email address.
+
+    Args:
+        email: Raw address as entered by the user
+
+    Returns:
+        EmailValidationResult: Normalized address (lowercase, IDNA domain) and verdict
+    """
+    email = (email or '').strip()
+    local, sep, domain = email.rpartition('@')
+    if not sep or not local or not domain or len(local) > MAX_LOCAL_LENGTH:
+        return EmailValidationResult(email, False, INVALID_SYNTAX)
+    if not (LOCAL_PART_RE.match(local) or QUOTED_LOCAL_PART_RE.match(local)):
+        return EmailValidationResult(email, False, INVALID_SYNTAX)
+
+    normalized_domain, reason = check_domain(domain.lower())
+    if reason != VALID:
+        return EmailValidationResult(email, False, reason)
+
+    normalized = f"{local.lower()}@{normalized_domain}"
+    if len(normalized) > MAX_EMAIL_LENGTH:
+        return EmailValidationResult(email, False, INVALID_SYNTAX)
+
+    mx_cache = get_mx_cache()
+    if mx_cache is not None and not mx_cache.has_mx(normalized_domain):
+        return EmailValidationResult(normalized, False, NO_MX_RECORD)
+
+    return EmailValidationResult(normalized, True, VALID)
+
@@ -1,147 +1,111 @@
+import hmac
 import json
 import logging
-import threading
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.cache import never_cache
-from django.db import transaction, connection
-from django.core.cache import cache
-from .models import Subscription
-from .emails import send_confirmation_email
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from . import metrics
+from .models import Subscription, hash_email
+from .emails import queue_confirmation_email
+from .confirmation import claim_confirmation_resend, verify_confirmation_token, confirm_email
+from .api import (
+    json_bytes_response, HEALTH_BODY, INTERNAL_ERROR_BODY, INVALID_JSON_BODY,
+    INVALID_UNSUBSCRIBE_BODY, METHOD_NOT_ALLOWED_BODY, UNSUBSCRIBED_BODY,
+)
+from .idempotency import idempotent
+from .legal import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, load_legal_pages
+from .memory import memory_profiling_enabled, process_stats, take_snapshot
+from .unsubscribe import enqueue_unsubscribe, is_suppressed, lift_suppression, verify_unsubscribe_token
+from .validation import validate_email, DISPOSABLE_DOMAIN, NO_MX_RECORD
+from .events import SUBSCRIPTION_CREATED, publish_on_commit
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def warmup_database():
-    """Warm up database connection to avoid cold start delays"""
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-        logger.info("Database connection warmed up successfully")
-        return True
-    except Exception as e:
-        logger.warning(f"Database warmup failed: {e}")
-        return False
-
 @csrf_exempt
 @never_cache
+@idempotent
 def subscribe_email(request):
-    # Always add CORS headers
-    def add_cors_headers(response):
-        response['Access-Control-Allow-Origin'] = '*'
-        response['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
-        response['Access-Control-Max-Age'] = '86400'
-        return response
-    
-    # Handle preflight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = JsonResponse({})
-        return add_cors_headers(response)
-    
+    # CORS headers and preflights are handled once by ApiRouterMiddleware
     # Handle POST request
     if request.method == 'POST':
         try:
             logger.info(f"Received POST request from {request.META.get('HTTP_ORIGIN', 'unknown origin')}")
             
-            # Warm up database connection on first request
-            if not hasattr(subscribe_email, '_db_warmed'):
-                logger.info("Warming up database connection...")
-                warmup_database()
-                subscribe_email._db_warmed = True
-                
             data = json.loads(request.body)
             email = data.get('email', '').strip().lower()  # Normalize email
             logger.info(f"Processing email: {email}")
 
             if not email:
                 logger.warning("No email provided in request")
-                response = JsonResponse({'error': 'Email not provided'}, status=400)
-                return add_cors_headers(response)
+                return JsonResponse({'error': 'Email not provided'}, status=400)
             
-            # Basic email validation
-            if '@' not in email or '.' not in email.split('@')[1]:
-                logger.warning(f"Invalid email format: {email}")
-                response = JsonResponse({'error': 'Invalid email format'}, status=400)
-                return add_cors_headers(response)
+            # Validate before touching the database or SMTP
+            validation = validate_email(email)
+            if not validation.valid:
+                logger.warning(f"Rejected email {email}: {validation.reason}")
+                if validation.reason == DISPOSABLE_DOMAIN:
+                    error = 'Disposable email addresses are not allowed'
+                elif validation.reason == NO_MX_RECORD:
+                    error = 'Email domain does not accept mail'
+                else:
+                    error = 'Invalid email format'
+                return JsonResponse({'error': error}, status=400)
+            email = validation.email
             
             # Use atomic transaction for database operations
             with transaction.atomic():
-                # Check cache first to avoid database hit for recent duplicates
-                cache_key = f"email_sub_{email}"
-                if cache.get(cache_key):
-                    logger.info(f"Email {email} found in cache, returning existing subscription")
-                    response = JsonResponse({'message': 'Success', 'created': False}, status=200)
-                    return add_cors_headers(response)
-                
-                # Use get_or_create with select_for_update to prevent race conditions
+                # Use get_or_create with select_for_update to prevent race conditions;
+                # the row is found through the 16-byte email_hash key
                 subscription, created = Subscription.objects.select_for_update().get_or_create(
-                    email=email
+                    email_hash=hash_email(email), defaults={'email': email}
                 )
                 
-                # Cache the result for 1 hour to prevent duplicate processing
-                cache.set(cache_key, True, 3600)
+                # Signing up again is explicit consent, so lift any earlier unsubscribe
+                if created and is_suppressed(email):
+                    logger.info(f"Lifting suppression for re-subscribed {email}")
+                    lift_suppression(email)
                 
-                # Send confirmation email for new subscriptions (non-blocking)
+                # The audit log and webhooks are fed after commit and never delay the response
                 if created:
-                    logger.debug(f"[EMAIL DEBUG] New subscription created, preparing to send confirmation email to {email}")
-                    try:
-                        # Send email in background thread to avoid blocking the response
-                        def send_email():
-                            try:
-                                logger.debug(f"[EMAIL DEBUG] Background thread started for sending email to {email}")
-                                email_status = send_confirmation_email(email)
-                                if email_status:
-                                    logger.info(f"✅ [EMAIL SUCCESS] Confirmation email sent successfully for {email}")
-                                else:
-                                    logger.error(f"❌ [EMAIL ERROR] Email send returned False for {email}")
-                            except Exception as e:
-                                logger.error(f"❌ [EMAIL ERROR] Exception in background thread for {email}: {str(e)}")
-                                logger.exception(f"[EMAIL ERROR] Full traceback:")
-                        
-                        # Start background thread for email sending
-                        logger.debug(f"[EMAIL DEBUG] Starting background thread for email sending to {email}")
-                        email_thread = threading.Thread(target=send_email, daemon=True)
-                        email_thread.start()
-                        logger.debug(f"[EMAIL DEBUG] Background thread started successfully (Thread ID: {email_thread.ident})")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ [EMAIL ERROR] Failed to spawn confirmation email thread for {email}")
-                        logger.error(f"[EMAIL ERROR] Exception type: {type(e).__name__}")
-                        logger.error(f"[EMAIL ERROR] Exception message: {str(e)}")
-                        logger.exception(f"[EMAIL ERROR] Full traceback:")
-                        # Don't fail the subscription if email fails
+                    publish_on_commit(SUBSCRIPTION_CREATED, [email])
+                
+                # Queue the confirmation email once the row is committed (non-blocking)
+                if created:
+                    logger.debug(f"[EMAIL DEBUG] New subscription created, queueing confirmation email to {email}")
+                    # The executor is bounded and fails fast while SMTP is down, so the response never waits on it
+                    transaction.on_commit(lambda: queue_confirmation_email(email))
+                elif subscription.confirmed_at is None and claim_confirmation_resend(email):
+                    # Signing up again while unconfirmed usually means the first email was lost or filtered
+                    logger.debug(f"[EMAIL DEBUG] Subscription for {email} is unconfirmed, queueing confirmation email again")
+                    transaction.on_commit(lambda: queue_confirmation_email(email))
                 else:
                     logger.debug(f"[EMAIL DEBUG] Subscription already exists for {email}, skipping email send")
                 
                 message = 'New subscription created' if created else 'Email already subscribed'
                 logger.info(f"Subscription result for {email}: {message}")
                 
-                response = JsonResponse({'message': 'Success', 'created': created}, status=200)
-                return add_cors_headers(response)
+                return JsonResponse({'message': 'Success', 'created': created}, status=200)
                 
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {e}")
-            response = JsonResponse({'error': 'Invalid JSON'}, status=400)
-            return add_cors_headers(response)
+            return json_bytes_response(INVALID_JSON_BODY, status=400)
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
-            response = JsonResponse({'error': 'Internal server error'}, status=500)
-            return add_cors_headers(response)
+            return json_bytes_response(INTERNAL_ERROR_BODY, status=500)
 
     # Handle other methods
     logger.warning(f"Invalid method: {request.method}")
-    response = JsonResponse({'error': 'Invalid request method'}, status=405)
-    return add_cors_headers(response)
+    return json_bytes_response(METHOD_NOT_ALLOWED_BODY, status=405)
 
 # Simple health check endpoint
 @csrf_exempt
 def health_check(request):
-    response = JsonResponse({'status': 'ok', 'message': 'API is working'})
-    response['Access-Control-Allow-Origin'] = '*'
-    response['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
-    return response
+    return json_bytes_response(HEALTH_BODY)
 
 # Email configuration test endpoint
 @csrf_exempt
@@ -149,24 +113,13 @@ def test_email(request):
     """Test endpoint to verify email configuration"""
     from .emails import test_email_configuration, send_confirmation_email
     
-    def add_cors_headers(response):
-        response['Access-Control-Allow-Origin'] = '*'
-        response['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
-        return response
-    
-    if request.method == 'OPTIONS':
-        response = JsonResponse({})
-        return add_cors_headers(response)
-    
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             test_email_address = data.get('email', '').strip()
             
             if not test_email_address:
-                response = JsonResponse({'error': 'Email address required for testing'}, status=400)
-                return add_cors_headers(response)
+                return JsonResponse({'error': 'Email address required for testing'}, status=400)
             
             # Test email configuration
             logger.debug(f"[EMAIL DEBUG] Testing email configuration for test email to {test_email_address}")
@@ -179,7 +132,7 @@ def test_email(request):
                     'status': 'error',
                     'message': 'Email configuration test failed. Check your SMTP settings.'
                 }, status=500)
-                return add_cors_headers(response)
+                return response
             
             # Send test email
             logger.debug(f"[EMAIL DEBUG] Attempting to send test email to {test_email_address}")
@@ -192,22 +145,169 @@ def test_email(request):
                     'status': 'success',
                     'message': f'Test email sent successfully to {test_email_address}'
                 })
-                return add_cors_headers(response)
+                return response
             else:
                 logger.error(f"❌ [EMAIL ERROR] Failed to send test email to {test_email_address}")
                 response = JsonResponse({
                     'status': 'error',
                     'message': 'Failed to send test email. Check logs for details.'
                 }, status=500)
-                return add_cors_headers(response)
+                return response
                 
         except json.JSONDecodeError:
-            response = JsonResponse({'error': 'Invalid JSON'}, status=400)
-            return add_cors_headers(response)
+            return json_bytes_response(INVALID_JSON_BODY, status=400)
         except Exception as e:
             logger.error(f"Email test error: {e}")
-            response = JsonResponse({'error': 'Internal server error'}, status=500)
-            return add_cors_headers(response)
+            return json_bytes_response(INTERNAL_ERROR_BODY, status=500)
     
-    response = JsonResponse({'error': 'Invalid request method'}, status=405)
-    return add_cors_headers(response)
+    return json_bytes_response(METHOD_NOT_ALLOWED_BODY, status=405)
+
+# Double opt-in confirmation link target
+@csrf_exempt
+@never_cache
+def confirm_subscription(request, token):
+    """
+    Confirm a subscription from a signed token; the token is verified before any DB access.
+
+    GET only shows a page with a confirm button, so link scanners that prefetch
+    URLs in mail (e.g. Outlook Safe Links) cannot confirm an address; the
+    subscription is confirmed by the page's POST.
+    """
+    if request.method not in ('GET', 'POST'):
+        return json_bytes_response(METHOD_NOT_ALLOWED_BODY, status=405)
+
+    email = verify_confirmation_token(token)
+    redirect_url = getattr(settings, 'CONFIRMATION_REDIRECT_URL', '')
+    if email is None and redirect_url:
+        return HttpResponseRedirect(f"{redirect_url}?confirmed=invalid")
+    context = {
+        'email': email,
+        'valid': email is not None,
+        'done': False,
+        'company_name': getattr(settings, 'COMPANY_NAME', 'Your Company'),
+    }
+    if request.method == 'GET' or email is None:
+        return render(request, 'newsletter/confirm_subscription.html', context, status=200 if email else 400)
+
+    try:
+        newly_confirmed = confirm_email(email)
+    except Exception as e:
+        logger.error(f"Confirmation failed for {email}: {e}")
+        return json_bytes_response(INTERNAL_ERROR_BODY, status=500)
+
+    logger.info(f"Subscription confirmation for {email}: {'confirmed' if newly_confirmed else 'already confirmed or missing'}")
+    if redirect_url:
+        return HttpResponseRedirect(f"{redirect_url}?confirmed=1")
+    return render(request, 'newsletter/confirm_subscription.html', {**context, 'done': True})
+
+# One-click unsubscribe (RFC 8058) and footer link target
+@csrf_exempt
+@never_cache
+def unsubscribe(request, token):
+    """
+    Unsubscribe from a signed link; the token is verified without a query.
+
+    POST (the mailbox provider's one-click request, or the confirmation page's
+    form) records the address in the suppression table, queues the subscription
+    delete and acknowledges. GET only shows a confirmation page, so link
+    scanners that prefetch URLs cannot unsubscribe anyone.
+    """
+    if request.method not in ('GET', 'POST'):
+        return json_bytes_response(METHOD_NOT_ALLOWED_BODY, status=405)
+
+    email = verify_unsubscribe_token(token)
+    from_page = request.method == 'POST' and request.POST.get('source') == 'page'
+    if request.method == 'GET' or from_page:
+        if email is not None and from_page:
+            enqueue_unsubscribe(email)
+            logger.info(f"Unsubscribe recorded for {email} (page)")
+        context = {
+            'email': email,
+            'valid': email is not None,
+            'done': from_page,
+            'company_name': getattr(settings, 'COMPANY_NAME', 'Your Company'),
+        }
+        return render(request, 'newsletter/unsubscribe.html', context, status=200 if email else 400)
+
+    if email is None:
+        return json_bytes_response(INVALID_UNSUBSCRIBE_BODY, status=400)
+    enqueue_unsubscribe(email)
+    logger.info(f"Unsubscribe recorded for {email} (one-click)")
+    return json_bytes_response(UNSUBSCRIBED_BODY)
+
+# Legal pages built by manage.py build_legal_pages, served from memory
+def legal_page(request, name, fingerprint=None):
+    """
+    Serve a prebuilt legal page with a strong ETag and conditional GET.
+
+    Fingerprinted URLs never change content and are cached for a year; the
+    plain URL must be revalidated, which costs a 304 with no body.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return json_bytes_response(METHOD_NOT_ALLOWED_BODY, status=405)
+
+    page = load_legal_pages().get(name)
+    if page is None:
+        raise Http404
+
+    encoding = page.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if page.matches(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        metrics.incr('legal.not_modified', page=name)
+    else:
+        body = page.bodies[encoding]
+        response = HttpResponse(body, content_type='text/html; charset=utf-8')
+        response['Content-Length'] = str(len(body))
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        metrics.incr('legal.bytes_sent', len(body), page=name)
+
+    response['ETag'] = page.etag(encoding)
+    # An outdated fingerprint still gets the current page, just not cached as immutable
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if fingerprint == page.fingerprint else REVALIDATE_CACHE_CONTROL
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+def check_metrics_token(request):
+    """Return a 401 response unless the request carries 'Authorization: Bearer <METRICS_TOKEN>'"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        raise Http404
+    provided = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(provided.encode(), token.encode()):
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+    return None
+
+# Per-worker metrics, protected by METRICS_TOKEN
+@never_cache
+def metrics_view(request):
+    """Return this worker's metrics snapshot; requires 'Authorization: Bearer <METRICS_TOKEN>'"""
+    denied = check_metrics_token(request)
+    if denied:
+        return denied
+    # Refresh the RSS and thread gauges so every scrape sees current values
+    process_stats()
+    return JsonResponse(metrics.snapshot())
+
+# Per-worker memory stats and tracemalloc snapshots, protected by METRICS_TOKEN
+@csrf_exempt
+@never_cache
+def memory_view(request):
+    """
+    GET: this worker's RSS, thread count and names, and traced memory totals.
+    POST: write a tracemalloc snapshot (?label=...) and return its top allocation
+    sites and their growth since this worker's previous snapshot.
+
+    Uses the metrics token; tracing needs MEMORY_PROFILING_ENABLED.
+    """
+    denied = check_metrics_token(request)
+    if denied:
+        return denied
+    limit = min(int(request.GET['limit']), 200) if request.GET.get('limit', '').isdigit() else 20
+    if request.method == 'POST':
+        if not memory_profiling_enabled():
+            return JsonResponse({'error': 'Memory profiling is disabled (MEMORY_PROFILING_ENABLED)'}, status=409)
+        return JsonResponse(take_snapshot(request.GET.get('label', 'api'), limit=limit))
+    if request.method != 'GET':
+        return json_bytes_response(METHOD_NOT_ALLOWED_BODY, status=405)
+    return JsonResponse(process_stats())
@@ -0,0 +1,351 @@
+"""
+Subscription event fan-out to downstream webhooks (CRM, analytics)
+
+Write paths publish events with ``events.publish_on_commit()``, which only
+appends to an in-memory buffer once the transaction commits, so
+subscribe_email never waits on a downstream system. Each configured URL has
+its own bounded buffer and WEBHOOK_CONCURRENCY sender threads; a sender takes up to
+WEBHOOK_BATCH_SIZE events (or whatever has waited WEBHOOK_FLUSH_INTERVAL
+seconds) and POSTs them as one JSON batch over a keep-alive connection it
+reuses for the life of the thread.
+
+Each batch is signed: ``X-Webhook-Signature: sha256=<hex>`` is the
+HMAC-SHA256 of ``"<X-Webhook-Timestamp>." + body`` with WEBHOOK_SECRET.
+``X-Webhook-Id`` stays the same across retries so receivers can deduplicate.
+Connection errors, 408, 429 and 5xx are retried with exponential backoff;
+other 4xx responses are treated as permanent.
+
+Delivery is at-most-once per process: events still buffered when a worker is
+killed are lost, and a full buffer drops its oldest events (counted in
+``webhooks.dropped``).
+"""
+import atexit
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.utils import timezone
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+TIMESTAMP_HEADER = 'X-Webhook-Timestamp'
+ID_HEADER = 'X-Webhook-Id'
+MAX_BACKOFF = 60.0
+# Statuses worth retrying; any other non-2xx response is permanent
+RETRY_STATUSES = {408, 429}
+
+
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    """Hex HMAC-SHA256 of "<timestamp>.<body>" """
+    return hmac.new(secret.encode(), timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, timestamp: str, body: bytes, signature: str, tolerance: int = 300) -> bool:
+    """
+    Check a webhook signature the way a receiver should.
+
+    Args:
+        signature: The X-Webhook-Signature header value ("sha256=<hex>")
+        tolerance: Maximum age of the timestamp in seconds, to limit replays
+    """
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance:
+            return False
+    except (TypeError, ValueError):
+        return False
+    expected = f"sha256={sign_payload(secret, timestamp, body)}"
+    return hmac.compare_digest(expected, signature or '')
+
+
+class WebhookTarget:
+    """One downstream URL: a bounded event buffer drained by a few sender threads"""
+
+    def __init__(self, url: str, secret: str, batch_size: int, flush_interval: float, concurrency: int,
+                 max_buffer: int, max_attempts: int, backoff: float, timeout: float):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Invalid webhook URL: {url}")
+        self.url = url
+        self.label = parts.netloc
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or '/'
+        if parts.query:
+            self._path = f"{self._path}?{parts.query}"
+        self.secret = secret
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        self.max_buffer = max_buffer
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self._buffer = deque()
+        self._in_flight = 0
+        self._draining = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._threads = []
+        self._pid = None
+
+    def extend(self, events: list):
+        """Buffer events for delivery; never blocks on the network"""
+        now = time.monotonic()
+        with self._cond:
+            for event in events:
+                self._buffer.append((now, event))
+            overflow = len(self._buffer) - self.max_buffer
+            for _ in range(max(overflow, 0)):
+                self._buffer.popleft()
+            depth = len(self._buffer)
+            if depth >= self.batch_size:
+                self._cond.notify()
+        if overflow > 0:
+            metrics.incr('webhooks.dropped', overflow, target=self.label)
+            logger.warning(f"Webhook buffer for {self.label} is full, dropped {overflow} oldest events")
+        metrics.set_gauge('webhooks.buffer_depth', depth, target=self.label)
+        self._ensure_senders()
+
+    def depth(self) -> int:
+        return len(self._buffer) + self._in_flight
+
+    def drain(self, timeout: float) -> bool:
+        """Send everything buffered now, waiting up to timeout seconds; True if empty"""
+        deadline = time.monotonic() + timeout
+        self._ensure_senders()
+        with self._cond:
+            self._draining = True
+            self._cond.notify_all()
+            try:
+                while self._buffer or self._in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._draining = False
+
+    def _ensure_senders(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._cond:
+            if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            if self._pid != os.getpid():
+                self._in_flight = 0
+                self._threads = []
+            self._pid = os.getpid()
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for index in range(len(self._threads), self.concurrency):
+                thread = threading.Thread(target=self._run, name=f'webhook-{self.label}-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            while True:
+                if self._buffer:
+                    waited = time.monotonic() - self._buffer[0][0]
+                    if len(self._buffer) >= self.batch_size or waited >= self.flush_interval or self._draining:
+                        break
+                    self._cond.wait(self.flush_interval - waited)
+                else:
+                    self._cond.wait()
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._in_flight += len(batch)
+            if len(self._buffer) >= self.batch_size:
+                # Let another sender pick up the next full batch
+                self._cond.notify()
+            depth = len(self._buffer)
+        metrics.set_gauge('webhooks.buffer_depth', depth, target=self.label)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                logger.error(f"Unexpected error delivering webhooks to {self.label}: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight -= len(batch)
+                    self._cond.notify_all()
+
+    def _deliver(self, batch: list) -> bool:
+        batch_id = uuid.uuid4().hex
+        body = json.dumps({'id': batch_id, 'events': [event for _, event in batch]},
+                          separators=(',', ':')).encode()
+        for attempt in range(1, self.max_attempts + 1):
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                status, retry_after = self._post(body, batch_id)
+                error = f"HTTP {status}"
+            except (OSError, http.client.HTTPException) as e:
+                status, error = None, f"{type(e).__name__}: {e}"
+            metrics.observe('webhooks.post_ms', (time.perf_counter() - start) * 1000, target=self.label)
+
+            if status is not None and 200 <= status < 300:
+                metrics.incr('webhooks.delivered_events', len(batch), target=self.label)
+                metrics.incr('webhooks.batches', target=self.label)
+                # Lag: from the oldest event entering the buffer to the receiver's acknowledgement
+                metrics.observe('webhooks.lag_ms', (time.monotonic() - batch[0][0]) * 1000, target=self.label)
+                return True
+            if status is not None and status < 500 and status not in RETRY_STATUSES:
+                logger.error(f"Webhook {self.label} rejected batch {batch_id} with {error}; not retrying")
+                break
+            if attempt == self.max_attempts:
+                break
+
+            delay = min(self.backoff * 2 ** (attempt - 1), MAX_BACKOFF) * random.uniform(0.5, 1.0)
+            if retry_after and retry_after.isdigit():
+                delay = min(float(retry_after), MAX_BACKOFF)
+            metrics.incr('webhooks.retries', target=self.label)
+            logger.warning(f"Webhook {self.label} batch {batch_id} attempt {attempt} failed ({error}), "
+                           f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        metrics.incr('webhooks.failed_events', len(batch), target=self.label)
+        logger.error(f"Gave up delivering {len(batch)} events to {self.label} (batch {batch_id})")
+        return False
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self._scheme == 'https' else http.client.HTTPConnection
+            connection = connection_class(self._host, self._port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _post(self, body: bytes, batch_id: str):
+        """POST one signed batch; returns (status, Retry-After header)"""
+        timestamp = str(int(time.time()))
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'newsletter-webhooks/1',
+            ID_HEADER: batch_id,
+            TIMESTAMP_HEADER: timestamp,
+        }
+        if self.secret:
+            headers[SIGNATURE_HEADER] = f"sha256={sign_payload(self.secret, timestamp, body)}"
+
+        connection = self._connection()
+        reused = connection.sock is not None
+        try:
+            try:
+                connection.request('POST', self._path, body, headers)
+                response = connection.getresponse()
+            except ConnectionError:
+                if not reused:
+                    raise
+                # The receiver closed the idle keep-alive connection; retry once on a fresh one
+                connection.close()
+                connection.request('POST', self._path, body, headers)
+                response = connection.getresponse()
+            response.read()
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        return response.status, response.getheader('Retry-After')
+
+
+class WebhookDispatcher:
+    """Fans each published event out to every configured target"""
+
+    def __init__(self, targets: list):
+        self.targets = targets
+
+    def publish(self, events: list):
+        metrics.incr('webhooks.published', len(events))
+        for target in self.targets:
+            target.extend(events)
+
+    def depth(self) -> int:
+        return sum(target.depth() for target in self.targets)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait for every buffered event to be delivered or given up; True if all targets drained"""
+        deadline = time.monotonic() + timeout
+        return all([target.drain(max(deadline - time.monotonic(), 0)) for target in self.targets])
+
+
+def build_dispatcher(urls: list, secret: str = None, **overrides) -> WebhookDispatcher:
+    """Create a dispatcher for the given URLs with settings defaults, overridable per keyword"""
+    options = {
+        'batch_size': getattr(settings, 'WEBHOOK_BATCH_SIZE', 100),
+        'flush_interval': getattr(settings, 'WEBHOOK_FLUSH_INTERVAL', 1.0),
+        'concurrency': getattr(settings, 'WEBHOOK_CONCURRENCY', 2),
+        'max_buffer': getattr(settings, 'WEBHOOK_MAX_BUFFER', 10000),
+        'max_attempts': getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5),
+        'backoff': getattr(settings, 'WEBHOOK_BACKOFF', 0.5),
+        'timeout': getattr(settings, 'WEBHOOK_TIMEOUT', 5.0),
+    }
+    options.update(overrides)
+    if secret is None:
+        secret = getattr(settings, 'WEBHOOK_SECRET', '')
+    if not secret:
+        logger.warning("WEBHOOK_SECRET is not set; webhook batches will be sent unsigned")
+    return WebhookDispatcher([WebhookTarget(url, secret, **options) for url in urls])
+
+
+_dispatcher = None
+_init_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """The process-wide dispatcher, or None when no WEBHOOK_URLS are configured"""
+    global _dispatcher
+    urls = getattr(settings, 'WEBHOOK_URLS', [])
+    if not urls:
+        return None
+    if _dispatcher is None:
+        with _init_lock:
+            if _dispatcher is None:
+                _dispatcher = build_dispatcher(urls)
+                atexit.register(_dispatcher.flush, getattr(settings, 'WEBHOOK_EXIT_TIMEOUT', 5.0))
+    return _dispatcher
+
+
+def webhooks_enabled() -> bool:
+    return bool(getattr(settings, 'WEBHOOK_URLS', []))
+
+
+def publish_subscription_events(event_type: str, emails, **data):
+    """
+    Queue one event per address for every webhook target.
+
+    Args:
+        event_type: One of the events.SUBSCRIPTION_* constants
+        emails: Addresses the event applies to
+        **data: Extra fields added to every event (e.g. reason)
+    """
+    dispatcher = get_dispatcher()
+    if dispatcher is None:
+        return
+    occurred_at = timezone.now().isoformat()
+    dispatcher.publish([
+        {'id': uuid.uuid4().hex, 'type': event_type, 'email': email, 'occurred_at': occurred_at, **data}
+        for email in emails
+    ])
+
+
+def flush_webhooks(timeout: float = 10.0) -> bool:
+    """Block until buffered events are delivered; used by batch commands between chunks"""
+    return _dispatcher.flush(timeout) if _dispatcher is not None else True
@@ -54,4 +54,5 @@ python manage.py warmup_db || echo "Warmup failed, continuing..."
 
 # Start the server
 echo "Starting Django server with gunicorn..."
-exec gunicorn --bind 0.0.0.0:8000 --workers 2 --threads 4 --worker-class gthread --worker-tmp-dir /dev/shm --log-level info --access-logfile - --error-logfile - backend.wsgi:application
+# Workers/threads are sized from the container CPU and memory limits in gunicorn.conf.py
+exec gunicorn -c gunicorn.conf.py backend.wsgi:application
@@ -1,4 +1,6 @@
 import './style.css'
+import legalFingerprints from './legal-manifest.json'
+import imageManifest from './image-manifest.json'
 
 // Carousel functionality for hero section
 class ImageCarousel {
@@ -71,7 +73,16 @@ class ImageCarousel {
       this.heroImage.style.opacity = '0';
       
       setTimeout(() => {
-        this.heroImage.src = this.images[this.currentIndex];
+        const src = this.images[this.currentIndex];
+        const variants = imageManifest[src];
+        // Swap the AVIF/WebP srcsets of the surrounding <picture> along with the fallback
+        const sources = this.heroImage.parentElement.querySelectorAll('source[type^="image/"]');
+        sources.forEach((source) => {
+          const format = source.type.split('/')[1];
+          // An empty srcset makes the browser skip that source and use the <img>
+          source.srcset = (variants && variants.srcset[format]) || '';
+        });
+        this.heroImage.src = variants ? variants.fallback : src;
         this.heroImage.style.opacity = '1';
       }, 250);
     }
@@ -147,6 +158,11 @@ class EmailSignup {
     const maxRetries = 2;
     let attempt = 0;
     
+    // One key per submission so retries are replayed by the backend instead of re-run
+    const idempotencyKey = (window.crypto && window.crypto.randomUUID)
+      ? window.crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    
     while (attempt < maxRetries) {
       try {
         attempt++;
@@ -173,6 +189,7 @@ class EmailSignup {
             'Accept': 'application/json',
             'X-CSRFToken': this.getCSRFToken(),
             'Cache-Control': 'no-cache',
+            'Idempotency-Key': idempotencyKey,
           },
           body: JSON.stringify({ email: email.trim() }),
           signal: controller.signal,
@@ -434,6 +451,15 @@ class LegalLinksHandler {
     this.termsUrl = '/terms.html';
     this.privacyUrl = '/privacy.html';
     
+    // Fingerprinted copies served by the API (manage.py build_legal_pages); their
+    // content never changes under a URL, so repeat visits are served from cache
+    const apiBaseEnv = (typeof import.meta !== 'undefined' && import.meta.env && import.meta.env.VITE_API_BASE_URL) ? import.meta.env.VITE_API_BASE_URL : '';
+    const apiBaseUrl = (apiBaseEnv || '').replace(/\/+$/, '');
+    this.contentUrls = {
+      terms: legalFingerprints.terms ? `${apiBaseUrl}/api/legal/terms.${legalFingerprints.terms}.html` : null,
+      privacy: legalFingerprints.privacy ? `${apiBaseUrl}/api/legal/privacy.${legalFingerprints.privacy}.html` : null
+    };
+    
     // Modal elements
     this.modal = document.getElementById('legalModal');
     this.modalTitle = document.getElementById('modalTitle');
@@ -564,8 +590,8 @@ class LegalLinksHandler {
     this.showModal();
     
     try {
-      // Fetch the HTML page with absolute path to avoid path issues
-      const fetchUrl = pageUrl.startsWith('/') ? pageUrl : `/${pageUrl}`;
+      // Prefer the fingerprinted copy; fall back to the static page with an absolute path
+      const fetchUrl = this.contentUrls[cacheKey] || (pageUrl.startsWith('/') ? pageUrl : `/${pageUrl}`);
       const response = await fetch(fetchUrl);
       
       if (!response.ok) {